@@ -1,17 +1,25 @@
 # Admin.py — Heal Nest Admin / Counsellor Dashboard (tokens-only, safe rerun)
 # Save to: C:\Users\SIDDHANT THAKUR\Desktop\weatherapp\Admin.py
 
-import io
-import csv
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import streamlit as st
 import streamlit.components.v1 as components
 from dotenv import load_dotenv
 
 # local helper to persist data (must be present in same folder)
-from data_store_utils import load_data, save_data
+from data_store_utils import (load_data, update_data, find_booking, cancel_booking, chat_log_page,
+                              bookings_page, cancel_bookings, clear_bookings, booking_summary,
+                              edit_availability, availability_templates, save_template, delete_template,
+                              apply_template, schedule_template, week_key, AvailabilityGrid,
+                              ensure_store_ready, RESET_WEEK_ON_SUNDAY)
+from booking_grid import booking_grid, encode_cells, AVAILABLE, BOOKED, LUNCH
+import run_timing
+import logo_assets
+import exports
+
+_run_started = run_timing.run_started()
 print("[Admin.py] module loaded")
 
 # load .env if present (for ADMIN_PASSWORD)
@@ -37,6 +45,9 @@ st.markdown(
     .legend .sw { width:18px; height:18px; border-radius:4px; display:inline-block; }
     .day-label { font-weight:700; color:#cfe8ff; width:110px; }
     .stButton>button { border-radius:10px; padding:8px 12px; font-weight:600; }
+    .heat { border-collapse:collapse; width:100%; }
+    .heat th, .heat td { padding:6px 8px; text-align:center; border:1px solid rgba(207,232,255,0.08); }
+    .heat th { color:#cfe8ff; font-weight:700; }
     </style>
     """,
     unsafe_allow_html=True,
@@ -45,37 +56,33 @@ st.markdown(
 # -----------------------
 # Show Logo
 # -----------------------
-LOGO_PATH = r"healnest.png"
-if os.path.exists(LOGO_PATH):
+LOGO_PATH = logo_assets.find_logo((r"healnest.png",))  # probed once per process
+if LOGO_PATH:
     try:
-        st.image(LOGO_PATH, width=160)
+        # pre-sized static variants; the image itself comes from the browser cache
+        logo = logo_assets.logo_html(LOGO_PATH, 160)
+        if logo:
+            st.markdown(logo, unsafe_allow_html=True)
+        else:
+            st.image(logo_assets.logo_bytes(LOGO_PATH), width=160)
     except Exception as e:
         st.warning(f"Could not load logo: {e}")
 else:
-    st.info(f"Logo not found at {LOGO_PATH}")
+    st.info("Logo not found at healnest.png")
 
 # -----------------------
 # Helpers
 # -----------------------
-def safe_rerun():
-    """Try to call Streamlit's rerun. If not available, force a browser reload via JS."""
+def safe_rerun(scope="app"):
+    """Rerun the app (or with scope="fragment" just the tab being run). If not available, force a browser reload via JS."""
     try:
-        st.experimental_rerun()
+        st.rerun(scope=scope)
     except Exception:
         # fallback to reload via JS
         components.html("<script>window.location.reload()</script>")
         st.stop()
 
 
-# -----------------------
-# Load shared data store
-# -----------------------
-store = load_data()
-store.setdefault("availability", {})
-store.setdefault("bookings", [])
-store.setdefault("counsellors", [])
-store.setdefault("chat_logs", [])
-
 # -----------------------
 # Constants
 # -----------------------
@@ -97,7 +104,6 @@ except ValueError:
     LUNCH_SLOT_INDEX = 4
 
 today_idx = datetime.now().weekday()  # Mon=0..Sun=6
-RESET_WEEK_ON_SUNDAY = True
 
 # -----------------------
 # Admin password
@@ -123,104 +129,268 @@ st.markdown('<div class="admin-wrap">', unsafe_allow_html=True)
 st.header("Heal Nest — Admin / Counsellor Dashboard")
 st.markdown("<div class='admin-panel'>", unsafe_allow_html=True)
 
+ensure_store_ready()  # today's rollover, if no run of this process has done it yet
 tabs = st.tabs(["Overview", "Bookings", "Availability", "Counsellors", "Chat Logs", "Reports"])
 
 
-def persist():
-    save_data(store)
+def persist(mutate):
+    """Apply `mutate` to a fresh copy of the store and save it; retried if the
+    student app or another admin saved in between, so neither change is lost.
+    With WRITE_BEHIND=1 a burst of edits is saved as one write."""
+    return update_data(mutate)
 
 
 # --- Overview ---
-with tabs[0]:
+@st.fragment
+@run_timing.timed("overview tab")
+def overview_tab():
+    store = load_data(parts=("availability", "counsellors"))
+    stats = booking_summary()  # kept up to date by every booking / cancellation; no booking is read
     st.subheader("Overview")
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total bookings", str(len(store.get("bookings", []))))
-    upcoming = [b for b in store.get("bookings", []) if b.get("day", -1) >= today_idx]
-    c2.metric("This week", str(len(upcoming)))
+    c1.metric("Total bookings", str(stats["total"]))
+    c2.metric("This week", str(sum(stats["per_day"][today_idx:])))
     c3.metric("Counsellors", str(len(store.get("counsellors", []))))
 
+    grid = store["availability"]
+    free_per_day = grid.free_counts(exclude_slots=[LUNCH_SLOT_INDEX])
+    st.markdown("**Free slots per day:** " + " · ".join(f"{DAYS[d]} {free_per_day[d]}" for d in range(len(DAYS))))
+    nxt = grid.next_free(today_idx, 0, exclude_slots=[LUNCH_SLOT_INDEX])
+    st.markdown(f"**Next free slot:** {DAYS[nxt[0]]} — {SLOTS[nxt[1]]}" if nxt else "**Next free slot:** none this week")
+
     st.markdown("---")
     st.subheader("Quick actions")
     qa1, qa2, qa3 = st.columns(3)
+    # these change what every tab shows, so they rerun the whole app (toasts survive the rerun)
     if qa1.button("Reset week (make all slots available)"):
-        for d in range(7):
-            for s in range(len(SLOTS)):
-                store["availability"][f"{d}_{s}"] = True
-        persist()
-        st.success("Week reset — all slots available.")
+        persist(lambda data: data["availability"].reset(free=True))
+        st.toast("Week reset — all slots available.")
+        safe_rerun()
     if qa2.button("Lock past days (apply rules)"):
-        for d in range(7):
-            for s in range(len(SLOTS)):
-                if RESET_WEEK_ON_SUNDAY and today_idx == 6:
-                    continue
-                if d < today_idx:
-                    store["availability"][f"{d}_{s}"] = False
-        persist()
-        st.success("Applied past-day locking rules.")
+        if not (RESET_WEEK_ON_SUNDAY and today_idx == 6):
+            persist(lambda data: data["availability"].lock_before(today_idx))
+        st.toast("Applied past-day locking rules.")
+        safe_rerun()
     if qa3.button("Clear all bookings"):
-        store["bookings"] = []
-        persist()
-        st.success("All bookings cleared.")
+        clear_bookings()
+        st.toast("All bookings cleared.")
+        safe_rerun()
+
+
+with tabs[0]:
+    overview_tab()
 
 
 # --- Bookings (tokens-only; no admin create UI) ---
-with tabs[1]:
+@st.fragment
+@run_timing.timed("bookings tab")
+def bookings_tab():
     st.subheader("Bookings")
     st.markdown("**Note:** Bookings are anonymous — only token and timestamp are stored.")
+    lookup = st.text_input("Find booking by token", key="admin_token_lookup").strip()
+    if lookup:
+        found = find_booking(lookup)
+        if not found:
+            st.warning("No booking with that token.")
+        elif found.get("week"):
+            st.info(f"{found['token']}: {DAYS[found['day']]} — {SLOTS[found['slot']]} in closed week "
+                    f"{found['week']} (booked {found.get('time') or '-'})")
+        else:
+            st.success(f"{found['token']}: {DAYS[found['day']]} — {SLOTS[found['slot']]} (booked {found.get('time') or '-'})")
+            if st.button("Remove this booking", key="remove_lookup"):
+                cancel_booking(found["token"])
+                st.success("Booking removed.")
+                safe_rerun("fragment")
     st.markdown("---")
 
-    if not store.get("bookings"):
-        st.info("No bookings yet.")
-    else:
-        for idx, b in enumerate(list(store["bookings"])): 
-            day_str = DAYS[b.get("day", -1)] if "day" in b else "-"
-            slot_str = SLOTS[b.get("slot", -1)] if "slot" in b else "-"
-            with st.expander(f"{idx+1}. {day_str} — {slot_str}"):
-                st.write(f"**Token:** {b.get('token', '-')}")
-                st.write(f"**Time:** {b.get('time', '-')}")
-                if st.button(f"Remove booking #{idx+1}", key=f"remove_{idx}"):
-                    try:
-                        store["availability"][f"{b['day']}_{b['slot']}"] = True
-                    except Exception:
-                        pass
-                    store["bookings"].pop(idx)
-                    persist()
-                    st.success("Booking removed.")
-                    safe_rerun()
+    # one page of a columnar snapshot: the render cost is the page size, not the booking count
+    f1, f2, f3, f4, f5 = st.columns([2, 2, 2, 1, 1])
+    day_choice = f1.selectbox("Day", ["All days"] + DAYS, key="bk_day")
+    prefix = f2.text_input("Token starts with", key="bk_prefix").strip()
+    sort = f3.selectbox("Sort by", ["time", "day", "slot"], format_func=str.capitalize, key="bk_sort")
+    descending = f4.checkbox("Newest / last first", key="bk_desc")
+    page_size = f5.selectbox("Rows", [25, 50, 100], index=1, key="bk_size")
+    view = (day_choice, prefix, sort, descending, page_size)
+    if st.session_state.get("bk_view") != view:
+        st.session_state.bk_view = view
+        st.session_state.bk_page = 0
+    page = st.session_state.bk_page
+    day = None if day_choice == "All days" else DAYS.index(day_choice)
+    rows, total = bookings_page(day, prefix, sort, descending, offset=page * page_size, limit=page_size)
+    if total and not rows:  # the last page emptied (removals elsewhere): step back
+        st.session_state.bk_page = page = (total - 1) // page_size
+        rows, total = bookings_page(day, prefix, sort, descending, offset=page * page_size, limit=page_size)
+
+    if not total:
+        st.info("No bookings yet." if day is None and not prefix else "No bookings match these filters.")
+        return
+    table = [{"Day": DAYS[b["day"]] if 0 <= b["day"] < len(DAYS) else "-",
+              "Slot": SLOTS[b["slot"]] if 0 <= b["slot"] < len(SLOTS) else "-",
+              "Token": b["token"], "Booked at": b.get("time") or "-"} for b in rows]
+    # keyed by view and page, so a selection never carries over to other rows
+    event = st.dataframe(table, hide_index=True, use_container_width=True, on_select="rerun",
+                         selection_mode="multi-row", key=f"bk_table_{abs(hash(view))}_{page}")
+    selected = [rows[i]["token"] for i in event.selection.rows]
+
+    pages = (total + page_size - 1) // page_size
+    n1, n2, n3, n4 = st.columns([1, 1, 3, 2])
+    if page > 0 and n1.button("← Previous", key="bk_prev"):
+        st.session_state.bk_page = page - 1
+        safe_rerun("fragment")
+    if page + 1 < pages and n2.button("Next →", key="bk_next"):
+        st.session_state.bk_page = page + 1
+        safe_rerun("fragment")
+    n3.caption(f"Page {page + 1} of {pages} · {total} bookings")
+    if n4.button(f"Remove selected ({len(selected)})", key="bk_remove", disabled=not selected):
+        # by token, in one store write; rows shifting meanwhile can't hit the wrong booking
+        removed = cancel_bookings(selected)
+        st.toast(f"Removed {len(removed)} booking(s).")
+        safe_rerun("fragment")
+
+
+with tabs[1]:
+    bookings_tab()
 
 
 # --- Availability ---
-with tabs[2]:
+@st.fragment
+@run_timing.timed("availability tab")
+def availability_tab():
+    grid = load_data(parts=("availability",))["availability"]
     st.subheader("Manage Availability")
-    st.markdown("Legend: green = available, red = unavailable, grey = lunch")
+    if st.toggle("Batch edit", key="avail_batch", help="Edit the whole week, review the changes, save them at once"):
+        batch_editor(grid)
+    else:
+        st.session_state.pop("avail_seen", None)  # the next batch edit starts from the grid as it is then
+        st.markdown("Legend: green = available, red = unavailable, grey = lunch. Click a slot to toggle it.")
+        st.markdown("---")
+        single_cell_grid(grid)
     st.markdown("---")
-    for d_idx, day in enumerate(DAYS):
-        cols = st.columns([1.2] + [1 for _ in SLOTS])
-        cols[0].markdown(f"**{day}**")
-        for s_idx, slot_label in enumerate(SLOTS):
-            is_lunch = (s_idx == LUNCH_SLOT_INDEX)
-            avail = store.get("availability", {}).get(f"{d_idx}_{s_idx}", True)
-            if is_lunch:
-                cols[s_idx + 1].markdown("<div class='slot-box slot-lunch'>Lunch</div>", unsafe_allow_html=True)
-            else:
-                if avail:
-                    cols[s_idx + 1].markdown("<div class='slot-box slot-available'>Available</div>", unsafe_allow_html=True)
-                    if cols[s_idx + 1].button(f"Set Unavailable_{d_idx}_{s_idx}", key=f"un_{d_idx}_{s_idx}"):
-                        store["availability"][f"{d_idx}_{s_idx}"] = False
-                        persist()
-                        st.success("Slot set unavailable")
-                        safe_rerun()
-                else:
-                    cols[s_idx + 1].markdown("<div class='slot-box slot-unavailable'>Unavailable</div>", unsafe_allow_html=True)
-                    if cols[s_idx + 1].button(f"Set Available_{d_idx}_{s_idx}", key=f"av_{d_idx}_{s_idx}"):
-                        store["availability"][f"{d_idx}_{s_idx}"] = True
-                        persist()
-                        st.success("Slot set available")
-                        safe_rerun()
+    templates_panel(grid)
+
+
+def single_cell_grid(grid):
+    click = booking_grid(
+        DAYS, SLOTS,
+        encode_cells(len(DAYS), len(SLOTS), lambda d, s: LUNCH if s == LUNCH_SLOT_INDEX
+                     else AVAILABLE if grid.is_free(d, s) else BOOKED),
+        labels={AVAILABLE: "Available", BOOKED: "Unavailable", LUNCH: "Lunch"},
+        actions={AVAILABLE: "close", BOOKED: "open"},
+        key="admin_availability_grid",
+    )
+    if click:
+        free = click["action"] == "open"
+        persist(lambda data, d=click["day"], s=click["slot"], f=free: data["availability"].set_free(d, s, f))
+        st.success("Slot set available" if free else "Slot set unavailable")
+        safe_rerun("fragment")
+
+
+EDIT_SLOTS = [s for s in range(len(SLOTS)) if s != LUNCH_SLOT_INDEX]
+
+
+def batch_editor(grid):
+    """The week as one checkbox table; nothing is written until "Save changes" (one write)."""
+    gen = st.session_state.setdefault("avail_edit_gen", 0)  # bumped to drop the editor's edits
+    # the grid this edit session started from, kept across reruns: saving compares
+    # each cell with it, so changes made meanwhile by students or admins are kept
+    if st.session_state.get("avail_seen", (None,))[0] != gen:
+        st.session_state.avail_seen = (gen, grid.copy())
+    seen = st.session_state.avail_seen[1]
+    table = {"Slot": [SLOTS[s] for s in EDIT_SLOTS]}
+    table.update({day: [seen.is_free(d, s) for s in EDIT_SLOTS] for d, day in enumerate(DAYS)})
+    edited = st.data_editor(
+        table, key=f"avail_editor_{gen}", hide_index=True, use_container_width=True,
+        column_config={"Slot": st.column_config.TextColumn(disabled=True),
+                       **{day: st.column_config.CheckboxColumn(day) for day in DAYS}},
+    )
+    changes = {(d, s): bool(edited[day][i]) for d, day in enumerate(DAYS) for i, s in enumerate(EDIT_SLOTS)
+               if bool(edited[day][i]) != seen.is_free(d, s)}
+    st.session_state.avail_edited = {(d, s): bool(edited[day][i]) for d, day in enumerate(DAYS)
+                                     for i, s in enumerate(EDIT_SLOTS)}
+    if not changes:
+        st.caption("No changes yet. Tick a cell to make it available, untick to close it.")
+        return
+    held = booking_summary()["booked"]
+    st.markdown(f"**{len(changes)} change(s):**")
+    st.markdown("\n".join(
+        f"- {DAYS[d]} {SLOTS[s]}: {'unavailable → available' if free else 'available → unavailable'}"
+        + (" ⚠️ holds a booking, stays closed" if free and held[d][s] else "")
+        for (d, s), free in sorted(changes.items())))
+    b1, b2 = st.columns(2)
+    if b1.button(f"Save {len(changes)} change(s)", key="avail_save", type="primary"):
+        changed, booked = edit_availability(changes, seen=seen)
+        # toasts, unlike st.warning, survive the rerun below
+        if changed:
+            st.toast("Changed by someone else meanwhile, left as is: "
+                     + ", ".join(f"{DAYS[d]} {SLOTS[s]}" for d, s in changed), icon="⚠️")
+        if booked:
+            st.toast("Holds a booking, left closed (cancel the booking first): "
+                     + ", ".join(f"{DAYS[d]} {SLOTS[s]}" for d, s in booked), icon="⚠️")
+        st.session_state.avail_edit_gen = gen + 1
+        st.toast(f"Saved {len(changes) - len(changed) - len(booked)} change(s).")
+        safe_rerun("fragment")
+    if b2.button("Discard", key="avail_discard"):
+        st.session_state.avail_edit_gen = gen + 1
+        safe_rerun("fragment")
+
+
+def templates_panel(grid):
+    st.markdown("**Weekly templates**")
+    templates = availability_templates()
+    names = sorted(templates["grids"])
+    n1, n2 = st.columns([3, 1])
+    new_name = n1.text_input("Template name", key="tpl_name", placeholder="e.g. exam week, holiday")
+    if n2.button("Save week as template", key="tpl_save", disabled=not new_name.strip()):
+        # the batch editor's table if it is open, otherwise the grid as it is
+        week = grid.copy()
+        edited = st.session_state.get("avail_edited") if st.session_state.get("avail_batch") else None
+        for (d, s), free in (edited or {}).items():
+            week.set_free(d, s, free)
+        save_template(new_name.strip(), week)
+        st.toast(f"Template {new_name.strip()!r} saved.")
+        safe_rerun("fragment")
+    if not names:
+        st.caption("No templates yet.")
+        return
+
+    t1, t2, t3 = st.columns([2, 1, 1])
+    name = t1.selectbox("Template", names, key="tpl_pick")
+    if t2.button("Apply to this week", key="tpl_apply"):
+        apply_template(name)
+        st.toast(f"Applied {name!r} (past days stay locked, booked slots stay closed).")
+        safe_rerun()
+    if t3.button("Delete", key="tpl_delete"):
+        delete_template(name)
+        safe_rerun("fragment")
+    preview = AvailabilityGrid.from_json(templates["grids"][name])
+    st.caption(" · ".join(f"{day} {preview.free_count(d, exclude_slots=[LUNCH_SLOT_INDEX])} open"
+                          for d, day in enumerate(DAYS)))
+
+    now = datetime.now().date()
+    upcoming = [week_key(now + timedelta(weeks=i)) for i in range(1, 9)]
+    s1, s2 = st.columns([2, 1])
+    week = s1.selectbox("Use it for week", upcoming, key="tpl_week")
+    if s2.button("Schedule", key="tpl_schedule"):
+        schedule_template(week, name)
+        st.toast(f"{name!r} will be applied when {week} starts.")
+        safe_rerun("fragment")
+    for wk, tpl in sorted(templates["schedule"].items()):
+        c1, c2 = st.columns([3, 1])
+        c1.markdown(f"{wk}: **{tpl}**")
+        if c2.button("Unschedule", key=f"tpl_unschedule_{wk}"):
+            schedule_template(wk, None)
+            safe_rerun("fragment")
+
+
+with tabs[2]:
+    availability_tab()
 
 
 # --- Counsellors ---
-with tabs[3]:
+@st.fragment
+@run_timing.timed("counsellors tab")
+def counsellors_tab():
+    store = load_data()
     st.subheader("Counsellors")
     if not store.get("counsellors"):
         st.info("No counsellors configured.")
@@ -229,43 +399,144 @@ with tabs[3]:
             cols = st.columns([4, 1])
             cols[0].markdown(f"**{c['id']}. {c['name']}** — {c['specialty']}")
             if cols[1].button(f"Remove_{c['id']}", key=f"remc_{c['id']}"):
-                store["counsellors"] = [x for x in store["counsellors"] if x["id"] != c["id"]]
-                persist()
+                persist(lambda data, cid=c["id"]: data.update(counsellors=[x for x in data["counsellors"] if x["id"] != cid]))
                 st.success("Counsellor removed")
-                safe_rerun()
+                safe_rerun("fragment")
     st.markdown("---")
     st.subheader("Add counsellor")
     nc_name = st.text_input("Name", key="nc_name")
     nc_spec = st.text_input("Specialty", key="nc_spec")
     if st.button("Add counsellor"):
-        nid = max([c["id"] for c in store.get("counsellors", [])] + [0]) + 1
-        store.setdefault("counsellors", []).append({"id": nid, "name": nc_name or f"Counsellor {nid}", "specialty": nc_spec or "General"})
-        persist()
+        def _add_counsellor(data):
+            nid = max([c["id"] for c in data.get("counsellors", [])] + [0]) + 1
+            data.setdefault("counsellors", []).append({"id": nid, "name": nc_name or f"Counsellor {nid}", "specialty": nc_spec or "General"})
+        persist(_add_counsellor)
         st.success("Counsellor added")
-        safe_rerun()
+        safe_rerun("fragment")
+
+
+with tabs[3]:
+    counsellors_tab()
 
 
 # --- Chat logs ---
-with tabs[4]:
-    st.subheader("Chat Logs (placeholder)")
-    if not store.get("chat_logs"):
-        st.info("No chat logs recorded in demo mode.")
+@st.fragment
+@run_timing.timed("chat logs tab")
+def chat_logs_tab():
+    st.subheader("Chat Logs")
+    # one page per rerun, newest first; the stack holds the cursor of every page visited
+    if "chat_cursors" not in st.session_state:
+        st.session_state.chat_cursors = [None]
+    logs, older = chat_log_page(st.session_state.chat_cursors[-1])
+    if not logs and len(st.session_state.chat_cursors) == 1:
+        st.info("No chat logs recorded yet.")
     else:
-        for log in store.get("chat_logs", []):
+        page_no = len(st.session_state.chat_cursors)
+        st.caption(f"Page {page_no} (newest first)")
+        for log in logs:
             st.markdown(f"**{log.get('user','User')}** — {log.get('time','-')}")
             st.write(log.get("text", ""))
+        nav1, nav2 = st.columns(2)
+        if page_no > 1 and nav1.button("Newer", key="chat_newer"):
+            st.session_state.chat_cursors.pop()
+            safe_rerun("fragment")
+        if older is not None and nav2.button("Older", key="chat_older"):
+            st.session_state.chat_cursors.append(older)
+            safe_rerun("fragment")
+
+
+with tabs[4]:
+    chat_logs_tab()
 
 
 # --- Reports ---
-with tabs[5]:
+def heatmap_html(grid, skip_slots=()):
+    """Days x slots table shaded by count (darkest = busiest cell)."""
+    peak = max((max(row) for row in grid), default=0) or 1
+    head = "<tr><th></th>" + "".join(f"<th>{d}</th>" for d in DAYS) + "</tr>"
+    rows = []
+    for s, label in enumerate(SLOTS):
+        if s in skip_slots:
+            continue
+        cells = "".join(f'<td style="background:rgba(30,127,52,{grid[d][s] / peak:.2f})">{grid[d][s]}</td>'
+                        for d in range(len(DAYS)))
+        rows.append(f"<tr><th>{label}</th>{cells}</tr>")
+    return f'<table class="heat">{head}{"".join(rows)}</table>'
+
+
+def utilisation_dashboard():
+    stats = booking_summary(weeks=12)  # aggregates only: cost does not grow with the bookings
+    st.markdown("**Utilisation**")
+    view = st.radio("Show", ["Bookings made (all time)", "Booked now"], horizontal=True, key="heat_view")
+    grid = stats["made"] if view.startswith("Bookings made") else stats["booked"]
+    st.markdown(heatmap_html(grid, skip_slots=[LUNCH_SLOT_INDEX]), unsafe_allow_html=True)
+
+    st.markdown("**Week over week**")
+    weeks = stats["weeks"]
+    if not weeks:
+        st.info("No bookings recorded yet.")
+        return
+    cur, prev = weeks[-1], (weeks[-2] if len(weeks) > 1 else None)
+    m1, m2, m3 = st.columns(3)
+    m1.metric(f"Bookings ({cur['week']})", cur["booked"],
+              delta=cur["booked"] - prev["booked"] if prev else None)
+    m2.metric("Cancellation rate", f"{cur['cancel_rate']:.0%}",
+              delta=f"{(cur['cancel_rate'] - prev['cancel_rate']) * 100:+.0f} pts" if prev else None,
+              delta_color="inverse")
+    m3.metric("Avg lead time", f"{cur['lead_hours']:.0f} h" if cur["lead_hours"] is not None else "—")
+    st.line_chart({"week": [w["week"] for w in weeks], "booked": [w["booked"] for w in weeks],
+                   "cancelled": [w["cancelled"] for w in weeks]}, x="week")
+
+
+@st.fragment
+@run_timing.timed("reports tab")
+def reports_tab():
     st.subheader("Reports")
-    if st.button("Export bookings CSV"):
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(["day", "slot", "token", "timestamp"])
-        for b in store.get("bookings", []):
-            writer.writerow([DAYS[b["day"]], SLOTS[b["slot"]], b.get("token", ""), b.get("time", "")])
-        st.download_button("Download bookings.csv", data=buf.getvalue(), file_name="bookings.csv", mime="text/csv")
+    utilisation_dashboard()
+    st.markdown("---")
+    st.markdown("**Export**")
+    # nothing is read or generated until "Prepare export": the file is then streamed
+    # to a private directory chunk by chunk and handed to this session's download button
+    r1, r2 = st.columns(2)
+    dataset = r1.selectbox("Data", list(exports.DATASETS), key="exp_dataset",
+                           format_func=lambda k: k.replace("_", " ").capitalize())
+    fmt = r2.selectbox("Format", exports.available_formats(), key="exp_format", format_func=str.upper)
+    if dataset == "chat_logs":
+        picked = st.date_input("Dates", value=(), key="exp_dates")
+        date_from = picked[0].isoformat() if len(picked) > 0 else None
+        date_to = picked[-1].isoformat() if len(picked) > 0 else None
+    else:
+        first, last = st.select_slider("Days", options=list(range(len(DAYS))), value=(0, len(DAYS) - 1),
+                                       format_func=lambda d: DAYS[d], key="exp_days")
+
+    if st.button("Prepare export", key="exp_go"):
+        if dataset == "bookings":
+            rows = exports.booking_rows(first, last, days=DAYS, slots=SLOTS)
+        elif dataset == "chat_logs":
+            rows = exports.chat_log_rows(date_from, date_to)
+        else:
+            rows = exports.utilisation_rows(first, last, days=DAYS, exclude_slots=[LUNCH_SLOT_INDEX])
+        with st.spinner("Exporting..."):
+            st.session_state.last_export = exports.write_export(
+                dataset, fmt, rows, file_stem=f"{dataset}-{datetime.now():%Y%m%d-%H%M}")
+    done = st.session_state.get("last_export")
+    if done and os.path.exists(done["path"]):
+        # the file is read into this session's media memory only in the run where
+        # "Prepare download" was clicked; the next rerun (the download click itself
+        # included) no longer renders the button, and Streamlit frees the bytes
+        # once the download has been served
+        st.caption(f'{done["bytes"] / 1024:,.0f} KB, available for {exports.EXPORT_TTL_SECONDS // 60} minutes')
+        if done["bytes"] > exports.DOWNLOAD_MAX_BYTES:
+            st.warning(f"Exports over {exports.DOWNLOAD_MAX_BYTES // 2 ** 20} MB cannot be downloaded here; "
+                       "narrow the range or pick Parquet.")
+        elif st.button("Prepare download", key="exp_prepare"):
+            with open(done["path"], "rb") as f:
+                st.download_button(f"Download {done['file_name']}", data=f, file_name=done["file_name"],
+                                   mime=done["mime"], key="exp_download")
+
+
+with tabs[5]:
+    reports_tab()
 print("[Admin.py] module loaded")
 
 
@@ -273,5 +544,4 @@ st.markdown("</div>", unsafe_allow_html=True)
 st.markdown("</div>", unsafe_allow_html=True)
 st.caption("Heal Nest admin dashboard — protected by password. Data stored in data_store.json.")
 
-
-
+run_timing.run_finished("Admin.py full run", _run_started)
@@ -0,0 +1,185 @@
+# availability_grid.py — the store's availability as one bitmask per day
+#
+# data_store.json and the single-document Firestore payload keep availability in
+# the compact form {"slots": 9, "free": [...], "defined": [...]}; older stores,
+# sqlite_store and the sharded layout use {"<day>_<slot>": bool}. from_json()
+# reads either, and iter_cells() walks the cells that have been set, so the
+# backends and their migrations never split keys themselves.
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+GRID_DAYS = 7
+GRID_SLOTS = 9
+
+
+class AvailabilityGrid(MutableMapping):
+    """Availability as one bitmask per day: bit s of free[d] set means slot s is open.
+
+    `defined` marks cells that have been set at all; an undefined cell reads as
+    available, like the old dict's .get(key, True). The grid is also a mapping
+    over the legacy "d_s" keys, so store["availability"][f"{d}_{s}"] still works,
+    and grows when a day or slot beyond its size is written.
+    """
+
+    def __init__(self, days: int = GRID_DAYS, slots: int = GRID_SLOTS,
+                 free: Optional[List[int]] = None, defined: Optional[List[int]] = None):
+        self.days = days
+        self.slots = slots
+        self.free = list(free) if free is not None else [0] * days
+        self.defined = list(defined) if defined is not None else [0] * days
+
+    # ---- cell access ----
+    def _full(self) -> int:
+        return (1 << self.slots) - 1
+
+    def _grow(self, day: int, slot: int) -> None:
+        if day >= self.days:
+            self.free += [0] * (day + 1 - self.days)
+            self.defined += [0] * (day + 1 - self.days)
+            self.days = day + 1
+        if slot >= self.slots:
+            self.slots = slot + 1
+
+    def is_free(self, day: int, slot: int) -> bool:
+        if not (0 <= day < self.days and 0 <= slot < self.slots):
+            return True
+        bit = 1 << slot
+        return not (self.defined[day] & bit) or bool(self.free[day] & bit)
+
+    def set_free(self, day: int, slot: int, free: bool = True) -> None:
+        self._grow(day, slot)
+        bit = 1 << slot
+        self.defined[day] |= bit
+        if free:
+            self.free[day] |= bit
+        else:
+            self.free[day] &= ~bit
+
+    def is_defined(self, day: int, slot: int) -> bool:
+        return 0 <= day < self.days and 0 <= slot < self.slots and bool(self.defined[day] & (1 << slot))
+
+    def iter_cells(self) -> Iterator[Tuple[int, int, bool]]:
+        """(day, slot, free) for every cell that has been set."""
+        for d in range(self.days):
+            for s in range(self.slots):
+                bit = 1 << s
+                if self.defined[d] & bit:
+                    yield d, s, bool(self.free[d] & bit)
+
+    # ---- whole-grid operations ----
+    def reset(self, free: bool = True) -> None:
+        full = self._full()
+        self.free = [full if free else 0] * self.days
+        self.defined = [full] * self.days
+
+    def set_day(self, day: int, free: bool) -> None:
+        self._grow(day, 0)
+        self.free[day] = self._full() if free else 0
+        self.defined[day] = self._full()
+
+    def lock_before(self, day: int) -> List[int]:
+        """Make every slot of days < `day` unavailable; returns the days that changed."""
+        changed = []
+        for d in range(min(day, self.days)):
+            if self.free[d] or self.defined[d] != self._full():
+                self.free[d], self.defined[d] = 0, self._full()
+                changed.append(d)
+        return changed
+
+    def _open_mask(self, day: int, exclude: int = 0) -> int:
+        full = self._full()
+        return (self.free[day] | (~self.defined[day] & full)) & ~exclude & full
+
+    @staticmethod
+    def slot_mask(slots: Iterable[int]) -> int:
+        mask = 0
+        for s in slots:
+            mask |= 1 << s
+        return mask
+
+    def free_count(self, day: int, exclude_slots: Iterable[int] = ()) -> int:
+        return bin(self._open_mask(day, self.slot_mask(exclude_slots))).count("1")
+
+    def free_counts(self, exclude_slots: Iterable[int] = ()) -> List[int]:
+        exclude = self.slot_mask(exclude_slots)
+        return [bin(self._open_mask(d, exclude)).count("1") for d in range(self.days)]
+
+    def next_free(self, day: int = 0, slot: int = 0,
+                  exclude_slots: Iterable[int] = ()) -> Optional[Tuple[int, int]]:
+        """First open (day, slot) at or after (day, slot), scanning day by day."""
+        exclude = self.slot_mask(exclude_slots)
+        for d in range(max(day, 0), self.days):
+            mask = self._open_mask(d, exclude)
+            if d == day:
+                mask &= ~((1 << slot) - 1)
+            if mask:
+                return d, (mask & -mask).bit_length() - 1
+        return None
+
+    # ---- serialisation ----
+    def to_json(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"slots": self.slots, "free": list(self.free)}
+        if any(m != self._full() for m in self.defined):
+            out["defined"] = list(self.defined)
+        return out
+
+    @classmethod
+    def from_json(cls, obj: Any) -> "AvailabilityGrid":
+        """Accepts the compact form, a legacy {"d_s": bool} dict, or None."""
+        if isinstance(obj, AvailabilityGrid):
+            return obj.copy()
+        if isinstance(obj, Mapping) and "free" in obj and "slots" in obj:
+            free = [int(m) for m in obj["free"]]
+            full = (1 << int(obj["slots"])) - 1
+            defined = [int(m) for m in obj.get("defined", [full] * len(free))]
+            return cls(len(free), int(obj["slots"]), free, defined)
+        grid = cls()
+        for k, v in (obj or {}).items():
+            d, s = split_cell_key(k)
+            grid.set_free(d, s, bool(v))
+        return grid
+
+    def copy(self) -> "AvailabilityGrid":
+        return AvailabilityGrid(self.days, self.slots, self.free, self.defined)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, AvailabilityGrid):
+            return self.slots == other.slots and self.free == other.free and self.defined == other.defined
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"AvailabilityGrid({self.to_json()!r})"
+
+    # ---- legacy "d_s" mapping ----
+    def __getitem__(self, key: str) -> bool:
+        d, s = split_cell_key(key)
+        if not self.is_defined(d, s):
+            raise KeyError(key)
+        return bool(self.free[d] & (1 << s))
+
+    def __setitem__(self, key: str, value: bool) -> None:
+        d, s = split_cell_key(key)
+        self.set_free(d, s, bool(value))
+
+    def __delitem__(self, key: str) -> None:
+        d, s = split_cell_key(key)
+        if not self.is_defined(d, s):
+            raise KeyError(key)
+        self.defined[d] &= ~(1 << s)
+        self.free[d] &= ~(1 << s)
+
+    def __iter__(self):
+        for d in range(self.days):
+            for s in range(self.slots):
+                if self.defined[d] & (1 << s):
+                    yield f"{d}_{s}"
+
+    def __len__(self) -> int:
+        return sum(bin(m).count("1") for m in self.defined)
+
+
+def split_cell_key(key: str) -> Tuple[int, int]:
+    d, s = str(key).split("_", 1)
+    return int(d), int(s)
@@ -0,0 +1,99 @@
+# bench_reruns.py — server time per interaction in mental.py and Admin.py, full reruns vs fragments
+#
+#   python bench_reruns.py [--runs 25]
+#
+# Each interaction is replayed --runs times through Streamlit's AppTest, in a
+# throwaway copy of the app so the working tree's store is never touched, and
+# the median wall time of the rerun is reported. AppTest on its own always
+# reruns the whole script; here the rerun request carries the id of the
+# fragment holding the widget, which is what the browser sends for a widget
+# inside an @st.fragment, so only that fragment runs. Copied into a checkout
+# from before the tabs became fragments, the same script measures full reruns.
+# The run_timing summary (full runs vs fragment runs) is printed when present.
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COPY = (".py", ".json", ".png")
+
+
+def fragment_ids(at):
+    storage = at._fragment_storage
+    return sorted(storage._fragments, key=lambda k: storage._registration_sequence_by_id[k])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=25)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_reruns-")
+    for name in os.listdir(HERE):
+        src = os.path.join(HERE, name)
+        if name in ("booking_grid_frontend", ".streamlit", "static"):
+            shutil.copytree(src, os.path.join(work, name))
+        elif name.endswith(COPY) and name != "data_store.json":
+            shutil.copy(src, work)
+    os.chdir(work)
+    sys.path.insert(0, work)
+
+    import streamlit.testing.v1.local_script_runner as lsr
+    from streamlit.testing.v1 import AppTest
+
+    queue = []
+    rerun_data = lsr.RerunData
+    lsr.RerunData = lambda **kw: rerun_data(fragment_id_queue=list(queue), **kw)
+
+    def timed(at, act, fragment=None):
+        out = []
+        for i in range(args.runs):
+            act(at, i)
+            ids = fragment_ids(at)
+            queue[:] = [ids[fragment]] if ids and fragment is not None else []
+            t0 = time.perf_counter()
+            at.run()
+            out.append((time.perf_counter() - t0) * 1000)
+            queue.clear()
+            if at.exception:
+                raise SystemExit(f"[bench_reruns] {at.exception}")
+        return statistics.median(out)
+
+    def next_page(at, i):
+        nav = [b for b in at.button if b.key in ("res_next", "res_prev")]
+        (nav[-1] if nav[-1].key == "res_next" else nav[0]).click()
+
+    results = {}
+    at = AppTest.from_file(os.path.join(work, "mental.py"), default_timeout=60)
+    at.session_state["show_booking"] = True
+    at.run()
+    results["mental.py full rerun (booking page)"] = timed(at, lambda at, i: None)
+    results["mental.py token lookup"] = timed(
+        at, lambda at, i: at.text_input(key="verify_token").set_value(f"tok{i:05d}"), 0)
+    at = AppTest.from_file(os.path.join(work, "mental.py"), default_timeout=60)
+    at.session_state["show_resources"] = True
+    at.run()
+    results["mental.py full rerun (home + resources)"] = timed(at, lambda at, i: None)
+    results["mental.py resource paging"] = timed(at, next_page, 0)
+    at = AppTest.from_file(os.path.join(work, "Admin.py"), default_timeout=60)
+    at.run()
+    at.sidebar.text_input[0].input(os.environ.get("ADMIN_PASSWORD", "adminpass")).run()
+    results["Admin.py full rerun"] = timed(at, lambda at, i: None)
+    results["Admin.py token lookup (Bookings tab)"] = timed(
+        at, lambda at, i: at.text_input(key="admin_token_lookup").set_value(f"tok{i:05d}"), 1)
+
+    print(f"median of {args.runs} reruns:")
+    for label, ms in results.items():
+        print(f"  {label:40s} {ms:6.1f} ms")
+    if "run_timing" in sys.modules:
+        for label, s in sorted(sys.modules["run_timing"].summary().items()):
+            print(f"  run_timing {label:24s} n={s['count']:4d} mean={s['mean_ms']:6.1f} ms")
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench_search.py — Resources Hub search latency from the real catalogue up to 50k resources
+#
+#   python bench_search.py [sizes...]      (default: 30 500 5000 50000)
+#
+# Synthetic resources reuse the real catalogue's vocabulary (Zipf-weighted) plus
+# a long tail of generated words, so posting lists grow with the catalogue the
+# way they would with real content. Besides the overall figures, p95 is given
+# per kind of query: one term (the walk stops at the result limit), several
+# terms (capped at the rarest term's top IMPACT_TIER postings) and several
+# terms under a tag filter (the filter's docs are scored when it is the
+# narrower set, so that cost follows the filter's size).
+import random
+import statistics
+import sys
+import time
+
+from resource_search import SearchIndex, tokenize
+from resources_catalog import get_catalog
+
+QUERIES = ["stress", "medit", "meditaton", "breath calm", "focus study", "podcast self care",
+           "sleep", "anxiety exam", "xq", "timemanagement"]
+TAG_FILTERS = [(), ("meditation",), ("study", "stress")]
+RUNS = 20
+
+
+def synthetic(n: int, base, seed: int = 7):
+    rnd = random.Random(seed)
+    words = sorted({w for r in base for w in tokenize(r["title"] + " " + r["desc"])})
+    tail = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(4, 9)))
+            for _ in range(max(100, n // 5))]
+    vocab = words + tail
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    tags = sorted({t for r in base for t in r["tags"]})
+    out = list(base[:n])
+    for i in range(len(out), n):
+        title = rnd.choices(vocab, weights, k=rnd.randint(3, 7))
+        desc = rnd.choices(vocab, weights, k=rnd.randint(10, 25))
+        out.append({"id": f"s{i}", "title": " ".join(title).capitalize(), "desc": " ".join(desc),
+                    "tags": rnd.sample(tags, rnd.randint(1, 3)), "type": "link", "url": "https://example.org"})
+    return out
+
+
+def bench(n: int, base) -> None:
+    resources = synthetic(n, base)
+    t0 = time.perf_counter()
+    index = SearchIndex(resources)
+    build = time.perf_counter() - t0
+    cold, timings = [], []
+    by_kind = {"one term": [], "multi-term": [], "multi-term + tags": []}
+    for q in QUERIES:
+        for tags in TAG_FILTERS:
+            kind = by_kind["one term" if len(tokenize(q)) == 1 else "multi-term + tags" if tags else "multi-term"]
+            for run in range(RUNS + 1):
+                t0 = time.perf_counter()
+                index.search(q, tags, limit=24)
+                # the first run also sorts the posting lists it touches into impact order
+                if run == 0:
+                    cold.append(time.perf_counter() - t0)
+                else:
+                    timings.append(time.perf_counter() - t0)
+                    kind.append(timings[-1])
+    timings.sort()
+    p50 = statistics.median(timings) * 1000
+    print(f"{n:>7} resources  build {build * 1000:8.1f} ms  query p50 {p50:6.3f} ms  p95 {_p95(timings):6.3f} ms"
+          f"  max {timings[-1] * 1000:6.3f} ms  first-run max {max(cold) * 1000:6.3f} ms  "
+          + "  ".join(f"{k} p95 {_p95(v):6.3f} ms" for k, v in by_kind.items()))
+
+
+def _p95(timings) -> float:
+    return sorted(timings)[int(len(timings) * 0.95)] * 1000
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [30, 500, 5000, 50000]
+    base = get_catalog().resources
+    for n in sizes:
+        bench(n, base)
@@ -0,0 +1,52 @@
+# booking_grid.py — weekly slot grid as a single bidirectional Streamlit component
+#
+# Payload (v1), one element however many cells:
+#   {"v": 1, "days": [...], "slots": [...],          any number of slots (e.g. 15-minute ones)
+#    "lanes": [{"id": ..., "label": ...}],           one per counsellor; a single lane for now
+#    "cells": ["aabl..."],                           per lane: one state code per (day, slot), row-major
+#    "labels": {"a": "Available", ...},              text shown in a cell per state code
+#    "actions": {"a": "book", ...},                  state codes that are clickable, and what a click means
+#    "cell_height": 48}
+# A click comes back as {"lane", "day", "slot", "action", "seq"}.
+import os
+from typing import Callable, Dict, Any, List, Optional, Sequence, Union
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+AVAILABLE, BOOKED, LUNCH, LOCKED = "a", "b", "l", "x"
+
+_component = components.declare_component(
+    "booking_grid", path=os.path.join(os.path.dirname(__file__), "booking_grid_frontend")
+)
+
+
+def encode_cells(days: int, slots: int, state: Callable[[int, int], str]) -> str:
+    """One lane's cells as a state-code string, row-major by day."""
+    return "".join(state(d, s) for d in range(days) for s in range(slots))
+
+
+def booking_grid(days: Sequence[str], slots: Sequence[str], cells: Union[str, List[str]],
+                 labels: Dict[str, str], actions: Dict[str, str], key: str,
+                 lanes: Optional[List[Dict[str, str]]] = None, cell_height: int = 48) -> Optional[Dict[str, Any]]:
+    """Render the grid. Returns the click that caused this rerun, or None.
+
+    The component keeps reporting its last value on every rerun, so each click
+    (identified by its seq) is handed back exactly once.
+    """
+    payload = {
+        "v": 1,
+        "days": list(days),
+        "slots": list(slots),
+        "lanes": lanes or [{"id": "all", "label": ""}],
+        "cells": [cells] if isinstance(cells, str) else list(cells),
+        "labels": labels,
+        "actions": actions,
+        "cell_height": cell_height,
+    }
+    click = _component(payload=payload, key=key, default=None)
+    seen = f"_{key}_seen"
+    if not click or click.get("seq") == st.session_state.get(seen):
+        return None
+    st.session_state[seen] = click["seq"]
+    return click
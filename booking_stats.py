@@ -0,0 +1,164 @@
+# booking_stats.py — booking aggregates kept beside the bookings, O(1) per booking / cancellation
+#
+# The "stats" store part, one entry per day:
+#   {"<day>": {"booked": [n per slot],      bookings held now
+#              "made":   [n per slot],      bookings ever made: which slots fill up first
+#              "weeks":  {"2026-W43": [booked, cancelled, lead_hours, lead_n]}}}
+# A booking counts in the week it was made, and so does its cancellation, so
+# cancelled / booked is the share of a week's bookings that were later cancelled.
+# Lead time is the hours from making a booking to the start of its slot.
+#
+# Per day because that is what the sharded Firestore layout can change in the
+# same guarded write as the day's availability shard. data_store_utils, the
+# SQLite backend and the shards all apply the same on_book / on_cancel here;
+# the Admin Overview and Reports dashboard read summary(), never the bookings.
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+
+RESET_WEEK_ON_SUNDAY = os.environ.get("RESET_WEEK_ON_SUNDAY", "1").lower() in ("1", "true", "yes")
+FIRST_SLOT_HOUR = int(os.environ.get("FIRST_SLOT_HOUR", "9"))   # slot 0 is "9 A.M. to 10 A.M."
+KEEP_WEEKS = 104
+
+Stats = Dict[str, Dict[str, Any]]
+
+
+# ---------- Calendar ----------
+def week_key(day: date) -> str:
+    """Calendar week `day` belongs to; with RESET_WEEK_ON_SUNDAY, Sunday opens the next one."""
+    if RESET_WEEK_ON_SUNDAY:
+        day += timedelta(days=1)
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _parse(time_iso: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(time_iso).replace(tzinfo=None) if time_iso else None
+    except (TypeError, ValueError):
+        return None
+
+
+def booking_week(time_iso: Optional[str]) -> str:
+    """Week a booking made at `time_iso` counts in (this week if the time is unknown)."""
+    made = _parse(time_iso)
+    return week_key(made.date() if made else date.today())
+
+
+def lead_hours(day: int, slot: int, time_iso: Optional[str]) -> Optional[float]:
+    """Hours between making the booking and the start of (day, slot) in that booking week."""
+    made = _parse(time_iso)
+    if made is None:
+        return None
+    base = made.date()
+    if RESET_WEEK_ON_SUNDAY and base.weekday() == 6:
+        monday = base + timedelta(days=1)
+    else:
+        monday = base - timedelta(days=base.weekday())
+    start = datetime.combine(monday + timedelta(days=day), time(min(FIRST_SLOT_HOUR + slot, 23)))
+    return max(0.0, round((start - made).total_seconds() / 3600, 2))
+
+
+# ---------- Updates ----------
+def empty_day(slots: int = 0) -> Dict[str, Any]:
+    return {"booked": [0] * slots, "made": [0] * slots, "weeks": {}}
+
+
+def _copy_day(entry: Optional[Dict[str, Any]], slot: int) -> Dict[str, Any]:
+    """Fresh copy of one day's entry (cached stores share theirs), long enough for `slot`."""
+    entry = entry or empty_day()
+    out = {"booked": list(entry.get("booked") or []), "made": list(entry.get("made") or []),
+           "weeks": dict(entry.get("weeks") or {})}
+    for key in ("booked", "made"):
+        out[key] += [0] * (slot + 1 - len(out[key]))
+    if len(out["weeks"]) > KEEP_WEEKS:
+        for week in sorted(out["weeks"])[:-KEEP_WEEKS]:
+            del out["weeks"][week]
+    return out
+
+
+def _week_row(entry: Dict[str, Any], week: str) -> List[float]:
+    row = list(entry["weeks"].get(week) or [0, 0, 0.0, 0])
+    entry["weeks"][week] = row
+    return row
+
+
+def book_day(entry: Optional[Dict[str, Any]], day: int, slot: int, time_iso: Optional[str]) -> Dict[str, Any]:
+    """One day's entry after a booking of (day, slot) made at `time_iso`."""
+    out = _copy_day(entry, slot)
+    out["booked"][slot] += 1
+    out["made"][slot] += 1
+    row = _week_row(out, booking_week(time_iso))
+    row[0] += 1
+    lead = lead_hours(day, slot, time_iso)
+    if lead is not None:
+        row[2] = round(row[2] + lead, 2)
+        row[3] += 1
+    return out
+
+
+def cancel_day(entry: Optional[Dict[str, Any]], slot: int, time_iso: Optional[str]) -> Dict[str, Any]:
+    """One day's entry after cancelling a booking on `slot` made at `time_iso`."""
+    out = _copy_day(entry, slot)
+    out["booked"][slot] = max(0, out["booked"][slot] - 1)
+    _week_row(out, booking_week(time_iso))[1] += 1
+    return out
+
+
+def on_book(stats: Optional[Stats], booking: Dict[str, Any]) -> Stats:
+    """`stats` after `booking` was made; only its day's entry is copied."""
+    key = str(booking["day"])
+    out = dict(stats or {})
+    out[key] = book_day(out.get(key), booking["day"], booking["slot"], booking.get("time"))
+    return out
+
+
+def on_cancel(stats: Optional[Stats], booking: Dict[str, Any]) -> Stats:
+    key = str(booking["day"])
+    out = dict(stats or {})
+    out[key] = cancel_day(out.get(key), booking["slot"], booking.get("time"))
+    return out
+
+
+def on_clear(stats: Optional[Stats]) -> Stats:
+    """All bookings removed at once (not counted as cancellations)."""
+    out = {}
+    for key, entry in (stats or {}).items():
+        out[key] = _copy_day(entry, 0)
+        out[key]["booked"] = [0] * len(out[key]["booked"])
+    return out
+
+
+def rebuild(bookings: Iterable[Dict[str, Any]]) -> Stats:
+    """Stats for stores that predate them: current bookings only, no cancellation history."""
+    stats: Stats = {}
+    for b in bookings:
+        stats = on_book(stats, b)
+    return stats
+
+
+# ---------- Reading ----------
+def summary(stats: Optional[Stats], days: int, slots: int, weeks: int = 8) -> Dict[str, Any]:
+    """Dashboard figures: per-cell grids, totals and the last `weeks` weeks, oldest first."""
+    stats = stats or {}
+    booked = [[0] * slots for _ in range(days)]
+    made = [[0] * slots for _ in range(days)]
+    by_week: Dict[str, List[float]] = {}
+    for key, entry in stats.items():
+        d = int(key)
+        if not 0 <= d < days:
+            continue
+        for s, n in enumerate((entry.get("booked") or [])[:slots]):
+            booked[d][s] = n
+        for s, n in enumerate((entry.get("made") or [])[:slots]):
+            made[d][s] = n
+        for week, row in (entry.get("weeks") or {}).items():
+            acc = by_week.setdefault(week, [0, 0, 0.0, 0])
+            for i, v in enumerate(row):
+                acc[i] += v
+    trend = [{"week": week, "booked": int(b), "cancelled": int(c),
+              "cancel_rate": round(c / b, 4) if b else 0.0,
+              "lead_hours": round(lh / ln, 1) if ln else None}
+             for week, (b, c, lh, ln) in sorted(by_week.items())[-weeks:]]
+    return {"booked": booked, "made": made, "total": sum(map(sum, booked)),
+            "per_day": [sum(row) for row in booked], "weeks": trend}
@@ -0,0 +1,213 @@
+# chat_log_store.py — append-only chat logs, kept out of the main store
+#
+# ChatLogStore: size-rotated segment files, for the JSON / journal / SQLite backends
+#   {directory}/chat-000001.jsonl, chat-000002.jsonl, ...  one JSON entry per line
+# FirestoreChatLog: one document per entry, for both Firestore layouts
+#   {collection}/{doc_id}/chat_logs/{auto id}  {"seq": int, "n": int, "user": str, "time": str, "text": str}
+#
+# append() is a single O_APPEND write to the newest segment, rotated once it
+# passes segment_bytes, so it costs the same however long the history is.
+# Readers page newest-first with a (segment, line) cursor and only ever parse
+# the segments a page touches. On Firestore, where containers share no disk,
+# append() creates one document and a page is one query ordered by (seq, n):
+# seq is time.time_ns() (a Firestore integer is signed 64-bit, so nothing
+# finer), n a per-process counter that keeps entries of one nanosecond apart.
+# The two-field order needs a composite index on chat_logs (seq desc, n desc).
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+SEGMENT_BYTES = int(os.environ.get("CHAT_SEGMENT_BYTES", str(256 * 1024)))
+PAGE_SIZE = 50
+_SEGMENT_RE = re.compile(r"^chat-(\d{6})\.jsonl$")
+_SEALED_CACHE = 4   # parsed sealed segments kept in memory
+
+Cursor = Tuple[int, int]   # (segment number, entries of that segment still unread); Firestore: (seq, n)
+BATCH_LIMIT = 450          # Firestore caps a write batch at 500 operations
+
+
+class ChatLogStore:
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.location = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._seg = 0
+        self._sealed: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+
+    # ---------- Segments ----------
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"chat-{seg:06d}.jsonl")
+
+    def segments(self) -> List[int]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, names) if m)
+
+    def _open(self, seg: int) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        os.makedirs(self.directory, exist_ok=True)
+        self._fd = os.open(self._path(seg), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._seg = seg
+
+    def _writable(self) -> int:
+        """fd of the newest segment; rotates when it is full or another process already did."""
+        if self._fd is None or not os.path.exists(self._path(self._seg)):  # first use, or cleared
+            existing = self.segments()
+            self._open(existing[-1] if existing else 1)
+        while os.path.exists(self._path(self._seg + 1)):
+            self._open(self._seg + 1)
+        if os.fstat(self._fd).st_size >= self.segment_bytes:
+            self._open(self._seg + 1)
+        return self._fd
+
+    # ---------- Writes ----------
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            # one write() on an O_APPEND fd: lines from concurrent processes never interleave
+            os.write(self._writable(), line)
+
+    def log(self, user: str, text: str, time_iso: Optional[str] = None) -> None:
+        self.append({"user": user, "time": time_iso or datetime.now().isoformat(), "text": text})
+
+    def extend(self, entries: List[Dict[str, Any]]) -> int:
+        for entry in entries:
+            self.append(entry)
+        return len(entries)
+
+    # ---------- Reads ----------
+    def _read_segment(self, seg: int, sealed: bool) -> List[Dict[str, Any]]:
+        # sealed segments never change again, so their parsed lines are reusable
+        with self._lock:
+            if seg in self._sealed:
+                self._sealed.move_to_end(seg)
+                return self._sealed[seg]
+        entries: List[Dict[str, Any]] = []
+        try:
+            with open(self._path(seg), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn last line of a crashed writer
+        except FileNotFoundError:
+            return entries
+        if sealed:
+            with self._lock:
+                self._sealed[seg] = entries
+                while len(self._sealed) > _SEALED_CACHE:
+                    self._sealed.popitem(last=False)
+        return entries
+
+    def read_page(self, cursor: Optional[Cursor] = None,
+                  limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        """Up to `limit` entries, newest first, starting at `cursor` (None = the newest).
+        Returns (entries, cursor for the next older page, or None at the start of history)."""
+        segs = self.segments()
+        newest = segs[-1] if segs else None
+        if cursor is not None:
+            segs = [s for s in segs if s <= cursor[0]]
+        out: List[Dict[str, Any]] = []
+        for seg in reversed(segs):
+            entries = self._read_segment(seg, sealed=seg != newest)
+            end = len(entries)
+            if cursor is not None and seg == cursor[0]:
+                end = min(end, cursor[1])
+            take = min(end, limit - len(out))
+            out.extend(reversed(entries[end - take:end]))
+            if len(out) >= limit:
+                rest = end - take
+                if rest > 0:
+                    return out, (seg, rest)
+                older = [s for s in segs if s < seg]
+                return out, ((older[-1], 1 << 62) if older else None)
+        return out, None
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Every entry, oldest first, streamed line by line (exports; nothing is cached)."""
+        for seg in self.segments():
+            try:
+                with open(self._path(seg), "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                continue  # cleared while we were reading
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._sealed.clear()
+        for seg in self.segments():
+            os.remove(self._path(seg))
+
+
+class FirestoreChatLog:
+    """Same interface as ChatLogStore, over a Firestore collection."""
+
+    def __init__(self, client, collection):
+        self.client = client
+        self.collection = collection
+        self.location = collection.path
+        self._count = itertools.count()
+
+    # ---------- Writes ----------
+    def append(self, entry: Dict[str, Any]) -> None:
+        # time-ordered across containers; n keeps one process's entries apart
+        self.collection.document().create(dict(entry, seq=time.time_ns(), n=next(self._count) % 1000))
+
+    def log(self, user: str, text: str, time_iso: Optional[str] = None) -> None:
+        self.append({"user": user, "time": time_iso or datetime.now().isoformat(), "text": text})
+
+    def extend(self, entries: List[Dict[str, Any]]) -> int:
+        for entry in entries:
+            self.append(entry)
+        return len(entries)
+
+    # ---------- Reads ----------
+    @staticmethod
+    def _entry(snap) -> Dict[str, Any]:
+        entry = snap.to_dict() or {}
+        entry.pop("seq", None)
+        entry.pop("n", None)
+        return entry
+
+    def read_page(self, cursor: Optional[Cursor] = None,
+                  limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        """As ChatLogStore.read_page; the cursor is (seq, n) of the last entry returned."""
+        query = self.collection.order_by("seq", "DESCENDING").order_by("n", "DESCENDING")
+        if cursor is not None:
+            query = query.start_after({"seq": cursor[0], "n": cursor[1]})
+        snaps = list(query.limit(limit + 1).stream())
+        page = snaps[:limit]
+        if len(snaps) <= limit:
+            return [self._entry(s) for s in page], None
+        last = page[-1].to_dict()
+        return [self._entry(s) for s in page], (last["seq"], last.get("n", 0))
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        for snap in self.collection.order_by("seq").order_by("n").stream():
+            yield self._entry(snap)
+
+    def clear(self) -> None:
+        refs = [snap.reference for snap in self.collection.stream()]
+        for i in range(0, len(refs), BATCH_LIMIT):
+            batch = self.client.batch()
+            for ref in refs[i:i + BATCH_LIMIT]:
+                batch.delete(ref)
+            batch.commit()
@@ -1,8 +1,30 @@
 # data_store_utils.py
+import atexit
+import bisect
+import copy
 import json
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 from threading import Lock
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import booking_stats
+import chat_log_store
+from availability_grid import GRID_DAYS, GRID_SLOTS, AvailabilityGrid
+from booking_stats import RESET_WEEK_ON_SUNDAY, week_key
+
+try:
+    import fcntl  # POSIX
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+try:
+    import msvcrt  # Windows
+except ImportError:
+    msvcrt = None
 
 # ---------- File-based defaults ----------
 DATA_FILE = os.path.join(os.path.dirname(__file__), "data_store.json")
@@ -11,81 +33,1505 @@ DEFAULT_STORE = {
     "availability": {},   # "d_s" (e.g. "0_3") -> bool
     "bookings": [],       # {"day":int,"slot":int,"token":str,"time":str}
     "counsellors": [],    # {"id":int,"name":str,"specialty":str}
-    "chat_logs": [],      # optional
+    "chat_logs": [],      # legacy; chat logs now live in chat_log_store segments
+    "meta": {},           # {"schema": int, "week": "YYYY-Www", "locked_on": "YYYY-MM-DD"}
+    "stats": {},          # booking aggregates per day, see booking_stats
+    "templates": {},      # {"grids": {name: compact grid}, "schedule": {"YYYY-Www": name}}
+    "archive": {},        # {"YYYY-Www": [booking, ...]}: bookings of closed weeks, see rollover()
 }
 
 _lock = Lock()
 
+# ---------- Cross-process locking / versioning ----------
+# Writers from every process (mental.py, Admin.py, replicas) serialise on an
+# OS-level lock on LOCK_FILE, which also holds the current store version.
+# load_data() tags the store with "_version"; save_data() refuses (StoreConflict)
+# to write a store loaded at an older version than the one on disk.
+LOCK_FILE = DATA_FILE + ".lock"
+STORE_RETRIES = int(os.environ.get("STORE_RETRIES", "10"))
+VERSION_KEY = "_version"
+STAMP_KEY = "_stamp"   # set by a save: store_version() right after it, taken under the write's lock
+
+
+class StoreConflict(Exception):
+    """The store changed since it was loaded; reload, reapply and save again."""
+
+# ---------- Journal (write-ahead log) setup ----------
+# With USE_JOURNAL the JSON file is only a snapshot: each save_data() appends the
+# difference against the last persisted state as one line to JOURNAL_FILE, and
+# load_data() replays snapshot + journal. Once the journal grows past
+# JOURNAL_COMPACT_BYTES a background thread folds it back into the snapshot.
+USE_JOURNAL = os.environ.get("USE_JOURNAL", "").lower() in ("1", "true", "yes")
+JOURNAL_FILE = DATA_FILE + ".journal"
+JOURNAL_COMPACT_BYTES = int(os.environ.get("JOURNAL_COMPACT_BYTES", str(256 * 1024)))
+
+_journal_base: Optional[Dict[str, Any]] = None   # last state known to be on disk
+_journal_version = 0                              # version (= seq) of _journal_base
+_compaction_thread: Optional[threading.Thread] = None
+
+# ---------- Write-behind setup ----------
+# With WRITE_BEHIND, update_data() applies the mutation to this process's view
+# at once and queues it; a background thread folds everything queued within
+# WRITE_BEHIND_WINDOW seconds into one save. Bookings and cancellations always
+# write synchronously (sync=True), and flush() / interpreter exit drain the queue.
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+WRITE_BEHIND_WINDOW = float(os.environ.get("WRITE_BEHIND_WINDOW", "0.5"))
+
+_wb_cond = threading.Condition()
+_wb_flush_lock = Lock()
+_wb_pending: List[Tuple[Callable[[Dict[str, Any]], Any], Optional[Tuple[str, ...]]]] = []
+_wb_thread: Optional[threading.Thread] = None
+_wb_queued = 0
+_wb_flushes = 0
+
+# ---------- Change notification setup ----------
+# One watcher thread per process probes store_version() every STORE_WATCH_SECONDS
+# (a stat, a SQLite counter, or a Firestore metadata read that a snapshot
+# listener cuts short). Only when that moved does it reload the watched parts,
+# bumping a per-part counter for those whose content really changed. Sessions
+# compare change_version(part) with what they rendered: no store I/O at all.
+STORE_WATCH_SECONDS = float(os.environ.get("STORE_WATCH_SECONDS", "1.0"))
+WATCHED_PARTS = ("availability", "bookings")
+
+_watch_cond = threading.Condition()
+_watch_wake = threading.Event()
+_watch_thread: Optional[threading.Thread] = None
+_watch_listener = None
+_watch_stamp: Any = None
+_watch_seen: Dict[str, Any] = {}
+_change_versions: Dict[str, int] = {p: 0 for p in WATCHED_PARTS}
+
+# ---------- Read cache setup ----------
+# load_data() keeps the last parsed store per process and only re-reads when the
+# backend's version stamp moved (file inode/size/mtime, or Firestore update_time).
+READ_CACHE = os.environ.get("READ_CACHE", "1").lower() in ("1", "true", "yes")
+
+_cache_lock = Lock()
+_cache_stamp: Any = None
+_cache_data: Optional[Dict[str, Any]] = None
+_cache_hits = 0
+_cache_misses = 0
+
 # ---------- Firestore setup ----------
 USE_FIRESTORE = os.environ.get("USE_FIRESTORE", "").lower() in ("1", "true", "yes")
 FIRESTORE_COLLECTION = os.environ.get("FIRESTORE_COLLECTION", "healnest_store")
 FIRESTORE_DOC_ID = os.environ.get("FIRESTORE_DOC_ID", "default")
+# "single": whole store in one document's payload field; "sharded": see firestore_shards.py
+FIRESTORE_LAYOUT = os.environ.get("FIRESTORE_LAYOUT", "single").lower()
+# in-memory fake_firestore.Client instead of a real project (offline runs)
+FIRESTORE_FAKE = os.environ.get("FIRESTORE_FAKE", "").lower() in ("1", "true", "yes")
 
 _firestore_client = None
 _firestore_available = False
+_shards = None
 
 if USE_FIRESTORE:
     try:
-        from google.cloud import firestore  # type: ignore
-        _firestore_client = firestore.Client()
+        if FIRESTORE_FAKE:
+            import fake_firestore
+            _firestore_client = fake_firestore.Client()
+        else:
+            from google.cloud import firestore  # type: ignore
+            _firestore_client = firestore.Client()
         _firestore_available = True
         print("[data_store_utils] Using Firestore backend")
     except Exception as e:
         print(f"[data_store_utils] Firestore init failed, falling back to JSON: {e}")
         _firestore_available = False
 
+if _firestore_available and FIRESTORE_LAYOUT == "sharded":
+    import firestore_shards
+    _shards = firestore_shards.ShardedStore(_firestore_client, FIRESTORE_COLLECTION, FIRESTORE_DOC_ID)
+    try:
+        _shards.migrate_from_single()
+    except Exception as e:
+        print(f"[data_store_utils] Firestore shard migration failed: {e}")
+
+
+# ---------- SQLite setup ----------
+USE_SQLITE = os.environ.get("USE_SQLITE", "").lower() in ("1", "true", "yes")
+
+_sqlite = None
+
+if USE_SQLITE and not USE_FIRESTORE:
+    try:
+        import sqlite_store as _sqlite
+        if _sqlite.is_empty() and os.path.exists(DATA_FILE):
+            _sqlite.migrate_from_json(DATA_FILE)
+        print(f"[data_store_utils] Using SQLite backend at {_sqlite.SQLITE_PATH}")
+    except Exception as e:
+        print(f"[data_store_utils] SQLite init failed, falling back to JSON: {e}")
+        _sqlite = None
+
+
+# ---------- Chat log setup ----------
+# Chat logs live outside the store, so neither app's load_data() ever pays for
+# chat history. On Firestore they are documents of the store's chat_logs
+# subcollection, shared by every container; otherwise append-only segment files
+# under CHAT_LOG_DIR, beside the local store.
+CHAT_LOG_DIR = os.environ.get("CHAT_LOG_DIR", os.path.join(os.path.dirname(__file__), "chat_logs"))
+if _firestore_available:
+    _chat_log = chat_log_store.FirestoreChatLog(
+        _firestore_client,
+        _firestore_client.collection(FIRESTORE_COLLECTION).document(FIRESTORE_DOC_ID).collection("chat_logs"))
+else:
+    _chat_log = chat_log_store.ChatLogStore(CHAT_LOG_DIR)
+
+
+# ---------- Availability encoding ----------
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, AvailabilityGrid):
+        return obj.to_json()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _encode_store(data: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready shallow copy (for payloads that don't go through json.dump)."""
+    return {k: (v.to_json() if isinstance(v, AvailabilityGrid) else v) for k, v in data.items()}
+
+
+def _default_store() -> Dict[str, Any]:
+    return _fill_defaults({})
+
+
+def _fill_defaults(data: Dict[str, Any]) -> Dict[str, Any]:
+    for k in DEFAULT_STORE:
+        if k not in data:
+            data[k] = copy.deepcopy(DEFAULT_STORE[k])
+    if not isinstance(data["availability"], AvailabilityGrid):
+        data["availability"] = AvailabilityGrid.from_json(data["availability"])
+    return data
+
 
 # ---------- File helpers ----------
-def _read_file_store() -> Dict[str, Any]:
+@contextmanager
+def _store_lock():
+    """Exclusive lock across threads and processes; yields the lock file handle."""
+    with _lock:
+        fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield fh
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_lock_version(fh) -> Optional[int]:
+    fh.seek(0)
+    raw = fh.read().strip()
+    return int(raw) if raw.isdigit() else None
+
+
+def _write_lock_version(fh, version: int) -> None:
+    fh.seek(0)
+    fh.truncate()
+    fh.write(str(version))
+    fh.flush()
+
+
+def _read_snapshot() -> Tuple[Dict[str, Any], int]:
+    """Return (store, version) from DATA_FILE."""
     if not os.path.exists(DATA_FILE):
-        return DEFAULT_STORE.copy()
+        return _default_store(), 0
+    try:
+        with open(DATA_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        meta = data.pop("_meta", {}) or {}
+        data.pop(VERSION_KEY, None)
+        return _fill_defaults(data), int(meta.get("version", meta.get("journal_seq", 0)))
+    except Exception:
+        return _default_store(), 0
+
+
+def _write_snapshot(data: Dict[str, Any], version: int) -> None:
+    payload = {k: v for k, v in data.items() if not k.startswith("_")}
+    payload["_meta"] = {"version": version}
+    tmp = DATA_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False, default=_json_default)
+    os.replace(tmp, DATA_FILE)
+
+
+def _read_file_store() -> Dict[str, Any]:
     with _lock:
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for k in DEFAULT_STORE:
-                if k not in data:
-                    data[k] = DEFAULT_STORE[k]
+        if USE_JOURNAL or os.path.exists(JOURNAL_FILE):
+            data = _replay_journal()
+            data[VERSION_KEY] = _journal_version
             return data
-        except Exception:
-            return DEFAULT_STORE.copy()
+        data, version = _read_snapshot()
+        data[VERSION_KEY] = version
+        return data
 
 
-def _write_file_store(data: Dict[str, Any]) -> None:
-    with _lock:
-        tmp = DATA_FILE + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        os.replace(tmp, DATA_FILE)
+def _disk_version() -> int:
+    """Version of what is on disk, for when LOCK_FILE has none yet. Caller holds the store lock."""
+    if USE_JOURNAL or os.path.exists(JOURNAL_FILE):
+        _replay_journal()
+        return _journal_version
+    return _read_snapshot()[1]
+
+
+def _write_file_store(data: Dict[str, Any], changed: Optional[Iterable[str]] = None) -> None:
+    with _store_lock() as fh:
+        current = _read_lock_version(fh)
+        if current is None:
+            current = _disk_version()
+        expected = data.get(VERSION_KEY)
+        if expected is not None and expected != current:
+            raise StoreConflict(f"store is at version {current}, save was based on {expected}")
+        version = current + 1
+        if USE_JOURNAL:
+            if not _append_journal(data, version, changed):
+                return
+        else:
+            _write_snapshot(data, version)
+            # a full snapshot supersedes any journal left over from journal mode
+            if os.path.exists(JOURNAL_FILE):
+                os.remove(JOURNAL_FILE)
+        _write_lock_version(fh, version)
+        data[VERSION_KEY] = version
+        # stamped before the lock is released: another writer's stamp can never be
+        # paired with this data, which would serve stale reads as fresh
+        data[STAMP_KEY] = _file_stamp()
+        _cache_put(data[STAMP_KEY], data)
+
+
+# ---------- Journal helpers ----------
+def _diff_records(old: Dict[str, Any], new: Dict[str, Any],
+                  keys: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Describe how to turn `old` into `new` as a list of small journal ops.
+    `keys` limits the comparison to top-level keys known to have changed."""
+    ops: List[Dict[str, Any]] = []
+    for k in (new if keys is None else [k for k in keys if k in new]):
+        if k.startswith("_"):
+            continue
+        before, after = old.get(k), new[k]
+        if before == after:
+            continue
+        if isinstance(before, dict) and isinstance(after, dict):
+            changed = {ik: iv for ik, iv in after.items() if ik not in before or before[ik] != iv}
+            dropped = [ik for ik in before if ik not in after]
+            op = {"op": "set", "key": k, "items": changed}
+            if dropped:
+                op["drop"] = dropped
+            ops.append(op)
+        elif isinstance(before, list) and isinstance(after, list):
+            n = len(before)
+            if len(after) > n and after[:n] == before:
+                ops.append({"op": "append", "key": k, "items": after[n:]})
+            elif len(after) == n - 1:
+                i = next((i for i in range(len(after)) if after[i] != before[i]), len(after))
+                if before[:i] + before[i + 1:] == after:
+                    ops.append({"op": "remove", "key": k, "item": before[i]})
+                else:
+                    ops.append({"op": "put", "key": k, "value": after})
+            else:
+                ops.append({"op": "put", "key": k, "value": after})
+        else:
+            ops.append({"op": "put", "key": k, "value": after})
+    for k in (old if keys is None else [k for k in keys if k in old]):
+        if k not in new and not k.startswith("_"):
+            ops.append({"op": "delete", "key": k})
+    return ops
+
+
+def _apply_record(data: Dict[str, Any], op: Dict[str, Any]) -> None:
+    k, kind = op.get("key"), op.get("op")
+    if kind == "set":
+        target = data.setdefault(k, {})
+        target.update(op.get("items", {}))
+        for ik in op.get("drop", []):
+            target.pop(ik, None)
+    elif kind == "append":
+        data.setdefault(k, []).extend(op.get("items", []))
+    elif kind == "remove":
+        items = data.setdefault(k, [])
+        if op.get("item") in items:
+            items.remove(op["item"])
+    elif kind == "put":
+        data[k] = op.get("value")
+    elif kind == "delete":
+        data.pop(k, None)
+
+
+def _replay_journal() -> Dict[str, Any]:
+    """Snapshot + journal replay. Caller holds _lock."""
+    global _journal_base, _journal_version
+    data, seq = _read_snapshot()
+    last = seq
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn tail from an interrupted append
+                rseq = int(rec.get("seq", 0))
+                if rseq <= seq:
+                    continue  # already folded into the snapshot
+                for op in rec.get("ops", []):
+                    _apply_record(data, op)
+                last = max(last, rseq)
+    _fill_defaults(data)  # "put" ops carry availability in its compact JSON form
+    _journal_version = last
+    _journal_base = copy.deepcopy(data)
+    return data
+
+
+def _append_journal(data: Dict[str, Any], version: int, keys: Optional[Iterable[str]] = None) -> bool:
+    """Append the delta between the on-disk state and `data` as record `version`.
+    Returns False if there was nothing to write. Caller holds the store lock."""
+    global _journal_base, _journal_version
+    if _journal_base is None or _journal_version != version - 1:
+        _replay_journal()  # another process appended since we last looked
+    ops = _diff_records(_journal_base, data, keys)
+    if not ops:
+        return False
+    _journal_version = version
+    line = json.dumps({"seq": version, "ops": ops}, ensure_ascii=False, separators=(",", ":"),
+                      default=_json_default)
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+    for op in ops:
+        _apply_record(_journal_base, copy.deepcopy(op))
+    try:
+        if os.path.getsize(JOURNAL_FILE) >= JOURNAL_COMPACT_BYTES:
+            _schedule_compaction()
+    except OSError:
+        pass
+    return True
+
+
+def _schedule_compaction() -> None:
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+    _compaction_thread = threading.Thread(target=compact_journal, name="journal-compaction", daemon=True)
+    _compaction_thread.start()
+
+
+def compact_journal() -> None:
+    """Fold the journal into the snapshot file and truncate it."""
+    with _store_lock():
+        if not os.path.exists(JOURNAL_FILE):
+            return
+        data = _replay_journal()
+        # snapshot carries the version it covers, so a crash before truncation
+        # cannot replay the same records twice
+        _write_snapshot(data, _journal_version)
+        open(JOURNAL_FILE, "w").close()
+    print(f"[data_store_utils] Journal compacted at version {_journal_version}")
+
+
+# ---------- Read cache helpers ----------
+def _file_stamp() -> Any:
+    parts = []
+    for path in (DATA_FILE, JOURNAL_FILE):
+        try:
+            st = os.stat(path)
+            parts.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        except OSError:
+            parts.append(None)
+    return ("file", tuple(parts))
+
+
+def _cow_copy(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy the top-level containers only; records inside are shared with the cache,
+    so callers replace records (append/pop/assign) rather than editing them in place."""
+    return {k: (v.copy() if isinstance(v, (dict, list, AvailabilityGrid)) else v) for k, v in data.items()}
+
+
+def _cache_get(stamp: Any) -> Optional[Dict[str, Any]]:
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        if READ_CACHE and _cache_data is not None and stamp is not None and stamp == _cache_stamp:
+            _cache_hits += 1
+            return _cow_copy(_cache_data)
+        _cache_misses += 1
+        return None
+
+
+def _cache_put(stamp: Any, data: Dict[str, Any]) -> None:
+    global _cache_stamp, _cache_data
+    if not READ_CACHE or stamp is None:
+        return
+    with _cache_lock:
+        _cache_stamp = stamp
+        _cache_data = _cow_copy(data)
+
+
+def clear_cache() -> None:
+    global _cache_stamp, _cache_data
+    with _cache_lock:
+        _cache_stamp = None
+        _cache_data = None
+
+
+def cache_stats() -> Dict[str, int]:
+    with _cache_lock:
+        hits, misses = _cache_hits, _cache_misses
+    if _shards is not None:
+        hits, misses = hits + _shards.hits, misses + _shards.misses
+    return {"hits": hits, "misses": misses}
+
+
+# ---------- Change tracking ----------
+def _part_changed(before: Any, after: Any) -> bool:
+    if isinstance(before, list) and isinstance(after, list):
+        # records are replaced, never edited in place (see _cow_copy), so
+        # identity is enough and avoids deep-comparing thousands of bookings
+        return len(before) != len(after) or any(a is not b for a, b in zip(before, after))
+    return before != after
+
+
+class TrackedStore(dict):
+    """Store returned by load_data(tracked=True).
+
+    Behaves like the plain store dict; commit() writes nothing if no part
+    changed since load (or the last commit), otherwise only the changed parts.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        self._origin = _cow_copy(data)
+
+    def changed_keys(self) -> List[str]:
+        keys = [k for k in self if not k.startswith("_") and
+                (k not in self._origin or _part_changed(self._origin[k], self[k]))]
+        keys += [k for k in self._origin if k not in self and not k.startswith("_")]
+        return keys
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.changed_keys())
+
+    def commit(self) -> bool:
+        """Save the changed parts; returns False when there was nothing to write."""
+        keys = self.changed_keys()
+        if not keys:
+            return False
+        save_data(self, changed=keys)
+        self._origin = _cow_copy(self)
+        return True
+
+
+def _firestore_doc_ref():
+    return _firestore_client.collection(FIRESTORE_COLLECTION).document(FIRESTORE_DOC_ID)
+
+
+def _load_file_cached() -> Dict[str, Any]:
+    stamp = _file_stamp()
+    cached = _cache_get(stamp)
+    if cached is not None:
+        return cached
+    data = _read_file_store()
+    _cache_put(stamp, data)
+    return _cow_copy(data)
+
+
+def _load_sqlite_cached() -> Dict[str, Any]:
+    stamp = ("sqlite", _sqlite.store_version())
+    cached = _cache_get(stamp)
+    if cached is not None:
+        return cached
+    data = _fill_defaults(_sqlite.load())
+    _cache_put(stamp, data)
+    return _cow_copy(data)
 
 
 # ---------- Public API ----------
-def load_data() -> Dict[str, Any]:
+def load_data(parts: Optional[Iterable[str]] = None, tracked: bool = False) -> Dict[str, Any]:
+    """Return the store. `parts` (e.g. ("availability",)) is a hint: the sharded
+    Firestore layout fetches and returns only those keys, other backends return all.
+    With `tracked` the store is a TrackedStore whose commit() skips no-op saves."""
+    data = _load(parts)
+    if tracked:
+        return TrackedStore(data)
+    return _apply_pending(data) if _wb_pending else data
+
+
+def _load(parts: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    if _shards is not None:
+        try:
+            data = _shards.load(parts)
+            if "availability" in data:
+                data["availability"] = AvailabilityGrid.from_json(data["availability"])
+            return data
+        except Exception as e:
+            print(f"[data_store_utils] Firestore read error, using JSON fallback: {e}")
+            return _load_file_cached()
     if USE_FIRESTORE and _firestore_available:
         try:
-            doc_ref = _firestore_client.collection(FIRESTORE_COLLECTION).document(FIRESTORE_DOC_ID)
+            doc_ref = _firestore_doc_ref()
+            if READ_CACHE and _cache_data is not None:
+                # empty field mask: metadata only, so an unchanged store costs no payload
+                probe = doc_ref.get(field_paths=[])
+                cached = _cache_get(("fs", probe.update_time) if probe.exists else None)
+                if cached is not None:
+                    return cached
             doc = doc_ref.get()
             if doc.exists:
-                data = doc.to_dict().get("payload", {})
+                raw = doc.to_dict()
+                data = raw.get("payload", {})
                 if isinstance(data, dict):
-                    for k in DEFAULT_STORE:
-                        if k not in data:
-                            data[k] = DEFAULT_STORE[k]
-                    return data
-            return DEFAULT_STORE.copy()
+                    _fill_defaults(data)
+                    data[VERSION_KEY] = int(raw.get("version", 0))
+                    _cache_put(("fs", doc.update_time), data)
+                    return _cow_copy(data)
+            data = _default_store()
+            data[VERSION_KEY] = 0
+            return data
         except Exception as e:
             print(f"[data_store_utils] Firestore read error, using JSON fallback: {e}")
-            return _read_file_store()
+            return _load_file_cached()
+    elif _sqlite is not None:
+        return _load_sqlite_cached()
+    else:
+        return _load_file_cached()
+
+
+def _save_firestore_doc(data: Dict[str, Any], changed: Optional[Iterable[str]] = None) -> None:
+    doc_ref = _firestore_doc_ref()
+    payload = {k: v for k, v in _encode_store(data).items() if not k.startswith("_")}
+    snap = doc_ref.get(field_paths=["version"])
+    current = int((snap.to_dict() or {}).get("version", 0)) if snap.exists else 0
+    expected = data.get(VERSION_KEY)
+    if expected is not None and expected != current:
+        raise StoreConflict(f"store is at version {current}, save was based on {expected}")
+    if changed is not None and snap.exists:
+        # field paths: only the changed parts travel, not the whole payload
+        fields = {f"payload.{k}": payload[k] for k in changed if k in payload}
+        fields["version"] = current + 1
     else:
-        return _read_file_store()
+        fields = {"payload": payload, "version": current + 1}
+    try:
+        if snap.exists:
+            # precondition closes the gap between the version probe and the write
+            option = _firestore_client.write_option(last_update_time=snap.update_time)
+            result = doc_ref.update(fields, option=option)
+        else:
+            result = doc_ref.create(fields)
+    except Exception as e:
+        if type(e).__name__ in ("FailedPrecondition", "AlreadyExists", "Aborted"):
+            raise StoreConflict(str(e))
+        raise
+    data[VERSION_KEY] = current + 1
+    data[STAMP_KEY] = ("fs", getattr(result, "update_time", None))
+    _cache_put(data[STAMP_KEY], data)
 
 
-def save_data(data: Dict[str, Any]) -> None:
+def save_data(data: Dict[str, Any], changed: Optional[Iterable[str]] = None) -> None:
+    """Persist `data`. Raises StoreConflict if it was loaded before another writer saved.
+    `changed` (top-level keys) lets backends that can write parts skip the rest."""
+    if changed is not None:
+        changed = list(changed)
+    if _shards is not None:
+        try:
+            _shards.save(data if changed is None else {k: data[k] for k in changed if k in data},
+                         expected=data.get(VERSION_KEY))
+            return
+        except Exception as e:
+            if type(e).__name__ in ("FailedPrecondition", "Aborted"):
+                raise StoreConflict(str(e))
+            print(f"[data_store_utils] Firestore write error, using JSON fallback: {e}")
+            _write_file_store({k: v for k, v in data.items() if k != VERSION_KEY})  # a shard stamp
+            return
     if USE_FIRESTORE and _firestore_available:
         try:
-            doc_ref = _firestore_client.collection(FIRESTORE_COLLECTION).document(FIRESTORE_DOC_ID)
-            doc_ref.set({"payload": data})
+            _save_firestore_doc(data, changed)
             return
+        except StoreConflict:
+            raise
         except Exception as e:
             print(f"[data_store_utils] Firestore write error, using JSON fallback: {e}")
-    _write_file_store(data)
+    elif _sqlite is not None:
+        version = _sqlite.save(data, expected_version=data.get(VERSION_KEY), parts=changed)
+        if version is None:
+            raise StoreConflict("SQLite store changed since it was loaded")
+        data[VERSION_KEY] = version
+        _cache_put(("sqlite", version), data)
+        return
+    _write_file_store(data, changed)
+
+
+def update_data(mutate: Callable[[Dict[str, Any]], Any], parts: Optional[Iterable[str]] = None,
+                retries: int = STORE_RETRIES, sync: bool = False) -> Dict[str, Any]:
+    """Load, apply `mutate(store)` and save, retrying from a fresh load on StoreConflict.
+
+    Nothing is written if `mutate` returns False or leaves the store unchanged;
+    otherwise only the parts it touched. Returns the store as saved. In
+    WRITE_BEHIND mode the save is queued unless `sync`; `mutate` may then run
+    more than once, so it must not have side effects outside the store.
+    """
+    if WRITE_BEHIND and not sync:
+        return _queue_update(mutate, parts)
+    flush()  # queued edits first, so writes land in the order they were made
+    return _update_now(mutate, parts, retries)
+
+
+def _update_now(mutate: Callable[[Dict[str, Any]], Any], parts: Optional[Iterable[str]] = None,
+                retries: int = STORE_RETRIES) -> Dict[str, Any]:
+    for attempt in range(retries):
+        data = load_data(parts, tracked=True)
+        if mutate(data) is False:
+            return data
+        try:
+            if data.commit():
+                _watch_wake.set()  # let this process's watcher see its own write at once
+            return data
+        except StoreConflict:
+            # the stat stamp can miss a rewrite that reused an inode within one
+            # mtime tick, so never trust the cache for the retry
+            clear_cache()
+            # jittered exponential backoff so contending writers spread out
+            time.sleep(random.uniform(0, min(0.5, 0.005 * 2 ** attempt)))
+    raise StoreConflict(f"gave up after {retries} conflicting attempts")
+
+
+# ---------- Write-behind queue ----------
+def _pending_applies(view: Dict[str, Any], parts: Optional[Tuple[str, ...]]) -> bool:
+    return set(parts or DEFAULT_STORE) <= view.keys()
+
+
+def _apply_pending(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Replay queued mutations on a loaded store, so this process reads its own writes."""
+    with _wb_cond:
+        pending = list(_wb_pending)
+    for mutate, parts in pending:
+        if _pending_applies(data, parts):
+            mutate(data)
+    return data
+
+
+def _queue_update(mutate: Callable[[Dict[str, Any]], Any], parts: Optional[Iterable[str]]) -> Dict[str, Any]:
+    global _wb_queued
+    parts = tuple(parts) if parts is not None else None
+    view = load_data(parts)
+    if mutate(view) is False:
+        return view
+    with _wb_cond:
+        _wb_pending.append((mutate, parts))
+        _wb_queued += 1
+        _start_writer()
+        _wb_cond.notify()
+    return view
+
+
+def _start_writer() -> None:
+    global _wb_thread
+    if _wb_thread is None or not _wb_thread.is_alive():
+        _wb_thread = threading.Thread(target=_writer_loop, name="store-write-behind", daemon=True)
+        _wb_thread.start()
+
+
+def _writer_loop() -> None:
+    while True:
+        with _wb_cond:
+            while not _wb_pending:
+                _wb_cond.wait()
+        time.sleep(WRITE_BEHIND_WINDOW)  # let the rest of a burst of edits arrive
+        try:
+            flush()
+        except Exception as e:
+            print(f"[data_store_utils] Write-behind flush failed, will retry: {e}")
+
+
+def flush() -> int:
+    """Save every queued mutation in one update. Returns how many were written."""
+    global _wb_flushes
+    with _wb_flush_lock:
+        with _wb_cond:
+            batch = list(_wb_pending)
+        if not batch:
+            return 0
+        if any(p is None for _, p in batch):
+            parts = None
+        else:
+            parts = tuple(sorted({part for _, p in batch for part in p}))
+
+        def _apply_batch(data):
+            results = [mutate(data) for mutate, _ in batch]
+            if all(r is False for r in results):
+                return False
+
+        _update_now(_apply_batch, parts)
+        with _wb_cond:
+            del _wb_pending[:len(batch)]
+            _wb_flushes += 1
+        return len(batch)
+
+
+def write_behind_stats() -> Dict[str, int]:
+    with _wb_cond:
+        return {"queued": _wb_queued, "pending": len(_wb_pending), "flushes": _wb_flushes}
+
+
+atexit.register(flush)
+
+
+# ---------- Booking index ----------
+class BookingIndex:
+    """Bookings keyed by token and by (day, slot): O(1) lookup, add and remove."""
+
+    def __init__(self, bookings: Iterable[Dict[str, Any]] = ()):
+        self.by_token: Dict[str, Dict[str, Any]] = {}
+        self.by_cell: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]] = {}
+        for b in bookings:
+            self.add(b)
+
+    def add(self, booking: Dict[str, Any]) -> None:
+        token = booking.get("token")
+        if token in self.by_token:
+            self.remove(token)
+        self.by_token[token] = booking
+        self.by_cell.setdefault((booking.get("day"), booking.get("slot")), {})[token] = booking
+
+    def remove(self, token: str) -> Optional[Dict[str, Any]]:
+        booking = self.by_token.pop(token, None)
+        if booking is not None:
+            cell = (booking.get("day"), booking.get("slot"))
+            tokens = self.by_cell.get(cell, {})
+            tokens.pop(token, None)
+            if not tokens:
+                self.by_cell.pop(cell, None)
+        return booking
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        return self.by_token.get(token)
+
+    def at(self, day: int, slot: int) -> Optional[Dict[str, Any]]:
+        tokens = self.by_cell.get((day, slot))
+        return next(iter(tokens.values())) if tokens else None
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.by_token
+
+    def __len__(self) -> int:
+        return len(self.by_token)
+
+
+# Index over the JSON / single-document store, valid for one store version:
+# rebuilt when another writer moved the version, patched in place by our own
+# reserve/cancel so the common path never rebuilds. A lookup first compares
+# store_version() (a stat, or a Firestore metadata read) with the stamp the
+# index was built or patched at, and only loads the bookings when it moved.
+_index_lock = Lock()
+_index: Optional[BookingIndex] = None
+_index_version: Any = None
+_index_stamp: Any = None
+
+
+def booking_index(data: Optional[Dict[str, Any]] = None) -> BookingIndex:
+    """Index of the persisted bookings, or of `data` (a store loaded inside a mutation)."""
+    global _index, _index_version, _index_stamp
+    stamp = None
+    if data is None:
+        stamp = store_version()  # before the load: a write in between only costs a rebuild later
+        with _index_lock:
+            if _index is not None and stamp == _index_stamp:
+                return _index
+        data = _load(parts=("bookings",))  # persisted state only: the index is keyed by its version
+    version = data.get(VERSION_KEY)
+    with _index_lock:
+        if _index is None or version is None or version != _index_version:
+            _index = BookingIndex(data.get("bookings", []))
+            _index_version = version
+            _index_stamp = stamp
+        elif stamp is not None:
+            _index_stamp = stamp
+        return _index
+
+
+def _patch_index(before: Any, saved: Dict[str, Any], add: Optional[Dict[str, Any]] = None,
+                 remove: Optional[str] = None, remove_all: Iterable[str] = ()) -> None:
+    """Apply our own write (store `saved`, loaded at version `before`) to the index."""
+    global _index_version, _index_stamp
+    with _index_lock:
+        if _index is None or before is None or _index_version != before:
+            return  # stale anyway; the next booking_index() rebuilds
+        if remove is not None:
+            _index.remove(remove)
+        for token in remove_all:
+            _index.remove(token)
+        if add is not None:
+            _index.add(add)
+        _index_version = saved.get(VERSION_KEY)
+        _index_stamp = saved.get(STAMP_KEY)
+
+
+def find_booking(token: str) -> Optional[Dict[str, Any]]:
+    """The booking holding `token`, or None. A booking of a closed week comes from
+    the archive with its "week" set; it can be verified but no longer cancelled."""
+    token = (token or "").strip()
+    if not token:
+        return None
+    if _shards is not None:
+        found = _shards.find_booking(token)
+    elif _sqlite is not None:
+        found = _sqlite.find_booking(token)
+    else:
+        found = booking_index().get(token)
+    return found if found is not None else archived_booking(token)
+
+
+def archived_booking(token: str) -> Optional[Dict[str, Any]]:
+    """The booking holding `token` in a closed week, with that "week", or None."""
+    archive = _load(parts=("archive",)).get("archive") or {}
+    for week in sorted(archive, reverse=True):
+        for b in archive[week]:
+            if b.get("token") == token:
+                return dict(b, week=week)
+    return None
+
+
+def booking_at(day: int, slot: int) -> Optional[Dict[str, Any]]:
+    if _shards is not None:
+        return _shards.booking_at(day, slot)
+    if _sqlite is not None:
+        return _sqlite.booking_at(day, slot)
+    return booking_index().at(day, slot)
+
+
+def reserve_slot(day: int, slot: int, token: str, time_iso: Optional[str] = None) -> bool:
+    """Book (day, slot) if it is still available; False means it was taken meanwhile.
+
+    On SQLite this is a single conditional indexed write; the other backends
+    run a versioned read-check-write through update_data().
+    """
+    flush()  # no-op unless WRITE_BEHIND left edits queued
+    if _shards is not None:
+        return _shards.reserve_slot(day, slot, token, time_iso)
+    if _sqlite is not None:
+        return _sqlite.reserve_slot(day, slot, token, time_iso)
+    outcome: Dict[str, Any] = {"booked": False}
+    booking = {"day": day, "slot": slot, "token": token, "time": time_iso}
+
+    def _reserve(data):
+        outcome["version"] = data.get(VERSION_KEY)
+        outcome["booked"] = data["availability"].is_free(day, slot)
+        if not outcome["booked"]:
+            return False
+        data["availability"].set_free(day, slot, False)
+        data["bookings"].append(booking)
+        data["stats"] = booking_stats.on_book(data.get("stats"), booking)
+
+    saved = update_data(_reserve, sync=True)
+    if outcome["booked"]:
+        _patch_index(outcome["version"], saved, add=booking)
+    return outcome["booked"]
+
+
+def cancel_booking(token: str) -> Optional[Dict[str, Any]]:
+    """Remove the booking holding `token` and reopen its slot. Returns the removed booking."""
+    token = (token or "").strip()
+    if not token:
+        return None
+    flush()  # no-op unless WRITE_BEHIND left edits queued
+    if _shards is not None:
+        return _shards.cancel_booking(token)
+    if _sqlite is not None:
+        return _sqlite.cancel_booking(token)
+    outcome: Dict[str, Any] = {"booking": None}
+
+    def _cancel(data):
+        outcome["version"] = data.get(VERSION_KEY)
+        booking = booking_index(data).get(token)
+        outcome["booking"] = booking
+        if booking is None:
+            return False
+        data["availability"].set_free(booking["day"], booking["slot"], True)
+        data["bookings"].remove(booking)
+        data["stats"] = booking_stats.on_cancel(data.get("stats"), booking)
+
+    saved = update_data(_cancel, sync=True)
+    if outcome["booking"] is not None:
+        _patch_index(outcome["version"], saved, remove=token)
+    return outcome["booking"]
+
+
+def cancel_slot(day: int, slot: int) -> bool:
+    """Remove the booking on (day, slot), if any, and make the slot available.
+    Returns whether a booking was removed, like cancel_booking()."""
+    flush()  # no-op unless WRITE_BEHIND left edits queued
+    if _shards is not None:
+        return _shards.cancel_slot(day, slot)
+    if _sqlite is not None:
+        return _sqlite.cancel_slot(day, slot)
+    outcome: Dict[str, Any] = {"booking": None}
+
+    def _cancel(data):
+        outcome["version"] = data.get(VERSION_KEY)
+        outcome["booking"] = booking_index(data).at(day, slot)
+        data["availability"].set_free(day, slot, True)
+        if outcome["booking"] is not None:
+            data["bookings"].remove(outcome["booking"])
+            data["stats"] = booking_stats.on_cancel(data.get("stats"), outcome["booking"])
+
+    saved = update_data(_cancel, sync=True)
+    if outcome["booking"] is not None:
+        _patch_index(outcome["version"], saved, remove=outcome["booking"].get("token"))
+    return outcome["booking"] is not None
+
+
+# ---------- Bookings table ----------
+BOOKING_SORTS = {  # sort name -> row key, ties broken by booking time then token
+    "time": lambda t, r: (t.time[r], t.token[r]),
+    "day": lambda t, r: (t.day[r], t.slot[r], t.time[r], t.token[r]),
+    "slot": lambda t, r: (t.slot[r], t.day[r], t.time[r], t.token[r]),
+}
+
+
+class BookingTable:
+    """Columnar snapshot of the bookings for the admin table.
+
+    One list per field; each sort order, the per-day rows and the token order
+    are built once per snapshot, on first use. A query touches only row
+    numbers until it builds the dicts of the one page it returns.
+    """
+
+    def __init__(self, bookings: Iterable[Dict[str, Any]] = ()):
+        bookings = list(bookings)
+        self.day = [b.get("day", -1) for b in bookings]
+        self.slot = [b.get("slot", -1) for b in bookings]
+        self.token = [str(b.get("token") or "") for b in bookings]
+        self.time = [b.get("time") or "" for b in bookings]
+        self._orders: Dict[str, Tuple[List[int], List[int]]] = {}   # sort -> (rows in order, rank of each row)
+        self._by_day: Optional[Dict[int, List[int]]] = None
+        self._tokens: Optional[Tuple[List[str], List[int]]] = None  # sorted tokens, their rows
+
+    def __len__(self) -> int:
+        return len(self.token)
+
+    def row(self, r: int) -> Dict[str, Any]:
+        return {"day": self.day[r], "slot": self.slot[r], "token": self.token[r], "time": self.time[r] or None}
+
+    def _order(self, sort: str) -> Tuple[List[int], List[int]]:
+        if sort not in self._orders:
+            key = BOOKING_SORTS[sort]
+            order = sorted(range(len(self)), key=lambda r: key(self, r))
+            rank = [0] * len(order)
+            for i, r in enumerate(order):
+                rank[r] = i
+            self._orders[sort] = (order, rank)
+        return self._orders[sort]
+
+    def _rows_on(self, day: int) -> List[int]:
+        if self._by_day is None:
+            by_day: Dict[int, List[int]] = {}
+            for r, d in enumerate(self.day):
+                by_day.setdefault(d, []).append(r)
+            self._by_day = by_day
+        return self._by_day.get(day, [])
+
+    def _rows_with_prefix(self, prefix: str) -> List[int]:
+        if self._tokens is None:
+            rows = sorted(range(len(self)), key=self.token.__getitem__)
+            self._tokens = ([self.token[r] for r in rows], rows)
+        tokens, rows = self._tokens
+        lo = bisect.bisect_left(tokens, prefix)
+        hi = bisect.bisect_left(tokens, prefix + "\uffff")
+        return rows[lo:hi]
+
+    def iter_rows(self, sort: str = "day", day_from: int = 0, day_to: int = GRID_DAYS - 1) -> Iterator[Dict[str, Any]]:
+        for r in self._order(sort)[0]:
+            if day_from <= self.day[r] <= day_to:
+                yield self.row(r)
+
+    def query(self, day: Optional[int] = None, token_prefix: str = "", sort: str = "time",
+              descending: bool = False, offset: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of bookings matching the filters, and how many match in total."""
+        order, rank = self._order(sort)
+        if day is None and not token_prefix:
+            total = len(order)
+            if descending:
+                page = [order[total - 1 - i] for i in range(offset, min(offset + limit, total))]
+            else:
+                page = order[offset:offset + limit]
+            return [self.row(r) for r in page], total
+        rows: Optional[set] = None
+        if token_prefix:
+            rows = set(self._rows_with_prefix(token_prefix))
+        if day is not None:
+            on_day = self._rows_on(day)
+            rows = set(on_day) if rows is None else rows.intersection(on_day)
+        # only the matches get sorted, through their precomputed rank
+        matched = sorted(rows, key=rank.__getitem__, reverse=descending)
+        return [self.row(r) for r in matched[offset:offset + limit]], len(matched)
+
+
+_table_lock = Lock()
+_table: Optional[BookingTable] = None
+_table_stamp: Any = None
+
+
+def booking_table() -> BookingTable:
+    """The bookings snapshot for the current store version, rebuilt only after a write."""
+    global _table, _table_stamp
+    stamp = store_version()
+    with _table_lock:
+        if _table is not None and stamp == _table_stamp:
+            return _table
+    table = BookingTable(_load(parts=("bookings",)).get("bookings", []))
+    with _table_lock:
+        _table, _table_stamp = table, stamp
+    return table
+
+
+def bookings_page(day: Optional[int] = None, token_prefix: str = "", sort: str = "time",
+                  descending: bool = False, offset: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+    """Page of bookings for the admin table: filter by day and/or token prefix,
+    sort by "time", "day" or "slot". Returns (rows, total matching)."""
+    if sort not in BOOKING_SORTS:
+        raise ValueError(f"unknown sort {sort!r}")
+    token_prefix = (token_prefix or "").strip()
+    if _sqlite is not None:
+        return _sqlite.bookings_page(day, token_prefix, sort, descending, offset, limit)
+    return booking_table().query(day, token_prefix, sort, descending, offset, limit)
+
+
+def iter_bookings(day_from: int = 0, day_to: int = GRID_DAYS - 1) -> Iterator[Dict[str, Any]]:
+    """Bookings on days day_from..day_to by day, slot and time, streamed (a cursor on SQLite)."""
+    if _sqlite is not None:
+        return _sqlite.iter_bookings(day_from, day_to)
+    return booking_table().iter_rows("day", day_from, day_to)
+
+
+def iter_archived_bookings(day_from: int = 0, day_to: int = GRID_DAYS - 1) -> Iterator[Dict[str, Any]]:
+    """Bookings of closed weeks on days day_from..day_to, oldest week first, each with its "week"."""
+    archive = _load(parts=("archive",)).get("archive") or {}
+    for week in sorted(archive):
+        rows = [b for b in archive[week] if day_from <= b.get("day", -1) <= day_to]
+        for b in sorted(rows, key=lambda b: (b["day"], b["slot"], b.get("time") or "")):
+            yield dict(b, week=week)
+
+
+def current_week() -> str:
+    """The week the store was last rolled over to (today's, before the first rollover)."""
+    return _load(parts=("meta",)).get("meta", {}).get("week") or week_key(date.today())
+
+
+def cancel_bookings(tokens: Iterable[str]) -> List[Dict[str, Any]]:
+    """Remove every booking in `tokens` and reopen their slots, in one store write.
+    Returns the bookings removed (unknown tokens are skipped)."""
+    wanted = {t.strip() for t in tokens if t and t.strip()}
+    if not wanted:
+        return []
+    flush()  # no-op unless WRITE_BEHIND left edits queued
+    if _shards is not None:
+        return _shards.cancel_bookings(wanted)
+    if _sqlite is not None:
+        return _sqlite.cancel_bookings(wanted)
+    outcome: Dict[str, Any] = {"removed": []}
+
+    def _cancel(data):
+        outcome["version"] = data.get(VERSION_KEY)
+        index = booking_index(data)
+        removed = [index.get(t) for t in wanted if t in index]
+        outcome["removed"] = removed
+        if not removed:
+            return False
+        stats = data.get("stats")
+        for b in removed:
+            data["availability"].set_free(b["day"], b["slot"], True)
+            stats = booking_stats.on_cancel(stats, b)
+        data["bookings"] = [b for b in data["bookings"] if b.get("token") not in wanted]
+        data["stats"] = stats
+
+    saved = update_data(_cancel, sync=True)
+    if outcome["removed"]:
+        _patch_index(outcome["version"], saved, remove_all=[b["token"] for b in outcome["removed"]])
+    return outcome["removed"]
+
+
+def clear_bookings() -> None:
+    """Drop every booking (slots stay as they are); aggregates keep their history."""
+    flush()  # no-op unless WRITE_BEHIND left edits queued
+
+    def _clear(data):
+        if not data["bookings"]:
+            return False
+        data["bookings"] = []
+        data["stats"] = booking_stats.on_clear(data.get("stats"))
+
+    update_data(_clear, parts=("bookings", "stats"), sync=True)
+
+
+# ---------- Booking aggregates ----------
+def booking_summary(weeks: int = 8) -> Dict[str, Any]:
+    """Per-cell counts, totals and the weekly trend from the "stats" part (see
+    booking_stats.summary); no booking is read."""
+    return booking_stats.summary(_load(parts=("stats",)).get("stats"), GRID_DAYS, GRID_SLOTS, weeks)
+
+
+# ---------- Availability edits / weekly templates ----------
+def edit_availability(changes: Dict[Tuple[int, int], bool], seen: Optional[AvailabilityGrid] = None
+                      ) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Set many cells ({(day, slot): free}) in one store write. With `seen`, the grid
+    the edit was made on, a cell that changed meanwhile (a student booked it, another
+    admin toggled it) is left as it is now; a cell holding a booking is never reopened.
+    Returns (cells skipped as changed meanwhile, cells skipped as booked)."""
+    changed: List[Tuple[int, int]] = []
+    booked: List[Tuple[int, int]] = []
+
+    def _edit(data):
+        grid = data["availability"]
+        held = set(_held_cells(data))
+        changed[:] = [c for c in changes if seen is not None and grid.is_free(*c) != seen.is_free(*c)]
+        booked[:] = [c for c, free in changes.items() if free and c in held and c not in changed]
+        todo = [(c, free) for c, free in changes.items()
+                if c not in changed and c not in booked and grid.is_free(*c) != free]
+        if not todo:
+            return False
+        for (d, s), free in todo:
+            grid.set_free(d, s, free)
+
+    update_data(_edit, parts=("availability", "stats"), sync=True)
+    return changed, booked
+
+
+def availability_templates() -> Dict[str, Any]:
+    """{"grids": {name: compact grid}, "schedule": {week: name}}"""
+    templates = _load(parts=("templates",)).get("templates") or {}
+    return {"grids": dict(templates.get("grids") or {}), "schedule": dict(templates.get("schedule") or {})}
+
+
+def _held_cells(data: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """Cells holding a booking, from the booking aggregates."""
+    return [(int(day), s) for day, entry in (data.get("stats") or {}).items()
+            for s, n in enumerate(entry.get("booked") or []) if n]
+
+
+def _apply_template(data: Dict[str, Any], name: str, today: date, keep_booked: bool = True) -> bool:
+    grid_json = ((data.get("templates") or {}).get("grids") or {}).get(name)
+    if grid_json is None:
+        return False
+    grid = AvailabilityGrid.from_json(grid_json)
+    for d, s in (_held_cells(data) if keep_booked else ()):  # mid-week, never reopen a booked slot
+        grid.set_free(d, s, False)
+    grid.lock_before(locked_before(today))
+    data["availability"] = grid
+    return True
+
+
+def save_template(name: str, grid: AvailabilityGrid) -> None:
+    """Store `grid` (a whole week) as template `name`, replacing one of that name."""
+    full = grid.copy()
+    full.defined = [(1 << full.slots) - 1] * full.days  # undefined cells are open, as shown
+    full.free = [full._open_mask(d) for d in range(full.days)]
+
+    def _save(data):
+        templates = dict(data.get("templates") or {})
+        templates["grids"] = dict(templates.get("grids") or {}, **{name: full.to_json()})
+        data["templates"] = templates
+
+    update_data(_save, parts=("templates",), sync=True)
+
+
+def delete_template(name: str) -> None:
+    """Drop template `name` and any week it was scheduled for."""
+    def _delete(data):
+        templates = dict(data.get("templates") or {})
+        templates["grids"] = {k: v for k, v in (templates.get("grids") or {}).items() if k != name}
+        templates["schedule"] = {w: n for w, n in (templates.get("schedule") or {}).items() if n != name}
+        data["templates"] = templates
+
+    update_data(_delete, parts=("templates",), sync=True)
+
+
+def apply_template(name: str, today: Optional[date] = None) -> bool:
+    """Replace this week's availability with template `name` in one write; past days
+    stay locked and booked slots stay closed. False if there is no such template."""
+    today = today or date.today()
+    applied = {"ok": False}
+
+    def _apply(data):
+        applied["ok"] = _apply_template(data, name, today)
+        return applied["ok"]
+
+    update_data(_apply, parts=("availability", "templates", "stats"), sync=True)
+    return applied["ok"]
+
+
+def schedule_template(week: str, name: Optional[str]) -> None:
+    """Apply template `name` when week `week` ("YYYY-Www") starts; None unschedules it."""
+    def _schedule(data):
+        templates = dict(data.get("templates") or {})
+        schedule = dict(templates.get("schedule") or {})
+        if name is None:
+            schedule.pop(week, None)
+        else:
+            schedule[week] = name
+        templates["schedule"] = schedule
+        data["templates"] = templates
+
+    update_data(_schedule, parts=("templates",), sync=True)
+
+
+# ---------- Change notification ----------
+def store_version() -> Any:
+    """Stamp that moves whenever anyone writes the store; reads no payload."""
+    if _shards is not None:
+        return ("shards", _shards.version())
+    if USE_FIRESTORE and _firestore_available:
+        probe = _firestore_doc_ref().get(field_paths=[])
+        return ("fs", probe.update_time if probe.exists else None)
+    if _sqlite is not None:
+        return ("sqlite", _sqlite.store_version())
+    return _file_stamp()
+
+
+def _watch_check() -> List[str]:
+    """Probe once; returns the watched parts that changed since the last probe."""
+    global _watch_stamp
+    stamp = store_version()
+    if stamp == _watch_stamp:
+        return []
+    data = _load(WATCHED_PARTS)
+    changed = []
+    with _watch_cond:
+        _watch_stamp = stamp
+        for part in WATCHED_PARTS:
+            value = data.get(part)
+            if part in _watch_seen and _watch_seen[part] != value:
+                _change_versions[part] += 1
+                changed.append(part)
+            _watch_seen[part] = value
+        if changed:
+            _watch_cond.notify_all()
+    return changed
+
+
+def _watch_loop() -> None:
+    while True:
+        _watch_wake.wait(STORE_WATCH_SECONDS)
+        _watch_wake.clear()
+        try:
+            _watch_check()
+        except Exception as e:
+            print(f"[data_store_utils] Store watch probe failed: {e}")
+
+
+def _subscribe() -> None:
+    """On Firestore, a snapshot listener wakes the watcher as soon as the document moves."""
+    global _watch_listener
+    if _shards is not None:
+        ref = _shards.root  # every sharded write touches the root document
+    elif USE_FIRESTORE and _firestore_available:
+        ref = _firestore_doc_ref()
+    else:
+        return
+    if not hasattr(ref, "on_snapshot"):
+        return
+    try:
+        _watch_listener = ref.on_snapshot(lambda *_: _watch_wake.set())
+    except Exception as e:
+        print(f"[data_store_utils] Snapshot listener unavailable, polling only: {e}")
+
+
+def _start_watcher() -> None:
+    global _watch_thread
+    with _watch_cond:
+        if _watch_thread is not None:
+            return
+        try:
+            _watch_check()  # baseline, so the first caller's counter already means something
+        except Exception as e:
+            print(f"[data_store_utils] Store watch probe failed: {e}")
+        _watch_thread = threading.Thread(target=_watch_loop, name="store-watch", daemon=True)
+        _watch_thread.start()
+        _subscribe()
+
+
+def change_version(part: str = "availability") -> int:
+    """Counter bumped each time `part` (one of WATCHED_PARTS) changes, by any process.
+
+    Compare it with the value seen when the part was last loaded; reload only
+    when it differs.
+    """
+    if _watch_thread is None:
+        _start_watcher()
+    return _change_versions[part]
+
+
+def wait_for_change(part: str, seen: int, timeout: Optional[float] = None) -> int:
+    """Block until change_version(part) differs from `seen` (or timeout); returns it."""
+    if _watch_thread is None:
+        _start_watcher()
+    with _watch_cond:
+        _watch_cond.wait_for(lambda: _change_versions[part] != seen, timeout)
+        return _change_versions[part]
+
+
+def notify_changed() -> None:
+    """Probe now instead of at the next interval (e.g. right after a local write)."""
+    _watch_wake.set()
+
+
+# ---------- Chat logs ----------
+def append_chat_log(user: str, text: str, time_iso: Optional[str] = None) -> None:
+    _chat_log.log(user, text, time_iso)
+
+
+def chat_log_page(cursor: Optional[Tuple[int, int]] = None,
+                  limit: int = chat_log_store.PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+    """One page of chat logs, newest first, plus the cursor of the next older page (None at the end)."""
+    return _chat_log.read_page(cursor, limit)
+
+
+def iter_chat_logs(date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Chat logs oldest first, optionally within ISO dates date_from..date_to (inclusive)."""
+    for entry in _chat_log.iter_entries():
+        day = str(entry.get("time") or "")[:10]
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        yield entry
+
+
+def clear_chat_logs() -> None:
+    _chat_log.clear()
+
+
+def migrate_chat_logs() -> int:
+    """Move chat logs still kept in the store to the chat log (segment files beside a
+    local store, the chat_logs subcollection on Firestore). Returns how many moved."""
+    moved = {"n": 0}
+
+    def _move(data):
+        logs = data.get("chat_logs") or []
+        if not logs:
+            return False
+        # a conflict retry sees the same (append-only) list again: skip what already moved
+        moved["n"] += _chat_log.extend(logs[moved["n"]:])
+        data["chat_logs"] = []
+
+    update_data(_move, parts=("chat_logs",), sync=True)
+    if moved["n"]:
+        print(f"[data_store_utils] Moved {moved['n']} chat log entries to {_chat_log.location}")
+    return moved["n"]
+
+
+# ---------- Initialisation / weekly rollover ----------
+# Structural writes happen here, not in page renders: the schema migration runs
+# once per process, the rollover once per day (the week reset once per week).
+# Only the apps trigger them, through ensure_store_ready(). Closed weeks' bookings
+# stay in the "archive" part for ARCHIVE_WEEKS weeks.
+SCHEMA_VERSION = 3
+ARCHIVE_WEEKS = int(os.environ.get("ARCHIVE_WEEKS", "52"))
+
+_ready_lock = Lock()
+_migrated = False
+_rolled_on: Optional[date] = None
+
+
+def _seed_cells(data: Dict[str, Any]) -> None:
+    """v2: every cell of the week is defined, so renders never have to fill gaps."""
+    grid = data["availability"]
+    for d in range(grid.days):
+        for s in range(grid.slots):
+            if not grid.is_defined(d, s):
+                grid.set_free(d, s, True)
+
+
+def _build_stats(data: Dict[str, Any]) -> None:
+    """v3: booking aggregates, counted from the bookings already held."""
+    data["stats"] = booking_stats.rebuild(data["bookings"])
+
+
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], None]] = {2: _seed_cells, 3: _build_stats}  # target version -> step
+
+
+def migrate_store(data: Dict[str, Any]) -> bool:
+    """update_data mutation bringing the store up to SCHEMA_VERSION."""
+    meta = dict(data.get("meta") or {})
+    version = int(meta.get("schema", 1))
+    if version >= SCHEMA_VERSION:
+        return False
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        if target in MIGRATIONS:
+            MIGRATIONS[target](data)
+    meta["schema"] = SCHEMA_VERSION
+    data["meta"] = meta
+    print(f"[data_store_utils] Migrated store schema {version} -> {SCHEMA_VERSION}")
+    return True
+
+
+def locked_before(day: date) -> int:
+    """Weekday index before which slots are closed on `day` (none on the reset Sunday)."""
+    if RESET_WEEK_ON_SUNDAY and day.weekday() == 6:
+        return 0
+    return day.weekday()
+
+
+def rollover(data: Dict[str, Any], today: Optional[date] = None) -> bool:
+    """update_data mutation: when a new week starts, archive last week's bookings and
+    reset availability (to the template scheduled for it, if any); lock past days
+    once a day."""
+    today = today or date.today()
+    meta = dict(data.get("meta") or {})
+    week = week_key(today)
+    if meta.get("week") != week:
+        templates = dict(data.get("templates") or {})
+        schedule = dict(templates.get("schedule") or {})
+        name = schedule.get(week)
+        if "week" in meta:  # a fresh store keeps what the admin set up
+            if name is not None and _apply_template(data, name, today, keep_booked=False):
+                print(f"[data_store_utils] New week {week}: availability from template {name!r}")
+            else:
+                data["availability"].reset(free=True)
+                print(f"[data_store_utils] New week {week}: availability reset")
+            # the reopened cells must not still hold last week's bookings: they move
+            # to the archive under their week, where token lookups and exports still
+            # find them, and the aggregates keep their history
+            if data.get("bookings"):
+                archive = dict(data.get("archive") or {})
+                archive[meta["week"]] = list(archive.get(meta["week"], [])) + list(data["bookings"])
+                for old in sorted(archive)[:-ARCHIVE_WEEKS]:
+                    del archive[old]
+                data["archive"] = archive
+                print(f"[data_store_utils] New week {week}: {len(data['bookings'])} booking(s) "
+                      f"of {meta['week']} archived")
+                data["bookings"] = []
+                data["stats"] = booking_stats.on_clear(data.get("stats"))
+        if any(w <= week for w in schedule):
+            templates["schedule"] = {w: n for w, n in schedule.items() if w > week}
+            data["templates"] = templates
+        meta["week"] = week
+    if meta.get("locked_on") != today.isoformat():
+        data["availability"].lock_before(locked_before(today))
+        meta["locked_on"] = today.isoformat()
+    if meta == data.get("meta"):
+        return False
+    data["meta"] = meta
+    return True
+
+
+ROLLOVER_PARTS = ("archive", "availability", "bookings", "meta", "stats", "templates")
+
+
+def ensure_store_ready(today: Optional[date] = None) -> None:
+    """Run the one-time migrations and today's rollover if this process hasn't yet.
+
+    Called by the apps (mental.py, Admin.py) at the top of every script run, never
+    on import, so tools that only read the store write nothing. Cheap enough: after
+    the first call of the day it only compares a date.
+    """
+    global _migrated, _rolled_on
+    today = today or date.today()
+    if _migrated and _rolled_on == today:
+        return
+    with _ready_lock:
+        if not _migrated:
+            migrate_chat_logs()
+            update_data(migrate_store, parts=("availability", "bookings", "meta", "stats"), sync=True)
+            _migrated = True
+        if _rolled_on != today:
+            update_data(lambda data: rollover(data, today), parts=ROLLOVER_PARTS, sync=True)
+            _rolled_on = today
@@ -0,0 +1,218 @@
+# exports.py — streaming CSV / JSONL / Parquet exports for the Admin Reports tab
+#
+# A dataset is a generator of row dicts straight off the store (a SQLite cursor,
+# the chat log segments line by line, the bookings snapshot); an encoder turns
+# rows into byte chunks of CHUNK_ROWS rows (one Parquet row group per chunk).
+# write_export() streams the chunks to a file under EXPORT_DIR/<random>/, so the
+# export itself never holds a whole dataset in memory, whatever its size.
+#
+# EXPORT_DIR is private (mode 0700, outside static/): nothing serves it directly.
+# The Admin page hands the file to st.download_button, whose media URL exists
+# only for the logged-in session and is sent as an attachment, which the proxies
+# mark "Cache-Control: private, no-store". Files are deleted EXPORT_TTL_SECONDS
+# later, on the next export or app start.
+#
+# Memory limit: st.download_button keeps the whole file in server memory, so the
+# button is built only on an explicit "Prepare download" and dropped on the next
+# rerun. At most one file of at most DOWNLOAD_MAX_BYTES (64 MB by default) is
+# held per admin session, from that click until the download has been served;
+# larger exports are refused and ordinary reruns read nothing.
+import csv
+import io
+import itertools
+import json
+import os
+import secrets
+import shutil
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Sequence
+
+import data_store_utils as store
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet is offered only when pyarrow is installed (Streamlit brings it)
+    pa = pq = None
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports"))
+EXPORT_TTL_SECONDS = int(os.environ.get("EXPORT_TTL_SECONDS", "600"))
+DOWNLOAD_MAX_BYTES = int(os.environ.get("EXPORT_DOWNLOAD_MAX_BYTES", str(64 * 2 ** 20)))
+CHUNK_ROWS = 5000
+
+Row = Dict[str, Any]
+
+
+# ---------- Datasets ----------
+def booking_rows(day_from: int = 0, day_to: int = 6, days: Sequence[str] = (),
+                 slots: Sequence[str] = ()) -> Iterator[Row]:
+    """Closed weeks' bookings from the archive, oldest first, then this week's."""
+    week = store.current_week()
+    archived = store.iter_archived_bookings(day_from, day_to)
+    for b in itertools.chain(archived, (dict(b, week=week) for b in store.iter_bookings(day_from, day_to))):
+        yield {"week": b["week"], "day": _label(days, b["day"]), "slot": _label(slots, b["slot"]),
+               "token": b.get("token") or "", "timestamp": b.get("time") or ""}
+
+
+def chat_log_rows(date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[Row]:
+    for e in store.iter_chat_logs(date_from, date_to):
+        yield {"time": e.get("time") or "", "user": e.get("user") or "", "text": e.get("text") or ""}
+
+
+def utilisation_rows(day_from: int = 0, day_to: int = 6, days: Sequence[str] = (),
+                     exclude_slots: Iterable[int] = ()) -> Iterator[Row]:
+    """One row per day: bookable slots and how many are booked, closed or still open."""
+    taken_at = datetime.now().isoformat(timespec="seconds")
+    grid = store.load_data(parts=("availability",))["availability"]
+    held = store.booking_summary()["booked"]  # aggregates: no booking lookups
+    exclude = set(exclude_slots)
+    for d in range(day_from, min(day_to, grid.days - 1) + 1):
+        slots = [s for s in range(grid.slots) if s not in exclude]
+        booked = [s for s in slots if held[d][s]]
+        open_ = sum(1 for s in slots if s not in booked and grid.is_free(d, s))
+        yield {"snapshot_at": taken_at, "day": _label(days, d), "slots": len(slots), "booked": len(booked),
+               "closed": len(slots) - open_ - len(booked), "open": open_,
+               "utilisation": round(len(booked) / len(slots), 4) if slots else 0.0}
+
+
+DATASETS: Dict[str, List[str]] = {  # name -> columns, in order
+    "bookings": ["week", "day", "slot", "token", "timestamp"],
+    "chat_logs": ["time", "user", "text"],
+    "utilisation": ["snapshot_at", "day", "slots", "booked", "closed", "open", "utilisation"],
+}
+
+
+def _label(names: Sequence[str], i: int) -> Any:
+    return names[i] if 0 <= i < len(names) else i
+
+
+# ---------- Encoders ----------
+def _chunks(rows: Iterable[Row]) -> Iterator[List[Row]]:
+    chunk: List[Row] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_csv(rows: Iterable[Row], columns: List[str]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():  # header only: an empty export
+        yield buf.getvalue().encode("utf-8")
+
+
+def to_jsonl(rows: Iterable[Row], columns: List[str]) -> Iterator[bytes]:
+    for chunk in _chunks(rows):
+        yield "".join(json.dumps({c: r.get(c) for c in columns}, ensure_ascii=False) + "\n"
+                      for r in chunk).encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose bytes are handed on after each row group."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.buf += b
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def take(self) -> bytes:
+        out, self.buf = bytes(self.buf), bytearray()
+        return out
+
+
+def to_parquet(rows: Iterable[Row], columns: List[str]) -> Iterator[bytes]:
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow")
+    sink = _Drain()
+    writer = None
+    for chunk in _chunks(rows):
+        table = pa.Table.from_pylist([{c: r.get(c) for c in columns} for r in chunk])
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        yield sink.take()
+    if writer is None:
+        writer = pq.ParquetWriter(sink, pa.schema([(c, pa.string()) for c in columns]))
+    writer.close()
+    yield sink.take()
+
+
+FORMATS: Dict[str, Dict[str, Any]] = {
+    "csv": {"encode": to_csv, "mime": "text/csv"},
+    "jsonl": {"encode": to_jsonl, "mime": "application/x-ndjson"},
+    "parquet": {"encode": to_parquet, "mime": "application/vnd.apache.parquet"},
+}
+
+
+def available_formats() -> List[str]:
+    return [f for f in FORMATS if f != "parquet" or pq is not None]
+
+
+# ---------- Files ----------
+def prune(max_age: int = EXPORT_TTL_SECONDS) -> None:
+    """Delete export directories older than `max_age` seconds."""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def write_export(dataset: str, fmt: str, rows: Iterable[Row], file_stem: Optional[str] = None) -> Dict[str, Any]:
+    """Stream `rows` of `dataset` as `fmt` into a fresh export file.
+    Returns {"path", "file_name", "mime", "bytes", "seconds"}."""
+    columns = DATASETS[dataset]
+    encode: Callable[[Iterable[Row], List[str]], Iterator[bytes]] = FORMATS[fmt]["encode"]
+    prune()
+    t0 = time.perf_counter()
+    key = secrets.token_urlsafe(24)
+    directory = os.path.join(EXPORT_DIR, key)
+    os.makedirs(EXPORT_DIR, mode=0o700, exist_ok=True)
+    os.makedirs(directory, mode=0o700)
+    file_name = f"{file_stem or dataset}.{fmt}"
+    path = os.path.join(directory, file_name)
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            for chunk in encode(rows, columns):
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    seconds = time.perf_counter() - t0
+    print(f"[exports] {file_name}: {size} bytes in {seconds:.2f}s")
+    return {"path": path, "file_name": file_name, "mime": FORMATS[fmt]["mime"],
+            "bytes": size, "seconds": seconds}
+
+
+try:
+    prune()
+except Exception as e:
+    print(f"[exports] Could not prune old exports: {e}")
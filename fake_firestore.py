@@ -0,0 +1,325 @@
+# fake_firestore.py — in-memory stand-in for google.cloud.firestore.Client
+#
+# Covers the subset data_store_utils / firestore_shards use: documents and
+# subcollections, get (with field masks), set (merge), update (dotted paths,
+# last_update_time preconditions), create, delete, where/order_by/start_after/
+# limit queries, stream, write batches and document snapshot listeners. Writes
+# are checked like the real service's: an integer outside signed 64 bits is
+# rejected with InvalidArgument. Good enough
+# for offline runs and the load harness; point FIRESTORE_EMULATOR_HOST at the
+# real emulator otherwise.
+import copy
+import itertools
+import threading
+import uuid
+from typing import Dict, Any, List, Optional
+
+_clock = itertools.count(1)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class FailedPrecondition(Exception):
+    pass
+
+
+class AlreadyExists(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+def _check_values(value: Any, path: str) -> None:
+    """Firestore integers are signed 64-bit; anything larger is refused, not stored."""
+    if isinstance(value, bool):
+        return
+    if isinstance(value, int) and not INT64_MIN <= value <= INT64_MAX:
+        raise InvalidArgument(f"{path}: integer {value} does not fit in 64 bits")
+    if isinstance(value, dict):
+        for v in value.values():
+            _check_values(v, path)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _check_values(v, path)
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data: Optional[Dict[str, Any]], update_time):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        value = self._data or {}
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+class _Precondition:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+def _deep_merge(dst: Dict[str, Any], src: Dict[str, Any]) -> None:
+    for k, v in src.items():
+        if isinstance(v, dict) and isinstance(dst.get(k), dict):
+            _deep_merge(dst[k], v)
+        else:
+            dst[k] = copy.deepcopy(v)
+
+
+class DocumentReference:
+    def __init__(self, client: "Client", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction=None) -> DocumentSnapshot:
+        with self._client._lock:
+            self._client.reads += 1
+            entry = self._client._docs.get(self.path)
+            if entry is None:
+                return DocumentSnapshot(self, None, None)
+            data, ts = entry
+            if field_paths is not None:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            return DocumentSnapshot(self, copy.deepcopy(data), ts)
+
+    # writes go through a one-op batch so preconditions and timestamps behave identically
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> WriteResult:
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        return batch.commit()[0]
+
+    def update(self, field_updates: Dict[str, Any], option=None) -> WriteResult:
+        batch = self._client.batch()
+        batch.update(self, field_updates, option=option)
+        return batch.commit()[0]
+
+    def create(self, document_data: Dict[str, Any]) -> WriteResult:
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        return batch.commit()[0]
+
+    def delete(self, option=None) -> WriteResult:
+        batch = self._client.batch()
+        batch.delete(self, option=option)
+        return batch.commit()[0]
+
+    def on_snapshot(self, callback) -> "Watch":
+        """callback(snapshots, changes, read_time) after every committed write to this document."""
+        watch = Watch(self._client, self.path, callback)
+        with self._client._lock:
+            self._client._listeners.setdefault(self.path, []).append(watch)
+        return watch
+
+
+class Watch:
+    def __init__(self, client: "Client", path: str, callback):
+        self._client = client
+        self._path = path
+        self.callback = callback
+
+    def unsubscribe(self) -> None:
+        with self._client._lock:
+            watches = self._client._listeners.get(self._path, [])
+            if self in watches:
+                watches.remove(self)
+
+
+class Query:
+    def __init__(self, collection: "CollectionReference", filters=None, order=None, limit_n=None, after=None):
+        self._collection = collection
+        self._filters = filters or []
+        self._order = order or []       # [(field, direction)], in priority order
+        self._limit = limit_n
+        self._after = after             # {field: value} of the order fields: start_after cursor
+
+    def _with(self, **changes) -> "Query":
+        args = dict(filters=self._filters, order=self._order, limit_n=self._limit, after=self._after)
+        args.update(changes)
+        return Query(self._collection, **args)
+
+    def where(self, field: str, op: str, value: Any) -> "Query":
+        return self._with(filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        return self._with(order=self._order + [(field, direction)])
+
+    def start_after(self, values: Dict[str, Any]) -> "Query":
+        return self._with(after=dict(values))
+
+    def limit(self, n: int) -> "Query":
+        return self._with(limit_n=n)
+
+    def _is_after(self, snap: DocumentSnapshot) -> bool:
+        for field, direction in self._order:
+            a, b = snap.get(field), self._after.get(field)
+            if a != b:
+                return (a > b) if direction == "ASCENDING" else (a < b)
+        return False
+
+    def stream(self, transaction=None):
+        client = self._collection._client
+        prefix = self._collection.path + "/"
+        with client._lock:
+            rows = [
+                (path, copy.deepcopy(data), ts)
+                for path, (data, ts) in client._docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+        out = []
+        for path, data, ts in rows:
+            snap = DocumentSnapshot(DocumentReference(client, path), data, ts)
+            if all(self._match(snap.get(f), op, v) for f, op, v in self._filters):
+                out.append(snap)
+        for field, direction in reversed(self._order):  # stable sorts, least significant field first
+            out.sort(key=lambda s: (s.get(field) is None, s.get(field)), reverse=direction == "DESCENDING")
+        if self._after is not None:
+            out = [s for s in out if self._is_after(s)]
+        if self._limit is not None:
+            out = out[: self._limit]
+        client.reads += max(1, len(out))
+        return iter(out)
+
+    def get(self, transaction=None) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+    @staticmethod
+    def _match(actual: Any, op: str, expected: Any) -> bool:
+        if op == "==":
+            return actual == expected
+        if op == "in":
+            return actual in expected
+        if actual is None:
+            return False
+        return {"<": actual < expected, "<=": actual <= expected,
+                ">": actual > expected, ">=": actual >= expected}[op]
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "Client", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+        super().__init__(self)
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self.path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data: Dict[str, Any]):
+        ref = self.document()
+        return ref.create(document_data), ref
+
+
+class WriteBatch:
+    def __init__(self, client: "Client"):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        _check_values(document_data, reference.path)
+        self._ops.append(("set", reference, copy.deepcopy(document_data), merge))
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any], option=None) -> None:
+        _check_values(field_updates, reference.path)
+        self._ops.append(("update", reference, copy.deepcopy(field_updates), option))
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> None:
+        _check_values(document_data, reference.path)
+        self._ops.append(("create", reference, copy.deepcopy(document_data), None))
+
+    def delete(self, reference: DocumentReference, option=None) -> None:
+        self._ops.append(("delete", reference, None, option))
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def commit(self) -> List[WriteResult]:
+        client = self._client
+        with client._lock:
+            docs = client._docs
+            # validate every precondition first: a batch is all-or-nothing
+            for kind, ref, _, opt in self._ops:
+                entry = docs.get(ref.path)
+                if kind == "create" and entry is not None:
+                    raise AlreadyExists(ref.path)
+                if kind == "update" and entry is None:
+                    raise NotFound(ref.path)
+                if isinstance(opt, _Precondition) and opt.last_update_time is not None:
+                    if entry is None or entry[1] != opt.last_update_time:
+                        raise FailedPrecondition(ref.path)
+            ts = next(_clock)
+            results = []
+            for kind, ref, data, opt in self._ops:
+                if kind == "delete":
+                    docs.pop(ref.path, None)
+                elif kind == "create" or (kind == "set" and not opt):
+                    docs[ref.path] = (data, ts)
+                elif kind == "set":
+                    current = copy.deepcopy(docs.get(ref.path, ({}, None))[0])
+                    _deep_merge(current, data)
+                    docs[ref.path] = (current, ts)
+                else:
+                    current = copy.deepcopy(docs[ref.path][0])
+                    for field, value in data.items():
+                        node = current
+                        *parents, leaf = field.split(".")
+                        for p in parents:
+                            node = node.setdefault(p, {})
+                        node[leaf] = value
+                    docs[ref.path] = (current, ts)
+                client.writes += 1
+                results.append(WriteResult(ts))
+            notify = []
+            for path in {ref.path for _, ref, _, _ in self._ops}:
+                watches = client._listeners.get(path)
+                if not watches:
+                    continue
+                entry = docs.get(path)
+                snap = DocumentSnapshot(DocumentReference(client, path),
+                                        copy.deepcopy(entry[0]) if entry else None, entry[1] if entry else None)
+                notify += [(w, snap) for w in watches]
+        # outside the lock, like the real client's listener thread
+        for w, snap in notify:
+            w.callback([snap], [], ts)
+        return results
+
+
+class Client:
+    def __init__(self):
+        self._docs: Dict[str, Any] = {}
+        self._listeners: Dict[str, List["Watch"]] = {}
+        self._lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    @staticmethod
+    def write_option(**kwargs) -> _Precondition:
+        return _Precondition(**kwargs)
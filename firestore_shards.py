@@ -0,0 +1,338 @@
+# firestore_shards.py — sharded Firestore layout for data_store_utils (FIRESTORE_LAYOUT=sharded)
+#
+# {collection}/{doc_id}                      root: {"layout": "sharded", "updated": iso, "counsellors": [...],
+#                                                   "meta": {...}, "templates": {...}}
+# {collection}/{doc_id}/availability/{day}   {"cells": {"<slot>": bool}, "stats": {...}}  (booking_stats, per day)
+# {collection}/{doc_id}/bookings/{token}     {"day": int, "slot": int, "token": str, "time": str}
+# {collection}/{doc_id}/archive/{week}       {"bookings": [...]}  (a closed week's bookings, see rollover())
+# {collection}/{doc_id}/chat_logs/{auto id}  {"seq": int, "n": int, "user": str, "time": str, "text": str}
+#                                            (written and read by chat_log_store.FirestoreChatLog)
+#
+# Every mutation batch also touches the root document, so the root's
+# update_time doubles as the version stamp for cached shards, and load()
+# returns it as "_version". save() makes its first batch conditional on that
+# stamp: a store changed since it was loaded fails the whole save (a conflict
+# data_store_utils retries), and only the cells that changed are written.
+# Bookings and cancellations write their day shard with a last_update_time
+# precondition, which keeps its cells and booking aggregates in step with the
+# bookings.
+import copy
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+import booking_stats
+from availability_grid import AvailabilityGrid
+
+PARTS = ("archive", "availability", "bookings", "counsellors", "chat_logs", "meta", "stats", "templates")
+BATCH_LIMIT = 450          # Firestore caps a write batch at 500 operations
+RESERVE_RETRIES = 5
+_CONFLICT_ERRORS = ("FailedPrecondition", "Aborted", "AlreadyExists", "Conflict")
+
+
+def _is_conflict(e: Exception) -> bool:
+    return type(e).__name__ in _CONFLICT_ERRORS
+
+
+class ShardedStore:
+    def __init__(self, client, collection: str, doc_id: str):
+        self.client = client
+        self.root = client.collection(collection).document(doc_id)
+        self._lock = threading.Lock()
+        self._parts: Dict[str, Any] = {}         # part -> last value read or written
+        self._stamps: Dict[str, Any] = {}        # part -> root update_time it belongs to
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- Refs ----------
+    def _day_ref(self, day: int):
+        return self.root.collection("availability").document(str(day))
+
+    def _booking_ref(self, token: str):
+        return self.root.collection("bookings").document(token)
+
+    # ---------- Reads ----------
+    def _fetch(self, part: str, root_data: Dict[str, Any]) -> Any:
+        if part == "availability":
+            out = {}
+            for snap in self.root.collection("availability").stream():
+                for s, v in (snap.to_dict() or {}).get("cells", {}).items():
+                    out[f"{snap.id}_{s}"] = bool(v)
+            return out
+        if part == "stats":
+            out = {}
+            for snap in self.root.collection("availability").stream():
+                entry = (snap.to_dict() or {}).get("stats")
+                if entry:
+                    out[snap.id] = entry
+            return out
+        if part == "bookings":
+            rows = [snap.to_dict() for snap in self.root.collection("bookings").stream()]
+            return sorted(rows, key=lambda b: b.get("time") or "")
+        if part == "archive":
+            return {snap.id: list((snap.to_dict() or {}).get("bookings", []))
+                    for snap in self.root.collection("archive").stream()}
+        if part == "counsellors":
+            return list(root_data.get("counsellors", []))
+        if part in ("meta", "templates"):
+            return dict(root_data.get(part, {}))
+        if part == "chat_logs":
+            return []  # the collection is read through chat_log_store.FirestoreChatLog, never loaded whole
+        raise KeyError(part)
+
+    def version(self) -> Any:
+        snap = self.root.get(field_paths=[])
+        return snap.update_time if snap.exists else None
+
+    def load(self, parts: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Read only the requested parts; unchanged parts come from the in-process copy."""
+        parts = tuple(parts or PARTS)
+        snap = self.root.get()
+        root_data = (snap.to_dict() or {}) if snap.exists else {}
+        stamp = snap.update_time if snap.exists else None
+        out: Dict[str, Any] = {}
+        for part in parts:
+            with self._lock:
+                cached = stamp is not None and self._stamps.get(part) == stamp
+                if cached:
+                    self.hits += 1
+                    value = self._parts[part]
+            if not cached:
+                with self._lock:
+                    self.misses += 1
+                value = self._fetch(part, root_data)
+                with self._lock:
+                    self._parts[part] = value
+                    self._stamps[part] = stamp
+            out[part] = copy.deepcopy(value)
+        out["_version"] = stamp  # data_store_utils.VERSION_KEY: what save(expected=...) checks
+        return out
+
+    def find_booking(self, token: str) -> Optional[Dict[str, Any]]:
+        snap = self._booking_ref(token).get()
+        return snap.to_dict() if snap.exists else None
+
+    def booking_at(self, day: int, slot: int) -> Optional[Dict[str, Any]]:
+        found = list(self.root.collection("bookings").where("day", "==", day).where("slot", "==", slot).limit(1).stream())
+        return found[0].to_dict() if found else None
+
+    # ---------- Writes ----------
+    def _commit(self, ops: List[tuple], expected: Any = None) -> Any:
+        """Commit (kind, ref, data) ops in chunks, root touch last. With `expected`, the
+        root update_time the ops were computed from, the first batch only commits if
+        the root is still at it. Returns the new root stamp."""
+        touch = {"updated": datetime.now().isoformat()}
+        guard = [("update_if", self.root, (touch, expected))] if expected is not None else []
+        ops = guard + ops + [("set_merge", self.root, touch)]
+        result = None
+        for i in range(0, len(ops), BATCH_LIMIT):
+            batch = self.client.batch()
+            for kind, ref, data in ops[i:i + BATCH_LIMIT]:
+                if kind == "delete":
+                    batch.delete(ref)
+                elif kind == "set_merge":
+                    batch.set(ref, data, merge=True)
+                elif kind == "create":
+                    batch.create(ref, data)
+                elif kind == "update":
+                    batch.update(ref, data)
+                elif kind == "update_if":  # (fields, last_update_time the write depends on)
+                    batch.update(ref, data[0], option=self.client.write_option(last_update_time=data[1]))
+                else:
+                    batch.set(ref, data)
+            result = batch.commit()
+        return result[-1].update_time if result else None
+
+    def save(self, data: Dict[str, Any], expected: Any = None) -> None:
+        """Write only the shards of the parts present in `data` that differ from what we last saw.
+        With `expected` (load()'s "_version"), raises the client's FailedPrecondition if
+        anyone wrote the store since."""
+        present = [p for p in PARTS if p in data]
+        missing = [p for p in present if p not in self._parts]
+        if missing:
+            self.load(missing)
+        ops: List[tuple] = []
+        for part in present:
+            before, after = self._parts.get(part), data[part]
+            if before == after:
+                continue
+            if part == "availability":
+                days_before, days_after = _by_day(before), _by_day(after)
+                for day, cells in days_after.items():
+                    if day not in days_before:
+                        ops.append(("set_merge", self._day_ref(day), {"cells": cells}))
+                        continue
+                    # field paths: only the changed cells, the day's other cells and stats stay
+                    changed = {f"cells.{s}": v for s, v in cells.items() if days_before[day].get(s) != v}
+                    if changed:
+                        ops.append(("update", self._day_ref(day), changed))
+                for day in days_before:
+                    if day not in days_after:
+                        ops.append(("delete", self._day_ref(day), None))
+            elif part == "bookings":
+                old = {b.get("token"): b for b in before}
+                new = {b.get("token"): b for b in after}
+                for t in old:
+                    if t not in new:
+                        ops.append(("delete", self._booking_ref(t), None))
+                for t, b in new.items():
+                    if old.get(t) != b:
+                        ops.append(("set", self._booking_ref(t), dict(b)))
+            elif part == "archive":
+                archive = self.root.collection("archive")
+                for week, rows in after.items():
+                    if before.get(week) != rows:
+                        ops.append(("set", archive.document(week), {"bookings": list(rows)}))
+                for week in before:
+                    if week not in after:
+                        ops.append(("delete", archive.document(week), None))
+            elif part == "counsellors":
+                ops.append(("set_merge", self.root, {"counsellors": after}))
+            elif part == "meta":
+                ops.append(("set_merge", self.root, {"meta": after}))
+            elif part == "templates":
+                # update replaces the map, so deleted templates go; a merge would keep them
+                ops.append(("update" if before else "set_merge", self.root, {"templates": after}))
+            elif part == "stats":
+                for key, entry in after.items():
+                    if before.get(key) != entry:
+                        ops.append(("update" if key in before else "set_merge", self._day_ref(int(key)),
+                                    {"stats": entry}))
+            elif part == "chat_logs":
+                # legacy entries handed over by migrate_from_single; seq 0.. sorts them
+                # before anything FirestoreChatLog appends, and nothing here ever deletes
+                logs = self.root.collection("chat_logs")
+                for seq, entry in enumerate(after):
+                    if entry not in before:
+                        ops.append(("create", logs.document(), dict(entry, seq=seq, n=0)))
+        if not ops:
+            return
+        stamp = self._commit(ops, expected)
+        with self._lock:
+            for part in present:
+                # chat_logs as load() sees it: empty, its entries are the collection's now
+                self._parts[part] = [] if part == "chat_logs" else copy.deepcopy(data[part])
+                self._stamps[part] = stamp
+
+    def _invalidate(self, *parts: str) -> None:
+        with self._lock:
+            for p in parts:
+                self._stamps.pop(p, None)
+
+    def reserve_slot(self, day: int, slot: int, token: str, time_iso: Optional[str] = None) -> bool:
+        """Conditional booking: the day shard is updated with a last_update_time
+        precondition in the same batch that creates the booking, retried on conflict."""
+        day_ref = self._day_ref(day)
+        for _ in range(RESERVE_RETRIES):
+            snap = day_ref.get()
+            doc = (snap.to_dict() or {}) if snap.exists else {}
+            if not doc.get("cells", {}).get(str(slot), True):
+                return False
+            stats = booking_stats.book_day(doc.get("stats"), day, slot, time_iso)
+            batch = self.client.batch()
+            if snap.exists:
+                batch.update(day_ref, {f"cells.{slot}": False, "stats": stats},
+                             option=self.client.write_option(last_update_time=snap.update_time))
+            else:
+                batch.create(day_ref, {"cells": {str(slot): False}, "stats": stats})
+            batch.create(self._booking_ref(token), {"day": day, "slot": slot, "token": token, "time": time_iso})
+            batch.set(self.root, {"updated": datetime.now().isoformat()}, merge=True)
+            try:
+                batch.commit()
+            except Exception as e:
+                if _is_conflict(e):
+                    continue
+                raise
+            self._invalidate("availability", "bookings", "stats")
+            return True
+        return False
+
+    def _cancel(self, find: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Delete the bookings `find` returns, reopen their slots and count the cancellations.
+        Day shards are read before the bookings are re-checked and written with a
+        precondition, so a concurrent cancel of the same booking is counted once."""
+        for _ in range(RESERVE_RETRIES):
+            candidates = find()
+            days = {b["day"] for b in candidates}
+            snaps = {day: self._day_ref(day).get() for day in days}
+            removed = [b for b in candidates if self._booking_ref(b["token"]).get().exists]
+            if not removed:
+                return []
+            ops: List[tuple] = []
+            for day, snap in snaps.items():
+                on_day = [b for b in removed if b["day"] == day]
+                if not on_day:
+                    continue
+                stats = (snap.to_dict() or {}).get("stats") if snap.exists else None
+                for b in on_day:
+                    stats = booking_stats.cancel_day(stats, b["slot"], b.get("time"))
+                if snap.exists:
+                    fields = {f"cells.{b['slot']}": True for b in on_day}
+                    fields["stats"] = stats
+                    ops.append(("update_if", self._day_ref(day), (fields, snap.update_time)))
+                else:
+                    ops.append(("create", self._day_ref(day),
+                                {"cells": {str(b["slot"]): True for b in on_day}, "stats": stats}))
+            ops += [("delete", self._booking_ref(b["token"]), None) for b in removed]  # guarded writes first
+            try:
+                self._commit(ops)
+            except Exception as e:
+                if _is_conflict(e):
+                    continue
+                raise
+            self._invalidate("availability", "bookings", "stats")
+            return removed
+        raise RuntimeError("cancellation kept conflicting with other writers")
+
+    def cancel_slot(self, day: int, slot: int) -> bool:
+        def _find():
+            found = self.root.collection("bookings").where("day", "==", day).where("slot", "==", slot).limit(1)
+            return [s.to_dict() for s in found.stream()]
+
+        if self._cancel(_find):
+            return True
+        self._commit([("set_merge", self._day_ref(day), {"cells": {str(slot): True}})])
+        self._invalidate("availability")
+        return False
+
+    def cancel_booking(self, token: str) -> Optional[Dict[str, Any]]:
+        removed = self._cancel(lambda: [b for b in [self.find_booking(token)] if b is not None])
+        return removed[0] if removed else None
+
+    def cancel_bookings(self, tokens: Iterable[str]) -> List[Dict[str, Any]]:
+        """Delete the bookings in `tokens` and reopen their slots: one batch (chunked past the limit)."""
+        wanted = set(tokens)
+        return self._cancel(lambda: [b for b in self.load(["bookings"])["bookings"] if b.get("token") in wanted])
+
+    # ---------- Migration ----------
+    def migrate_from_single(self) -> bool:
+        """Split a legacy {"payload": {...}} root document into shards. Returns True if it migrated."""
+        snap = self.root.get()
+        if not snap.exists:
+            return False
+        root_data = snap.to_dict() or {}
+        payload = root_data.get("payload")
+        if not isinstance(payload, dict):
+            return False
+        with self._lock:
+            self._parts = {"archive": {}, "availability": {}, "bookings": [], "chat_logs": [], "stats": {}}
+            self._stamps = {}
+        self.save({k: payload.get(k, []) if k not in ("archive", "availability", "stats") else payload.get(k, {})
+                   for k in ("archive", "availability", "bookings", "chat_logs", "stats")})
+        # replacing the root drops the old payload field
+        self.root.set({"layout": "sharded", "updated": datetime.now().isoformat(),
+                       "counsellors": payload.get("counsellors", []), "meta": payload.get("meta", {}),
+                       "templates": payload.get("templates", {})})
+        with self._lock:
+            self._stamps = {}
+        print(f"[firestore_shards] Migrated single-document store at {self.root.path} "
+              f"({len(payload.get('bookings', []))} bookings)")
+        return True
+
+
+def _by_day(availability: Any) -> Dict[int, Dict[str, bool]]:
+    """{day: {"<slot>": bool}} from a grid, its compact JSON form or a legacy "d_s" dict."""
+    out: Dict[int, Dict[str, bool]] = {}
+    for d, s, free in AvailabilityGrid.from_json(availability).iter_cells():
+        out.setdefault(d, {})[str(s)] = free
+    return out
@@ -0,0 +1,324 @@
+# load_harness.py — many simulated sessions of mental.py and Admin.py, headless and offline
+#
+#   python load_harness.py [--backend json --backend firestore] [--students 200] [--admins 4]
+#                          [--actions 8] [--workers 32] [--seed 1] [--json results.json]
+#
+# Each backend runs in its own child process (data_store_utils picks its backend
+# at import) inside a throwaway copy of the app, so data_store.json and
+# chat_logs/ in the working tree are never touched. "firestore" is the
+# in-memory fake_firestore client (single-document layout), "sharded" the
+# same with FIRESTORE_LAYOUT=sharded.
+#
+# Sessions are Streamlit AppTest instances. Buttons, text inputs and the
+# password field are driven through AppTest's element API. The booking grids
+# are custom components AppTest can't click, so a click is injected the way the
+# frontend would send it: the component's value, set through session state
+# before the rerun.
+#
+# Students open the booking page, book and cancel random slots (cancelling by
+# token, as a student would), then search the Resources Hub. Admins log in and
+# close/reopen slots in the availability tab. Reported per backend:
+#   rerun latency p50/p95/p99 per interaction kind, throughput,
+#   store reads/writes per interaction,
+#   lost updates: bookings or admin closes the app confirmed but the final store lacks,
+#   double bookings: slots holding more than one booking, or a booking on an open slot,
+#   stats drift: cells whose booking aggregates (booking_stats) disagree with the bookings.
+# The exit status is 1 if any lost update, double booking, drift or session error was seen.
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+BACKENDS = {
+    "json": {},
+    "firestore": {"USE_FIRESTORE": "1", "FIRESTORE_FAKE": "1"},
+    "sharded": {"USE_FIRESTORE": "1", "FIRESTORE_FAKE": "1", "FIRESTORE_LAYOUT": "sharded"},
+}
+APP_FILES = ("mental.py", "Admin.py", "resources.json", "healnest.png", "booking_grid_frontend", ".streamlit")
+ADMIN_PASSWORD = "harness-admin"
+LUNCH_SLOT = 4   # mental.py / Admin.py SLOTS.index("1 P.M. to 2 P.M.")
+QUERIES = ["stress", "sleep", "breathing", "exam anxiety", "meditaton", "focus", "podcast", "self care"]
+TIMEOUT = 60
+
+
+# ---------- Parent: one child process per backend ----------
+def _workdir() -> str:
+    """Throwaway copy of the app: every module, the catalogue and the component frontend."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix="healnest-load-")
+    for name in os.listdir(here):
+        src = os.path.join(here, name)
+        if name.endswith(".py") or name in APP_FILES:
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(tmp, name))
+            else:
+                shutil.copy2(src, tmp)
+    return tmp
+
+
+def run_backend(backend: str, args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = _workdir()
+    out = os.path.join(workdir, "result.json")
+    env = dict(os.environ, **BACKENDS[backend], ADMIN_PASSWORD=ADMIN_PASSWORD)
+    for k in ("USE_FIRESTORE", "USE_SQLITE", "USE_JOURNAL", "FIRESTORE_LAYOUT", "WRITE_BEHIND"):
+        if k not in BACKENDS[backend]:
+            env.pop(k, None)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, "--out", out,
+           "--students", str(args.students), "--admins", str(args.admins), "--actions", str(args.actions),
+           "--workers", str(args.workers), "--seed", str(args.seed)]
+    try:
+        subprocess.run(cmd, cwd=workdir, env=env, check=True)
+        with open(out, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------- Child: the sessions ----------
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        self.booked: Dict[str, tuple] = {}     # token -> (day, slot) confirmed by the app
+        self.cancelled: set = set()
+        self.closed: Dict[tuple, int] = {}      # (day, slot) -> admin closes minus reopens
+        self.taken = 0                          # "slot was just taken" answers
+
+    def timed(self, kind: str, at) -> Any:
+        t0 = time.perf_counter()
+        at.run(timeout=TIMEOUT)
+        dt = time.perf_counter() - t0
+        with self.lock:
+            self.latency.setdefault(kind, []).append(dt)
+        if at.exception:
+            with self.lock:
+                self.errors.append(f"{kind}: {at.exception[0].message}")
+        return at
+
+
+def _button(at, label: str):
+    for b in at.button:
+        if b.label == label:
+            return b
+    raise LookupError(f"no button {label!r}")
+
+
+def _click_grid(at, key: str, day: int, slot: int, action: str, n: int) -> None:
+    at.session_state[key] = {"lane": "all", "day": day, "slot": slot, "action": action, "seq": f"harness-{n}"}
+
+
+def student(i: int, rec: Recorder, args: argparse.Namespace, first_day: int) -> None:
+    from streamlit.testing.v1 import AppTest
+    rnd = random.Random(args.seed * 100003 + i)
+    at = AppTest.from_file("mental.py", default_timeout=TIMEOUT)
+    rec.timed("open app", at)
+    _button(at, "Book Counsellor").click()
+    rec.timed("open booking", at)
+    mine: List[str] = []
+    for n in range(args.actions):
+        if mine and rnd.random() < 0.3:
+            token = mine.pop(rnd.randrange(len(mine)))
+            at.text_input(key="verify_token").input(token)
+            rec.timed("verify token", at)
+            try:
+                _button(at, "Cancel this booking").click()
+            except LookupError:
+                with rec.lock:
+                    rec.errors.append(f"student {i}: booking {token} not found by token")
+                continue
+            rec.timed("cancel", at)
+            at.text_input(key="verify_token").input("")
+            with rec.lock:
+                rec.cancelled.add(token)
+            continue
+        day = rnd.randrange(first_day, 7)
+        slot = rnd.choice([s for s in range(9) if s != LUNCH_SLOT])
+        _click_grid(at, "student_booking_grid", day, slot, "book", n)
+        rec.timed("book", at)
+        confirmed = [s.value for s in at.success if "Your token: " in s.value]
+        if confirmed:
+            token = confirmed[-1].rsplit("Your token: ", 1)[1].strip()
+            mine.append(token)
+            with rec.lock:
+                rec.booked[token] = (day, slot)
+        elif any("just taken" in w.value for w in at.warning):
+            with rec.lock:
+                rec.taken += 1
+    _button(at, "Close Booking").click()
+    rec.timed("close booking", at)
+    _button(at, "Browse Resources").click()
+    rec.timed("open resources", at)
+    for _ in range(max(1, args.actions // 3)):
+        next(t for t in at.text_input if t.label == "Search resources").input(rnd.choice(QUERIES))
+        rec.timed("search", at)
+
+
+def admin(i: int, rec: Recorder, args: argparse.Namespace, first_day: int) -> None:
+    from streamlit.testing.v1 import AppTest
+    rnd = random.Random(args.seed * 7919 + i)
+    at = AppTest.from_file("Admin.py", default_timeout=TIMEOUT)
+    rec.timed("admin open", at)
+    at.sidebar.text_input[0].input(ADMIN_PASSWORD)
+    rec.timed("admin login", at)
+    closed: List[tuple] = []
+    for n in range(args.actions):
+        if closed and rnd.random() < 0.5:
+            # only reopen what this admin closed: reopening a booked slot is a real
+            # admin action but would be counted as a double booking below
+            day, slot = closed.pop(rnd.randrange(len(closed)))
+            action, delta = "open", -1
+        else:
+            day = rnd.randrange(first_day, 7)
+            slot = rnd.choice([s for s in range(9) if s != LUNCH_SLOT])
+            action, delta = "close", 1
+        _click_grid(at, "admin_availability_grid", day, slot, action, n)
+        rec.timed("admin toggle", at)
+        if any(s.value.startswith("Slot set") for s in at.success):
+            if action == "close":
+                closed.append((day, slot))
+            with rec.lock:
+                rec.closed[(day, slot)] = rec.closed.get((day, slot), 0) + delta
+
+
+def _pct(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, os.getcwd())
+    import data_store_utils as d
+
+    io = {"reads": 0, "writes": 0}
+    io_lock = threading.Lock()
+
+    def counting(name: str, kind: str) -> None:
+        fn = getattr(d, name)
+
+        def wrapper(*a, **kw):
+            with io_lock:
+                io[kind] += 1
+            return fn(*a, **kw)
+        setattr(d, name, wrapper)
+
+    if d._firestore_client is None:
+        # JSON backend: count the disk reads and writes behind the read cache
+        counting("_read_file_store", "reads")
+        counting("_write_file_store", "writes")
+        counting("_append_journal", "writes")
+
+    def store_io() -> Dict[str, int]:
+        client = d._firestore_client
+        if client is not None:
+            return {"reads": client.reads, "writes": client.writes}
+        return dict(io)
+
+    d.ensure_store_ready()
+    first_day = d.locked_before(date.today())
+    rec = Recorder()
+    io0 = store_io()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        jobs = [pool.submit(student, i, rec, args, first_day) for i in range(args.students)]
+        jobs += [pool.submit(admin, i, rec, args, first_day) for i in range(args.admins)]
+        for job in jobs:
+            try:
+                job.result()
+            except Exception as e:
+                rec.errors.append(f"session: {type(e).__name__}: {e}")
+    wall = time.perf_counter() - t0
+    io1 = store_io()
+
+    # consistency of the final store against what the app told its users
+    d.clear_cache()
+    store = d.load_data()
+    grid = store["availability"]
+    by_cell: Dict[tuple, int] = {}
+    tokens = set()
+    for b in store["bookings"]:
+        by_cell[(b["day"], b["slot"])] = by_cell.get((b["day"], b["slot"]), 0) + 1
+        tokens.add(b["token"])
+    double = sum(n - 1 for n in by_cell.values() if n > 1)
+    double += sum(1 for (day, slot) in by_cell if grid.is_free(day, slot))
+    lost_bookings = sum(1 for t in rec.booked if t not in rec.cancelled and t not in tokens)
+    lost_closes = sum(1 for (day, slot), n in rec.closed.items() if n > 0 and grid.is_free(day, slot))
+    held = d.booking_summary()["booked"]
+    drift = sum(1 for day in range(grid.days) for slot in range(grid.slots)
+                if held[day][slot] != by_cell.get((day, slot), 0))
+
+    interactions = sum(len(v) for v in rec.latency.values())
+    all_runs = sorted(x for v in rec.latency.values() for x in v)
+    result = {
+        "students": args.students, "admins": args.admins, "workers": args.workers,
+        "interactions": interactions, "wall_s": round(wall, 2),
+        "throughput_per_s": round(interactions / wall, 1) if wall else 0.0,
+        "latency_ms": {k: {"n": len(v), "p50": round(_pct(sorted(v), 0.5), 1), "p95": round(_pct(sorted(v), 0.95), 1),
+                           "p99": round(_pct(sorted(v), 0.99), 1)} for k, v in sorted(rec.latency.items())},
+        "latency_all_ms": {"p50": round(statistics.median(all_runs) * 1000, 1) if all_runs else 0.0,
+                           "p95": round(_pct(all_runs, 0.95), 1) if all_runs else 0.0,
+                           "p99": round(_pct(all_runs, 0.99), 1) if all_runs else 0.0},
+        "store_reads": io1["reads"] - io0["reads"], "store_writes": io1["writes"] - io0["writes"],
+        "reads_per_interaction": round((io1["reads"] - io0["reads"]) / max(interactions, 1), 2),
+        "writes_per_interaction": round((io1["writes"] - io0["writes"]) / max(interactions, 1), 2),
+        "bookings_confirmed": len(rec.booked), "bookings_cancelled": len(rec.cancelled), "slot_taken": rec.taken,
+        "lost_updates": lost_bookings + lost_closes, "double_bookings": double, "stats_drift": drift,
+        "errors": rec.errors[:20], "error_count": len(rec.errors),
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+
+def report(backend: str, r: Dict[str, Any]) -> None:
+    print(f"\n== {backend}: {r['students']} students, {r['admins']} admins, {r['workers']} workers")
+    print(f"{r['interactions']} reruns in {r['wall_s']} s  ({r['throughput_per_s']}/s)   "
+          f"all p50 {r['latency_all_ms']['p50']} ms  p95 {r['latency_all_ms']['p95']} ms  p99 {r['latency_all_ms']['p99']} ms")
+    for kind, s in r["latency_ms"].items():
+        print(f"  {kind:<16} n={s['n']:<6} p50 {s['p50']:8.1f} ms  p95 {s['p95']:8.1f} ms  p99 {s['p99']:8.1f} ms")
+    print(f"store reads {r['store_reads']} ({r['reads_per_interaction']}/interaction)  "
+          f"writes {r['store_writes']} ({r['writes_per_interaction']}/interaction)")
+    print(f"bookings confirmed {r['bookings_confirmed']}  cancelled {r['bookings_cancelled']}  slot taken {r['slot_taken']}")
+    print(f"lost updates {r['lost_updates']}  double bookings {r['double_bookings']}  "
+          f"stats drift {r['stats_drift']}  errors {r['error_count']}")
+    for e in r["errors"]:
+        print(f"  ! {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Headless load harness for mental.py and Admin.py")
+    ap.add_argument("--backend", action="append", choices=sorted(BACKENDS))
+    ap.add_argument("--students", type=int, default=200)
+    ap.add_argument("--admins", type=int, default=4)
+    ap.add_argument("--actions", type=int, default=8, help="interactions per session")
+    ap.add_argument("--workers", type=int, default=32, help="sessions driven at the same time")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write all results to this file (to compare releases)")
+    ap.add_argument("--child", choices=sorted(BACKENDS), help=argparse.SUPPRESS)
+    ap.add_argument("--out", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        child(args)
+        return 0
+    results = {}
+    for backend in args.backend or ["json", "firestore"]:
+        results[backend] = run_backend(backend, args)
+        report(backend, results[backend])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    bad = any(r["lost_updates"] or r["double_bookings"] or r["stats_drift"] or r["error_count"]
+              for r in results.values())
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
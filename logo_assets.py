@@ -0,0 +1,135 @@
+# logo_assets.py — display-sized logo variants, built once and served as static files
+#
+#   python logo_assets.py            build step (the Dockerfile runs it)
+#
+# healnest.png is 1024x1024 / 1.1 MB but shown at 140-160 px. For each display
+# width this writes PNG and WebP variants at 1x and 2x into static/, named by a
+# hash of the source (healnest-140-2x.3f9a1c0b.webp), so a browser may cache
+# them forever. Streamlit serves static/ at app/static/ (enableStaticServing in
+# .streamlit/config.toml) and proxy.py marks hashed files immutable. A rerun
+# then sends a few hundred bytes of <picture> HTML instead of the image.
+#
+# Variants missing at startup are built on first use; without Pillow nothing is
+# built and logo_html() returns None, so callers fall back to st.image on the
+# original bytes (read once per process).
+import functools
+import hashlib
+import os
+import sys
+import threading
+from html import escape
+from typing import Dict, Any, Iterable, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # optional: Streamlit installs it, bare environments may not
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL = "app/static"   # relative, so it also works behind proxy.py's /admin prefix
+WIDTHS = (140, 160)         # mental.py, Admin.py
+SCALES = (1, 2)
+FORMATS = ("webp", "png")
+
+_lock = threading.Lock()
+_variants: Dict[tuple, Optional[Dict[str, Any]]] = {}   # (source, width) -> variant set, None if unavailable
+
+
+def _abs(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+@functools.lru_cache(maxsize=8)
+def find_logo(candidates: Iterable[str]) -> Optional[str]:
+    """First existing path among `candidates`; probed once per process (pass a tuple)."""
+    for p in candidates:
+        if os.path.exists(_abs(p)):
+            return p
+    return None
+
+
+@functools.lru_cache(maxsize=4)
+def logo_bytes(source: str) -> bytes:
+    with open(_abs(source), "rb") as f:
+        return f.read()
+
+
+def _variant_name(source: str, width: int, scale: int, digest: str, fmt: str) -> str:
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{stem}-{width}-{scale}x.{digest}.{fmt}"
+
+
+def _build(source: str, width: int) -> Optional[Dict[str, Any]]:
+    if Image is None:
+        return None
+    raw = logo_bytes(source)
+    digest = hashlib.sha1(raw).hexdigest()[:8]
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    files: Dict[str, Dict[int, str]] = {fmt: {} for fmt in FORMATS}
+    with Image.open(_abs(source)) as img:  # decoded only if a variant is missing
+        height = round(img.height * width / img.width)
+        for scale in SCALES:
+            for fmt in FORMATS:
+                name = _variant_name(source, width, scale, digest, fmt)
+                files[fmt][scale] = name
+                path = os.path.join(STATIC_DIR, name)
+                if os.path.exists(path):
+                    continue
+                out = img.resize((width * scale, height * scale), Image.LANCZOS)
+                tmp = f"{path}.{os.getpid()}.tmp"  # both apps may build at the same time
+                if fmt == "webp":
+                    out.save(tmp, "WEBP", quality=90, method=6)
+                else:
+                    out.save(tmp, "PNG", optimize=True)
+                os.replace(tmp, path)
+                print(f"[logo_assets] Wrote {name} ({os.path.getsize(path)} bytes)")
+    _prune(source, digest)
+    return {"width": width, "height": height, "files": files}
+
+
+def _prune(source: str, digest: str) -> None:
+    """Drop variants of earlier versions of the source image."""
+    stem = os.path.splitext(os.path.basename(source))[0] + "-"
+    for name in os.listdir(STATIC_DIR):
+        if name.startswith(stem) and f".{digest}." not in name and not name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(STATIC_DIR, name))
+            except OSError:
+                pass
+
+
+def variants(source: str, width: int) -> Optional[Dict[str, Any]]:
+    """The variant set for (source, width), built on first use and then kept in process."""
+    key = (source, width)
+    if key in _variants:
+        return _variants[key]
+    with _lock:
+        if key not in _variants:
+            try:
+                _variants[key] = _build(source, width)
+            except Exception as e:
+                print(f"[logo_assets] Could not build {width}px logo from {source}: {e}")
+                _variants[key] = None
+        return _variants[key]
+
+
+def logo_html(source: str, width: int, alt: str = "Heal Nest logo") -> Optional[str]:
+    """<picture> tag with WebP and PNG srcsets (1x/2x), or None when no variants exist."""
+    v = variants(source, width)
+    if v is None:
+        return None
+
+    def srcset(fmt: str) -> str:
+        return ", ".join(f"{STATIC_URL}/{name} {scale}x" for scale, name in sorted(v["files"][fmt].items()))
+
+    return (f'<picture><source type="image/webp" srcset="{srcset("webp")}">'
+            f'<img src="{STATIC_URL}/{v["files"]["png"][1]}" srcset="{srcset("png")}" '
+            f'width="{v["width"]}" height="{v["height"]}" alt="{escape(alt)}"></picture>')
+
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else "healnest.png"
+    for w in WIDTHS:
+        if variants(src, w) is None:
+            sys.exit("[logo_assets] Pillow is required to build logo variants")
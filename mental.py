@@ -3,13 +3,21 @@
 
 import os
 from datetime import datetime
+from html import escape
 import secrets
 import string
 
 import streamlit as st
 import streamlit.components.v1 as components
 
-from data_store_utils import load_data, save_data
+from data_store_utils import (load_data, reserve_slot, cancel_slot, find_booking, cancel_booking,
+                              ensure_store_ready, change_version, RESET_WEEK_ON_SUNDAY)
+from resources_catalog import get_catalog
+from booking_grid import booking_grid, encode_cells, AVAILABLE, BOOKED, LUNCH, LOCKED
+import run_timing
+import logo_assets
+
+_run_started = run_timing.run_started()
 
 # -----------------------
 # Page config + CSS
@@ -66,7 +74,6 @@ SLOTS = [
 ]
 LUNCH_SLOT_INDEX = SLOTS.index("1 P.M. to 2 P.M.")
 today_idx = datetime.now().weekday()
-RESET_WEEK_ON_SUNDAY = True
 
 
 def make_token(n=8):
@@ -74,10 +81,6 @@ def make_token(n=8):
     return "".join(secrets.choice(alphabet) for _ in range(n))
 
 
-def key(d, s):
-    return f"{d}_{s}"
-
-
 def is_past_locked(d):
     if RESET_WEEK_ON_SUNDAY and today_idx == 6:
         return False
@@ -96,73 +99,26 @@ if "bookmarks" not in st.session_state:
 if "active_resource" not in st.session_state:
     st.session_state.active_resource = None
 
-# load shared store (bookings/availability)
-store = load_data()
-store.setdefault("availability", {})
-for d in range(7):
-    for s in range(len(SLOTS)):
-        if f"{d}_{s}" not in store["availability"]:
-            if RESET_WEEK_ON_SUNDAY and today_idx == 6:
-                store["availability"][f"{d}_{s}"] = True
-            else:
-                store["availability"][f"{d}_{s}"] = False if d < today_idx else True
-save_data(store)
-
-# -----------------------
-# Resources: improved titles + descriptions (from your provided lists)
-# -----------------------
-RESOURCES = [
-    {"id":"v1","title":"Study Tips: Beat Exam Stress","desc":"Short practical techniques to reduce exam anxiety and study more effectively.","tags":["study","stress","exams"],"type":"video","url":"https://youtu.be/Jk4WpJpjq7k?si=1uEEMycG3OLXiA3q"},
-    {"id":"v2","title":"Active Revision Techniques","desc":"Learn active recall and spaced repetition tricks to boost retention.","tags":["study","revision"],"type":"video","url":"https://youtu.be/izJ3yhXPJ60?si=F2hVzpxUH9KTfWlp"},
-    {"id":"v3","title":"Time Management for Students","desc":"How to plan study blocks, breaks and get more done with less stress.","tags":["productivity","planning"],"type":"video","url":"https://youtu.be/APS6t-auzM4?si=pXy-akR5jrefQgpk"},
-    {"id":"v4","title":"Focus & Concentration Exercises","desc":"Short exercises to improve focus during study sessions.","tags":["focus","exercise"],"type":"video","url":"https://youtu.be/zklPS8qlW6c?si=p4Gjfmdh_gNm8TDp"},
-    {"id":"ncert","title":"NCERT Resources","desc":"Official NCERT textbooks and resources (national curriculum materials).","tags":["ncert","textbook"],"type":"link","url":"https://ncert.nic.in/"},
-    {"id":"v5","title":"Short Mindfulness Break (5 min)","desc":"A short guided grounding exercise to calm nerves and re-centre.","tags":["mindfulness","breathing"],"type":"video","url":"https://youtu.be/mdo19qOX-E4?si=LLcpUOqDGbOQsBbv"},
-    {"id":"v6","title":"Guided Breathing for Stress","desc":"Simple breathing practice to reduce acute stress and nervousness.","tags":["breathing","relaxation"],"type":"video","url":"https://youtu.be/Nlz8yKG0ySU?si=d8He7OH82EC7ugvT"},
-    {"id":"v7","title":"Quick Grounding Audio","desc":"A short grounding audio to use between study sessions.","tags":["audio","grounding"],"type":"video","url":"https://youtu.be/eAK14VoY7C0?si=35IjvElVRG-ID0mK"},
-    {"id":"v8","title":"Study Break Movement","desc":"Two-minute movement routine to refresh posture and attention.","tags":["movement","wellbeing"],"type":"video","url":"https://youtu.be/deAIK86Hyxk?si=YBrcNiJP8ahMsvY8"},
-    {"id":"v9","title":"Sleep & Memory Tips","desc":"Short tips to improve sleep quality for better learning and memory.","tags":["sleep","health"],"type":"video","url":"https://youtu.be/bPM-FDTuit8?si=14VV0WiujOV5cul0"},
-    {"id":"v10","title":"7-minute Focus Practice","desc":"A short practice to build concentration and reduce distractibility.","tags":["focus","practice"],"type":"video","url":"https://youtu.be/iyY_LVKfOO0?si=YW8dfJtEwmLMdV1j"},
-    {"id":"v11","title":"Calm Your Mind — Guided Short","desc":"Brief guided exercise to de-escalate anxious thoughts.","tags":["anxiety","calm"],"type":"video","url":"https://youtu.be/hzvT0vy5cjE?si=YeFeCEkoI0LDb2bn"},
-    {"id":"v12","title":"Study Motivation & Habits","desc":"How to form small habits that keep motivation steady over time.","tags":["motivation","habits"],"type":"video","url":"https://youtu.be/N6NlJgSf7r0?si=cuFk13rIaLy3mWY6"},
-    {"id":"v13","title":"Active Note-taking Strategies","desc":"Effective note patterns to make reviewing faster and clearer.","tags":["notes","study"],"type":"video","url":"https://youtu.be/RJHZ01TzY9M?si=NMPskFPf8NT1vHdx"},
-    {"id":"v14","title":"Stress-to-Action: Small Steps","desc":"How to convert stress into small practical steps you can take now.","tags":["stress","action"],"type":"video","url":"https://youtu.be/7NLfpsNHmZI?si=zCBGbc4h9AHg4bX8"},
-    {"id":"gm1","title":"Guided Meditation — Self-Love","desc":"A gentle guided meditation to build self-compassion and calm.","tags":["meditation","self-love"],"type":"video","url":"https://youtu.be/vj0JDwQLof4?si=-3AI1c7f60JKhcSn"},
-    {"id":"gm2","title":"Guided Relaxation — Body Scan","desc":"A short body scan meditation to relieve tension and stress.","tags":["meditation","relaxation"],"type":"video","url":"https://youtu.be/sfSDQRdIvTc?si=JAWlk4la8ZtV0D-K"},
-    {"id":"gm3","title":"Breathing & Grounding Session","desc":"Breath-led grounding practice for quick resets during the day.","tags":["meditation","breathing"],"type":"video","url":"https://youtu.be/uNmKzlh55Fo?si=fPV3KbDffre6ttBn"},
-    {"id":"gm4","title":"Short Guided Calm (video)","desc":"A concise calm practice for pre-sleep or study breaks.","tags":["meditation","calm"],"type":"video","url":"https://youtu.be/C4bofW53sO8?si=yinXXWC4CqahOwDx"},
-    {"id":"gm5","title":"Self-care Meditation (7 min)","desc":"Self-care focused practice to improve mood and perspective.","tags":["meditation","self-care"],"type":"video","url":"https://youtu.be/blbv5UTBCGg?si=W0W6QYtILD6kNMUl"},
-    {"id":"mi1","title":"Mindset: Controlling Thoughts 1","desc":"Techniques for noticing and gently redirecting unhelpful thoughts.","tags":["mindset","thoughts"],"type":"video","url":"https://youtu.be/22wpwgpy7fY?si=ZbUXEGNZeD7p0gl5"},
-    {"id":"mi2","title":"Cognitive Strategies for Focus","desc":"How to shift thinking patterns that distract from study.","tags":["mindset","focus"],"type":"video","url":"https://youtu.be/U_ilabJbPKU?si=IvpT9vNE9G6vEHZA"},
-    {"id":"mi3","title":"Thought Reframing Basics","desc":"Short guide to reframing negative thoughts into neutral steps.","tags":["reframing","cbt"],"type":"video","url":"https://youtu.be/nqxviz_G4Uo?si=KLfVRcmmQxIK_eD8"},
-    {"id":"mi4","title":"Sustaining Attention Techniques","desc":"Practical steps to keep attention from wandering during work.","tags":["attention","techniques"],"type":"video","url":"https://youtu.be/KzW84p4bCzA?si=stKdsbcfW81c9-TF"},
-    {"id":"mi5","title":"Managing Overthinking","desc":"Short methods to interrupt overthinking cycles and ground yourself.","tags":["overthinking","mindset"],"type":"video","url":"https://youtu.be/nnSRJ5PRPWQ?si=W20BQjBabnR80pqX"},
-    {"id":"pod1","title":"Mental Health Podcast — Ep.1","desc":"A thoughtful conversation about coping with stress and study life.","tags":["podcast","mental-health"],"type":"video","url":"https://youtu.be/MFyEwdpC5pM?si=Ts-jLPxH5FvnaaAP"},
-    {"id":"pod2","title":"Mental Health Podcast — Ep.2","desc":"Stories, tips and small steps from mental health practitioners.","tags":["podcast","support"],"type":"video","url":"https://youtu.be/9EqrUK7ghho?si=ydVsJeRZFjsqQVS-"},
-    {"id":"pod3","title":"Mental Health Podcast — Tools","desc":"Practical tools for everyday wellbeing and stress management.","tags":["podcast","tools"],"type":"video","url":"https://youtu.be/Kqya9ql7hM0?si=DKuKPTpQzOO3-ytj"},
-    {"id":"pod4","title":"Mental Health Podcast — Study Life","desc":"Advice for students balancing study and wellbeing.","tags":["podcast","students"],"type":"video","url":"https://youtu.be/YcGXViwXItM?si=mhATIev5NxG-XHlC"},
-    {"id":"pod5","title":"Mental Health Podcast — Self-care","desc":"Episode focused on self-care routines that actually work.","tags":["podcast","self-care"],"type":"video","url":"https://youtu.be/YWBuwJTuWGo?si=FFfthEyOYEa4N8Vs"},
-]
+# seeding, schema migration and past-day locking run once per process / per day
+# in data_store_utils; page renders only read the store
+ensure_store_ready()
 
 # -----------------------
 # Resources hub UI (rendered at bottom of homepage only when requested)
 # -----------------------
+RESOURCES_PER_PAGE = 12  # a multiple of the 3 grid columns
+
+
 def render_resource_card(r):
     """Render a single resource as a card. 'Open / Download' sets active_resource for inline viewer."""
-    st.markdown("<div class='resource-card'>", unsafe_allow_html=True)
-    st.markdown(f"<div class='resource-title'>{r['title']}</div>", unsafe_allow_html=True)
-    desc = r.get("desc", "")
-    if desc:
-        st.markdown(f"<div class='resource-desc'>{desc}</div>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div class='resource-desc'>&nbsp;</div>", unsafe_allow_html=True)
-
-    # tags
-    tag_html = "<div class='resource-tags'>"
-    for t in r["tags"]:
-        tag_html += f"<div class='tag'>{t}</div>"
-    tag_html += "</div>"
-    st.markdown(tag_html, unsafe_allow_html=True)
+    # the whole card body is one markdown element; only the two buttons are widgets
+    tags = "".join(f"<div class='tag'>{escape(t)}</div>" for t in r["tags"])
+    st.markdown(
+        f"<div class='resource-card'><div class='resource-title'>{escape(r['title'])}</div>"
+        f"<div class='resource-desc'>{escape(r.get('desc', '')) or '&nbsp;'}</div>"
+        f"<div class='resource-tags'>{tags}</div></div>",
+        unsafe_allow_html=True,
+    )
 
     # action row
     col1, col2 = st.columns([3, 1])
@@ -181,8 +137,6 @@ def render_resource_card(r):
                 st.session_state.bookmarks.add(r["id"])
                 st.success("Saved to bookmarks")
 
-    st.markdown("</div>", unsafe_allow_html=True)
-
 
 # -----------------------
 # Fullscreen chat (unchanged)
@@ -203,11 +157,101 @@ if st.session_state.show_chat:
     """,
         height=900,
     )
+    run_timing.run_finished("mental.py full run", _run_started)
     st.stop()
 
 # -----------------------
-# Fullscreen booking (unchanged)
+# Fullscreen booking
 # -----------------------
+# how often an open booking view checks for slots taken elsewhere; a check that
+# finds nothing new reads no store data (see data_store_utils.change_version)
+BOOKING_REFRESH_SECONDS = float(os.environ.get("BOOKING_REFRESH_SECONDS", "3"))
+
+
+@st.fragment(run_every=BOOKING_REFRESH_SECONDS)
+@run_timing.timed("booking fragment")
+def booking_view():
+    """Grid, booking and token lookup. A click in here reruns only this function,
+    not the page setup and logo above it; so do the periodic refresh checks."""
+    seen = change_version("availability")
+    if st.session_state.get("grid_seen") != seen:
+        st.session_state.grid = load_data(parts=("availability",))["availability"]
+        st.session_state.grid_seen = seen
+    grid = st.session_state.grid
+
+    if st.session_state.get("last_booking"):
+        b_day, b_slot, b_token = st.session_state.pop("last_booking")
+        st.success(f"Booked {b_day} — {b_slot}. Your token: {b_token}")
+
+    nxt = grid.next_free(today_idx, 0, exclude_slots=[LUNCH_SLOT_INDEX])
+    if nxt:
+        st.caption(f"Next available slot: {DAYS[nxt[0]]} — {SLOTS[nxt[1]]}")
+
+    # the whole week is one component element; it reports back the cell that was clicked
+    def cell_state(d_idx, s_idx):
+        if s_idx == LUNCH_SLOT_INDEX:
+            return LUNCH
+        if is_past_locked(d_idx):
+            return LOCKED
+        return AVAILABLE if grid.is_free(d_idx, s_idx) else BOOKED
+
+    click = booking_grid(
+        DAYS, SLOTS, encode_cells(len(DAYS), len(SLOTS), cell_state),
+        labels={AVAILABLE: "Book", BOOKED: "Booked / Unavailable", LUNCH: "Lunch", LOCKED: "Locked"},
+        actions={AVAILABLE: "book", BOOKED: "cancel"},
+        key="student_booking_grid", cell_height=56,
+    )
+    if click:
+        d_idx, s_idx = click["day"], click["slot"]
+        day, slot_label = DAYS[d_idx], SLOTS[s_idx]
+        if is_past_locked(d_idx):
+            st.warning("This day's slots are locked (past day). Booking not allowed.")
+        elif click["action"] == "book":
+            token = make_token(8)
+            timestamp_iso = datetime.now().isoformat()
+            if reserve_slot(d_idx, s_idx, token, timestamp_iso):
+                # shown after the rerun, which would otherwise wipe it
+                st.session_state.last_booking = (day, slot_label, token)
+                st.session_state.grid_seen = None  # our own write: reload without waiting for the watcher
+                st.rerun(scope="fragment")
+            else:
+                st.session_state.grid_seen = None
+                st.warning("Sorry — this slot was just taken. Please pick another one.")
+        elif click["action"] == "cancel":
+            if cancel_slot(d_idx, s_idx):
+                st.info(f"Cancelled booking for {day} — {slot_label}")
+            else:
+                st.info(f"{day} — {slot_label} had no booking left to cancel; it is open again.")
+            st.session_state.grid_seen = None
+            st.rerun(scope="fragment")
+
+    st.markdown("---")
+    st.markdown("#### Verify or cancel your booking")
+    lookup = st.text_input("Booking token", key="verify_token", placeholder="e.g. aB3dE9xQ").strip()
+    if lookup:
+        # looked up again only when the token or the bookings changed, not on every refresh
+        lookup_key = (lookup, change_version("bookings"))
+        if st.session_state.get("lookup_key") != lookup_key:
+            st.session_state.lookup_found = find_booking(lookup)
+            st.session_state.lookup_key = lookup_key
+        found = st.session_state.lookup_found
+        if not found:
+            st.warning("No booking found for that token.")
+        elif found.get("week"):
+            st.info(f"Booking for {DAYS[found['day']]} — {SLOTS[found['slot']]} in week {found['week']} "
+                    f"(booked {found.get('time') or '-'}). That week has closed.")
+        else:
+            st.success(f"Booking confirmed: {DAYS[found['day']]} — {SLOTS[found['slot']]} (booked {found.get('time') or '-'})")
+            if is_past_locked(found["day"]):
+                st.caption("This day has passed — the booking can no longer be changed.")
+            elif st.button("Cancel this booking", key="cancel_by_token"):
+                cancel_booking(lookup)
+                st.info(f"Cancelled booking for {DAYS[found['day']]} — {SLOTS[found['slot']]}")
+                st.session_state.grid_seen = st.session_state.lookup_key = None
+                st.rerun(scope="fragment")
+    st.caption("Note: booking token is the only identifier. Keep it to manage or verify your booking.")
+
+
 if st.session_state.show_booking:
     cols = st.columns([8, 1])
     with cols[0]:
@@ -225,90 +269,32 @@ if st.session_state.show_booking:
     )
     st.markdown("---")
 
-    # header
-    header_cols = st.columns([1.1] + [1 for _ in SLOTS])
-    header_cols[0].markdown("<strong>Day / Time</strong>", unsafe_allow_html=True)
-    for i, s in enumerate(SLOTS):
-        header_cols[i + 1].markdown(
-            f"<div style='text-align:center;font-weight:700;color:#cfe8ff'>{s}</div>", unsafe_allow_html=True
-        )
-
-    for d_idx, day in enumerate(DAYS):
-        row_cols = st.columns([1.1] + [1 for _ in SLOTS])
-        row_cols[0].markdown(f"<div class='day-label'>{day}</div>", unsafe_allow_html=True)
-        for s_idx, slot_label in enumerate(SLOTS):
-            locked = is_past_locked(d_idx)
-            is_lunch = s_idx == LUNCH_SLOT_INDEX
-            avail = store["availability"].get(key(d_idx, s_idx), True)
-
-            if locked:
-                avail = False
-                store["availability"][key(d_idx, s_idx)] = False
-
-            if is_lunch:
-                row_cols[s_idx + 1].markdown("<div class='slot-box slot-lunch'>Lunch</div>", unsafe_allow_html=True)
-            else:
-                if avail:
-                    row_cols[s_idx + 1].markdown("<div class='slot-box slot-available'>Available</div>", unsafe_allow_html=True)
-                    btn_key = f"book_{d_idx}_{s_idx}"
-                    if row_cols[s_idx+1].button("Book", key=btn_key):
-                        if locked:
-                            st.warning("This day's slots are locked (past day). Booking not allowed.")
-                        else:
-                            token = make_token(8)
-                            timestamp_iso = datetime.now().isoformat()
-                            store["availability"][key(d_idx, s_idx)] = False
-                            store.setdefault("bookings", []).append(
-                                {"day": d_idx, "slot": s_idx, "token": token, "time": timestamp_iso}
-                            )
-                            save_data(store)
-                            st.success(f"Booked {day} — {slot_label}. Your token: {token}")
-                            st.rerun()
-                else:
-                    row_cols[s_idx + 1].markdown("<div class='slot-box slot-unavailable'>Booked / Unavailable</div>", unsafe_allow_html=True)
-                    btn_key = f"cancel_{d_idx}_{s_idx}"
-                    if row_cols[s_idx+1].button("Cancel", key=btn_key):
-                        if locked:
-                            st.warning("Cannot change past-day slots — locked until weekly reset.")
-                        else:
-                            store["availability"][key(d_idx, s_idx)] = True
-                            for i, b in enumerate(store.get("bookings", [])):
-                                if b["day"] == d_idx and b["slot"] == s_idx:
-                                    store["bookings"].pop(i)
-                                    break
-                            save_data(store)
-                            st.info(f"Cancelled booking for {day} — {slot_label}")
-                            st.rerun()
-
-    save_data(store)
-    st.markdown("---")
-    st.caption("Note: booking token is the only identifier. Keep it to manage or verify your booking.")
+    booking_view()
+    run_timing.run_finished("mental.py full run", _run_started)
     st.stop()
 
 # -----------------------
 # Homepage (with Resources Hub trigger)
 # -----------------------
 # Display logo (left) + title (right) — no upload option, uses local paths fallback
-LOGO_CANDIDATES = [
+LOGO_CANDIDATES = (
     r"healnest.png",
     "logo.png",
     "logo.jpg",
-]
+)
 
-logo_path = None
-for p in LOGO_CANDIDATES:
-    try:
-        if os.path.exists(p):
-            logo_path = p
-            break
-    except Exception:
-        continue
+logo_path = logo_assets.find_logo(LOGO_CANDIDATES)  # probed once per process
 
 if logo_path:
     c1, c2 = st.columns([1, 8])
     with c1:
         try:
-            st.image(logo_path, width=140)
+            # pre-sized static variants; the image itself comes from the browser cache
+            logo = logo_assets.logo_html(logo_path, 140)
+            if logo:
+                st.markdown(logo, unsafe_allow_html=True)
+            else:
+                st.image(logo_assets.logo_bytes(logo_path), width=140)
         except Exception:
             pass
     with c2:
@@ -348,49 +334,60 @@ st.markdown('---')
 # -----------------------
 # Resources Hub (rendered at bottom of homepage only when requested)
 # -----------------------
-if st.session_state.show_resources:
+@st.fragment
+@run_timing.timed("resources fragment")
+def resources_hub():
+    """Search, results, viewer and bookmarks; their widgets rerun only this function."""
     st.subheader("Resources Hub — curated materials for students")
     st.markdown("Search, filter, and save resources to your bookmarks. Everything is anonymous.")
 
     # search + filters row
     q_col, tag_col, view_col = st.columns([5, 3, 2])
     query = q_col.text_input("Search resources", placeholder="Search titles, descriptions, tags...")
-    tag_options = sorted({t for r in RESOURCES for t in r["tags"]})
-    selected_tags = tag_col.multiselect("Filter tags", tag_options)
+    catalog = get_catalog()
+    selected_tags = tag_col.multiselect("Filter tags", catalog.tags)
     view_choice = view_col.radio("View", ["All", "Bookmarked"], index=0)
 
-    # build filtered list
-    def matches(r):
-        if view_choice == "Bookmarked" and r["id"] not in st.session_state.bookmarks:
-            return False
-        if selected_tags and not set(selected_tags).issubset(set(r["tags"])):
-            return False
-        if query:
-            q = query.lower()
-            if q not in r["title"].lower() and q not in r["desc"].lower() and not any(q in t for t in r["tags"]):
-                return False
-        return True
-
-    filtered = [r for r in RESOURCES if matches(r)]
-
-    st.markdown(f"**{len(filtered)}** resource(s) — showing { 'bookmarked' if view_choice=='Bookmarked' else 'all' } results")
-    st.markdown("---")
+    # ranked search; tag and bookmark filters are bitset intersections inside the index
+    bookmarked = st.session_state.bookmarks if view_choice == "Bookmarked" else None
+    # only the visible page is searched for and built; new filters start at page 1
+    filters = (query, tuple(selected_tags), view_choice)
+    if st.session_state.get("resource_filters") != filters:
+        st.session_state.resource_filters = filters
+        st.session_state.resource_page = 0
+    start = st.session_state.resource_page * RESOURCES_PER_PAGE
+    hits = catalog.search(query, selected_tags, ids=bookmarked, limit=start + RESOURCES_PER_PAGE + 1)
+    if start and len(hits) <= start:
+        # removed bookmarks (or a shrunken catalogue) emptied this page: go to the last one with results
+        st.session_state.resource_page = max(0, (len(hits) - 1) // RESOURCES_PER_PAGE)
+        start = st.session_state.resource_page * RESOURCES_PER_PAGE
+    page = hits[start:start + RESOURCES_PER_PAGE]
+    has_more = len(hits) > start + RESOURCES_PER_PAGE
 
     # render grid
-    if not filtered:
+    if not page:
         st.info("No resources match your search/filters.")
     else:
+        st.markdown(f"Showing **{start + 1}–{start + len(page)}** — { 'bookmarked' if view_choice=='Bookmarked' else 'all' } results")
+        st.markdown("---")
         cols = st.columns(3)
-        for i, r in enumerate(filtered):
+        for i, r in enumerate(page):
             with cols[i % 3]:
                 render_resource_card(r)
+        prev_col, _, next_col = st.columns([1, 4, 1])
+        if start > 0 and prev_col.button("← Previous", key="res_prev"):
+            st.session_state.resource_page -= 1
+            st.rerun(scope="fragment")
+        if has_more and next_col.button("Next →", key="res_next"):
+            st.session_state.resource_page += 1
+            st.rerun(scope="fragment")
 
     st.markdown("---")
 
     # Inline viewer for active resource
     if st.session_state.active_resource:
         ar_id = st.session_state.active_resource
-        ar = next((x for x in RESOURCES if x["id"] == ar_id), None)
+        ar = catalog.get(ar_id)
         if ar:
             st.markdown("### Opened resource")
             st.markdown(f"**{ar['title']}**")
@@ -413,7 +410,7 @@ if st.session_state.show_resources:
     else:
         # show bookmarked items
         for rid in list(st.session_state.bookmarks):
-            r = next((x for x in RESOURCES if x["id"] == rid), None)
+            r = catalog.get(rid)
             if r:
                 with st.expander(r["title"]):
                     st.write(r["desc"])
@@ -428,6 +425,10 @@ if st.session_state.show_resources:
         st.session_state.active_resource = None
         st.rerun()
 
+
+if st.session_state.show_resources:
+    resources_hub()
+
 # -----------------------
 # Footer / Contact (unchanged)
 # -----------------------
@@ -444,3 +445,4 @@ with col2:
 st.markdown('---')
 st.caption("If you or someone is in immediate danger, contact local emergency services immediately.")
 
+run_timing.run_finished("mental.py full run", _run_started)
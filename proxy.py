@@ -1,12 +1,35 @@
 #!/usr/bin/env python3
-import os, time, requests
-from flask import Flask, request, Response, stream_with_context
+import os, re, time, requests
+from flask import Flask, request, Response, jsonify, stream_with_context
 
-app = Flask(__name__)
+import proxy_cache
+
+app = Flask(__name__, static_folder=None)  # /static/ is Streamlit's, not ours
 
 MAIN = os.environ.get("MAIN_TARGET", "http://127.0.0.1:8601")
 ADMIN = os.environ.get("ADMIN_TARGET", "http://127.0.0.1:8602")
 PORT = int(os.environ.get("PORT", 8501))
+# "async": serve with proxy_async.py (asyncio, WebSocket tunnelling, pooled upstreams) instead of Flask
+PROXY_MODE = os.environ.get("PROXY_MODE", "flask").lower()
+# content-hashed static files (logo_assets.py): safe to cache for a year
+IMMUTABLE_STATIC = re.compile(r"^/app/static/[^/]+\.[0-9a-f]{8}\.\w+$")
+# cacheable GET responses (Streamlit's JS/CSS bundles, media, logo variants); see proxy_cache.py
+CACHE = proxy_cache.ResponseCache()
+
+
+def _from_cache(entry, req_headers, kind, target_url):
+    """Answer from a cache entry: 304 if the browser already has it, else the stored body."""
+    status, headers, body = CACHE.answer(entry, req_headers, kind)
+    print(f"[proxy] cache {kind} -> {target_url} status={status} bytes={len(body)}")
+    return Response(body, status=status, headers=headers)
+
+
+def _stream(resp, collector):
+    """Relay the upstream body, handing each chunk to the cache collector on the way."""
+    for chunk in resp.iter_content(chunk_size=8192):
+        collector.feed(chunk)
+        yield chunk
+    collector.finish()
 
 def _forward_and_log(target_base, strip_prefix=None):
     # Build forward path
@@ -26,9 +49,18 @@ def _forward_and_log(target_base, strip_prefix=None):
     # copy headers (exclude hop-by-hop + host)
     headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host","connection","content-length","transfer-encoding")}
 
+    cacheable = (CACHE.enabled and request.method == "GET"
+                 and not any(k.lower() == "authorization" for k in headers))
+    upstream_headers, entry = headers, None
+    if cacheable:
+        # fresh: answered here; stale: upstream is asked whether our copy still holds
+        key, entry, fresh, upstream_headers = CACHE.consult(target_url, headers)
+        if fresh:
+            return _from_cache(entry, headers, "hit", target_url)
+
     start = time.time()
     try:
-        resp = requests.request(method=request.method, url=target_url, headers=headers,
+        resp = requests.request(method=request.method, url=target_url, headers=upstream_headers,
                                 data=request.get_data(), stream=True, timeout=30)
     except Exception as e:
         dur = time.time() - start
@@ -37,12 +69,26 @@ def _forward_and_log(target_base, strip_prefix=None):
 
     dur = time.time() - start
     print(f"[proxy] forward -> {target_url} method={request.method} status={resp.status_code} dur={dur:.2f}s remote={target_base}")
+    if cacheable and entry is not None and resp.status_code == 304:
+        resp.close()
+        entry = CACHE.revalidated(key, entry, list(resp.headers.items()))
+        return _from_cache(entry, headers, "revalidated", target_url)
 
     # filter response headers and stream back
     excluded_resp = {"content-encoding", "content-length", "transfer-encoding", "connection"}
     resp_headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in excluded_resp]
+    if resp.status_code == 200 and IMMUTABLE_STATIC.match(forward_path):
+        resp_headers = [(k, v) for k, v in resp_headers if k.lower() != "cache-control"]
+        resp_headers.append(("Cache-Control", "public, max-age=31536000, immutable"))
+    resp_headers = proxy_cache.no_store_downloads(resp_headers)
+
+    collector = CACHE.collector(target_url, resp.status_code, resp_headers, headers, cacheable)
+    return Response(stream_with_context(_stream(resp, collector)), status=resp.status_code, headers=resp_headers)
 
-    return Response(stream_with_context(resp.iter_content(chunk_size=8192)), status=resp.status_code, headers=resp_headers)
+
+@app.route("/_proxy/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(CACHE.stats())
 
 
 @app.route("/admin", defaults={"path": ""}, methods=["GET","POST","PUT","DELETE","PATCH","OPTIONS"])
@@ -58,4 +104,8 @@ def proxy_main(path):
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=PORT)
+    if PROXY_MODE == "async":
+        import proxy_async
+        proxy_async.main()
+    else:
+        app.run(host="0.0.0.0", port=PORT)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# proxy_async.py — asyncio mode of proxy.py: WebSocket tunnelling, pooled upstream connections
+#
+#   python proxy_async.py                      (or PROXY_MODE=async python proxy.py)
+#   gunicorn proxy_async:make_app --worker-class aiohttp.GunicornWebWorker --workers 2
+#
+# Routing is proxy.py's: /admin and /admin/... go to ADMIN_TARGET with the prefix
+# stripped, everything else to MAIN_TARGET. Unlike the Flask mode, which holds a
+# worker thread and a fresh upstream connection for each streamed response, one
+# event loop per worker serves any number of concurrent requests and streams:
+#   - each upstream has one aiohttp session whose connector keeps up to
+#     UPSTREAM_POOL_SIZE keep-alive connections open and reuses them,
+#   - WebSocket upgrades (Streamlit's /_stcore/stream, without which neither app
+#     works behind the proxy) are tunnelled frame by frame in both directions,
+#   - the proxy_cache response cache and the immutable rule for hashed static
+#     files apply as in proxy.py, downloads are never stored (GET /_proxy/cache
+#     reports the counters).
+import asyncio
+import os
+import time
+from typing import Dict, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, WSMsgType, web
+from multidict import CIMultiDict
+
+from proxy import ADMIN, CACHE, IMMUTABLE_STATIC, MAIN, PORT
+from proxy_cache import no_store_downloads
+
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", "100"))   # connections per upstream
+UPSTREAM_KEEPALIVE = float(os.environ.get("UPSTREAM_KEEPALIVE", "30"))  # idle seconds before closing one
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "30"))      # connect / between reads
+CHUNK = 64 * 1024
+
+HOP_BY_HOP = {"host", "connection", "keep-alive", "proxy-connection", "content-length", "transfer-encoding",
+              "te", "trailer", "upgrade"}
+WS_HANDSHAKE = {"sec-websocket-key", "sec-websocket-version", "sec-websocket-extensions",
+                "sec-websocket-protocol", "sec-websocket-accept"}
+EXCLUDED_RESP = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+SESSIONS = web.AppKey("sessions", Dict[str, ClientSession])
+
+
+def _route(path: str) -> Tuple[str, str]:
+    """(upstream base, path to forward), as proxy.py's two route pairs."""
+    if path == "/admin" or path.startswith("/admin/"):
+        return ADMIN, path[len("/admin"):] or "/"
+    return MAIN, path
+
+
+def _session() -> ClientSession:
+    connector = TCPConnector(limit=UPSTREAM_POOL_SIZE, limit_per_host=UPSTREAM_POOL_SIZE,
+                             keepalive_timeout=UPSTREAM_KEEPALIVE)
+    return ClientSession(connector=connector, auto_decompress=True,
+                         timeout=ClientTimeout(total=None, connect=UPSTREAM_TIMEOUT, sock_read=UPSTREAM_TIMEOUT))
+
+
+async def _sessions(app: web.Application):
+    app[SESSIONS] = {base: _session() for base in {MAIN, ADMIN}}
+    yield
+    for session in app[SESSIONS].values():
+        await session.close()
+
+
+# ---------- HTTP ----------
+def _cached(entry, req_headers: Dict[str, str], kind: str, target_url: str) -> web.Response:
+    status, headers, body = CACHE.answer(entry, req_headers, kind)
+    print(f"[proxy_async] cache {kind} -> {target_url} status={status} bytes={len(body)}")
+    return web.Response(body=body, status=status, headers=CIMultiDict(headers))
+
+
+async def handle(request: web.Request) -> web.StreamResponse:
+    base, forward_path = _route(request.path)
+    query = f"?{request.query_string}" if request.query_string else ""
+    target_url = base.rstrip("/") + forward_path + query
+    session = request.app[SESSIONS][base]
+    if request.headers.get("Upgrade", "").lower() == "websocket":
+        return await _tunnel(request, session, target_url)
+
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+    cacheable = CACHE.enabled and request.method == "GET" and "Authorization" not in request.headers
+    upstream_headers, entry = headers, None
+    if cacheable:
+        key, entry, fresh, upstream_headers = CACHE.consult(target_url, headers)
+        if fresh:
+            return _cached(entry, headers, "hit", target_url)
+    body = None
+    if request.body_exists:
+        body = request.content  # streamed through, never buffered
+        if request.content_length is not None:
+            upstream_headers = dict(upstream_headers, **{"Content-Length": str(request.content_length)})
+
+    start = time.perf_counter()
+    try:
+        resp = await session.request(request.method, target_url, headers=upstream_headers, data=body,
+                                     allow_redirects=False)
+    except Exception as e:
+        print(f"[proxy_async] ERROR forward -> {target_url} method={request.method} "
+              f"dur={time.perf_counter() - start:.2f}s exc={e}")
+        return web.Response(status=502, text=f"Upstream request failed: {e}")
+    try:
+        print(f"[proxy_async] forward -> {target_url} method={request.method} status={resp.status} "
+              f"dur={time.perf_counter() - start:.2f}s remote={base}")
+        if entry is not None and resp.status == 304:
+            entry = CACHE.revalidated(key, entry, list(resp.headers.items()))
+            return _cached(entry, headers, "revalidated", target_url)
+        resp_headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in EXCLUDED_RESP]
+        if resp.status == 200 and IMMUTABLE_STATIC.match(forward_path):
+            resp_headers = [(k, v) for k, v in resp_headers if k.lower() != "cache-control"]
+            resp_headers.append(("Cache-Control", "public, max-age=31536000, immutable"))
+        resp_headers = no_store_downloads(resp_headers)
+
+        out = web.StreamResponse(status=resp.status, reason=resp.reason, headers=CIMultiDict(resp_headers))
+        await out.prepare(request)
+        collector = CACHE.collector(target_url, resp.status, resp_headers, headers, cacheable)
+        async for chunk in resp.content.iter_chunked(CHUNK):
+            collector.feed(chunk)
+            await out.write(chunk)
+        collector.finish()
+        await out.write_eof()
+        return out
+    finally:
+        resp.release()  # back to the pool
+
+
+# ---------- WebSocket ----------
+async def _pump(src, dst) -> None:
+    async for msg in src:
+        if msg.type == WSMsgType.TEXT:
+            await dst.send_str(msg.data)
+        elif msg.type == WSMsgType.BINARY:
+            await dst.send_bytes(msg.data)
+        else:  # ERROR; CLOSE ends the iteration by itself
+            break
+
+
+async def _tunnel(request: web.Request, session: ClientSession, target_url: str) -> web.StreamResponse:
+    """Open the upstream socket first, then accept the browser's with the subprotocol
+    upstream chose (Streamlit's "streamlit"), and relay frames until either side closes."""
+    ws_url = "ws" + target_url[len("http"):]
+    headers = {k: v for k, v in request.headers.items()
+               if k.lower() not in HOP_BY_HOP and k.lower() not in WS_HANDSHAKE}
+    protocols = [p.strip() for p in request.headers.get("Sec-WebSocket-Protocol", "").split(",") if p.strip()]
+    try:
+        upstream = await session.ws_connect(ws_url, headers=headers, protocols=protocols, max_msg_size=0)
+    except Exception as e:
+        print(f"[proxy_async] ERROR websocket -> {ws_url} exc={e}")
+        return web.Response(status=502, text=f"Upstream websocket failed: {e}")
+    client = web.WebSocketResponse(protocols=[upstream.protocol] if upstream.protocol else (), max_msg_size=0)
+    await client.prepare(request)
+    print(f"[proxy_async] websocket open -> {ws_url}")
+    start = time.perf_counter()
+    pumps = [asyncio.ensure_future(_pump(client, upstream)), asyncio.ensure_future(_pump(upstream, client))]
+    try:
+        await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for p in pumps:
+            p.cancel()
+        await upstream.close()
+        await client.close()
+    print(f"[proxy_async] websocket closed -> {ws_url} dur={time.perf_counter() - start:.1f}s")
+    return client
+
+
+# ---------- App ----------
+async def cache_stats(request: web.Request) -> web.Response:
+    return web.json_response(CACHE.stats())
+
+
+async def make_app() -> web.Application:
+    app = web.Application()
+    app.cleanup_ctx.append(_sessions)
+    app.router.add_get("/_proxy/cache", cache_stats)
+    app.router.add_route("*", "/{tail:.*}", handle)
+    return app
+
+
+def main() -> None:
+    print(f"[proxy_async] Listening on {PORT}: / -> {MAIN}, /admin -> {ADMIN}")
+    web.run_app(make_app(), host="0.0.0.0", port=PORT, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# proxy_cache.py — bounded LRU cache of upstream GET responses for proxy.py
+#
+#   PROXY_CACHE_BYTES=67108864       memory budget (0 disables the cache)
+#   PROXY_CACHE_MAX_ENTRY=8388608    larger responses are streamed through, never stored
+#   PROXY_CACHE_DIR=/tmp/proxy-cache optional second tier on disk, PROXY_CACHE_DISK_BYTES big
+#
+# A response is stored when it is a 200 to a GET without Authorization, and
+# Cache-Control allows a shared cache to keep it (not no-store / private, no
+# Set-Cookie, no Vary: *, not a download). It is served without asking upstream while fresh
+# (s-maxage / max-age / Expires, "immutable" for a year via proxy.py); once
+# stale, or under no-cache, it is revalidated with its ETag / Last-Modified,
+# and a 304 from upstream costs a few hundred bytes instead of the body.
+# Conditional requests from browsers (If-None-Match / If-Modified-Since) are
+# answered with 304 here when the cached entry matches. Downloads (Content-Disposition:
+# attachment, e.g. Admin exports) are per-session data: no_store_downloads() marks them
+# "private, no-store" so neither this cache, its disk tier nor the browser keeps them.
+#
+# stats() counts hits, misses, revalidations and local 304s, and the body bytes
+# upstream did not have to send (bytes_saved) versus those it did send.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+CACHE_BYTES = int(os.environ.get("PROXY_CACHE_BYTES", str(64 * 1024 * 1024)))
+MAX_ENTRY_BYTES = int(os.environ.get("PROXY_CACHE_MAX_ENTRY", str(8 * 1024 * 1024)))
+CACHE_DIR = os.environ.get("PROXY_CACHE_DIR", "")
+DISK_BYTES = int(os.environ.get("PROXY_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+CONDITIONAL = ("if-none-match", "if-modified-since")
+
+Headers = List[Tuple[str, str]]
+
+
+# ---------- Header parsing ----------
+def cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """'public, max-age=60' -> {"public": None, "max-age": "60"}"""
+    out: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            out[name.lower()] = arg.strip().strip('"') or None
+    return out
+
+
+def _header(headers: Headers, name: str) -> Optional[str]:
+    name = name.lower()
+    return next((v for k, v in headers if k.lower() == name), None)
+
+
+def _seconds(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(0, int(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _http_time(value: Optional[str]) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_download(headers: Headers) -> bool:
+    return (_header(headers, "Content-Disposition") or "").strip().lower().startswith("attachment")
+
+
+def no_store_downloads(headers: Headers) -> Headers:
+    """`headers` with Cache-Control replaced by "private, no-store" if the response is a download."""
+    if not is_download(headers):
+        return headers
+    return [(k, v) for k, v in headers if k.lower() != "cache-control"] + [("Cache-Control", "private, no-store")]
+
+
+def freshness(headers: Headers, now: Optional[float] = None) -> Optional[int]:
+    """Seconds a response may be served without revalidation; None if it must not be stored."""
+    cc = cache_control(_header(headers, "Cache-Control"))
+    if "no-store" in cc or "private" in cc or _header(headers, "Set-Cookie") is not None:
+        return None
+    if is_download(headers):
+        return None
+    if (_header(headers, "Vary") or "").strip() == "*":
+        return None
+    if "no-cache" in cc:
+        return 0
+    for directive in ("s-maxage", "max-age"):
+        if directive in cc:
+            return _seconds(cc[directive]) or 0
+    expires = _http_time(_header(headers, "Expires"))
+    if expires is not None:
+        return max(0, int(expires - (now or time.time())))
+    # no explicit lifetime: keep it only if it can be revalidated cheaply
+    if _header(headers, "ETag") or _header(headers, "Last-Modified"):
+        return 0
+    return None
+
+
+def vary_key(headers: Headers, request_headers: Dict[str, str]) -> str:
+    """The request header values the response varies on (bodies are stored decoded,
+    so Accept-Encoding never splits an entry)."""
+    names = [n.strip().lower() for n in (_header(headers, "Vary") or "").split(",") if n.strip()]
+    lowered = {k.lower(): v for k, v in request_headers.items()}
+    return "|".join(f"{n}={lowered.get(n, '')}" for n in sorted(names) if n != "accept-encoding")
+
+
+# ---------- Entries ----------
+class Entry:
+    __slots__ = ("status", "headers", "body", "stored_at", "max_age", "vary")
+
+    def __init__(self, status: int, headers: Headers, body: bytes, max_age: int, vary: str = "",
+                 stored_at: Optional[float] = None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.max_age = max_age
+        self.vary = vary
+        self.stored_at = stored_at if stored_at is not None else time.time()
+
+    @property
+    def etag(self) -> Optional[str]:
+        return _header(self.headers, "ETag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return _header(self.headers, "Last-Modified")
+
+    def age(self, now: Optional[float] = None) -> int:
+        return max(0, int((now or time.time()) - self.stored_at))
+
+    def fresh(self, now: Optional[float] = None) -> bool:
+        return self.age(now) < self.max_age
+
+    def matches(self, request_headers: Dict[str, str]) -> bool:
+        """True if the browser's conditional request is satisfied by this entry (answer 304)."""
+        lowered = {k.lower(): v for k, v in request_headers.items()}
+        inm = lowered.get("if-none-match")
+        if inm is not None:
+            etag = self.etag
+            if etag is None:
+                return False
+            wanted = {t.strip().removeprefix("W/") for t in inm.split(",")}
+            return "*" in wanted or etag.removeprefix("W/") in wanted
+        ims = _http_time(lowered.get("if-modified-since"))
+        lm = _http_time(self.last_modified)
+        return ims is not None and lm is not None and lm <= ims
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for revalidating this entry upstream."""
+        out = {}
+        if self.etag:
+            out["If-None-Match"] = self.etag
+        if self.last_modified:
+            out["If-Modified-Since"] = self.last_modified
+        return out
+
+    def refreshed(self, headers: Headers) -> "Entry":
+        """This entry after upstream answered 304 with `headers`."""
+        merged = dict((k.lower(), (k, v)) for k, v in self.headers)
+        for k, v in headers:
+            if k.lower() in ("cache-control", "expires", "etag", "last-modified", "date"):
+                merged[k.lower()] = (k, v)
+        new_headers = list(merged.values())
+        return Entry(self.status, new_headers, self.body, freshness(new_headers) or 0, self.vary)
+
+    def response_headers(self, now: Optional[float] = None) -> Headers:
+        return [(k, v) for k, v in self.headers if k.lower() != "age"] + [("Age", str(self.age(now)))]
+
+    def not_modified_headers(self, now: Optional[float] = None) -> Headers:
+        keep = ("cache-control", "etag", "expires", "last-modified", "vary", "date")
+        return [(k, v) for k, v in self.headers if k.lower() in keep] + [("Age", str(self.age(now)))]
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+
+# ---------- Cache ----------
+class Collector:
+    """Counts a streamed upstream body and keeps a copy for the cache, given up
+    once it outgrows max_entry. The entry is stored by finish(), after the last chunk."""
+
+    def __init__(self, cache: "ResponseCache", url: str, status: int, headers: Headers,
+                 request_headers: Dict[str, str], cacheable: bool = True):
+        self.cache = cache
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.request_headers = request_headers
+        keep = cacheable and cache.enabled and status == 200 and freshness(headers) is not None
+        self.chunks: Optional[List[bytes]] = [] if keep else None
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.cache.count("bytes_from_upstream", len(chunk))
+        if self.chunks is None:
+            return
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size > self.cache.max_entry:
+            self.chunks = None
+
+    def finish(self) -> None:
+        if self.chunks is not None:
+            self.cache.store(self.url, self.status, self.headers, b"".join(self.chunks), self.request_headers)
+            self.chunks = None
+
+
+class ResponseCache:
+    """LRU over Entry objects, bounded by total bytes; optionally backed by files in `directory`."""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES, max_entry: int = MAX_ENTRY_BYTES,
+                 directory: str = CACHE_DIR, disk_bytes: int = DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry = min(max_entry, max_bytes)
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._vary: Dict[str, str] = {}            # url key -> vary header names seen for it
+        self._bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "not_modified": 0, "stored": 0,
+                         "evicted": 0, "disk_hits": 0, "bytes_saved": 0, "bytes_from_upstream": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    # ---- lookup ----
+    def key(self, url: str, headers: Headers, request_headers: Dict[str, str]) -> str:
+        return url + "#" + vary_key(headers, request_headers)
+
+    def lookup(self, url: str, request_headers: Dict[str, str]) -> Tuple[str, Optional[Entry]]:
+        """(key, entry or None) for a request; the key accounts for the entry's Vary headers."""
+        with self._lock:
+            vary = self._vary.get(url)
+        key = self.key(url, [("Vary", vary)] if vary else [], request_headers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return key, entry
+        entry = self._disk_get(key)
+        if entry is not None:
+            self.count("disk_hits")
+            self._put_memory(key, entry)
+        return key, entry
+
+    # ---- store ----
+    def store(self, url: str, status: int, headers: Headers, body: bytes,
+              request_headers: Dict[str, str]) -> Optional[Entry]:
+        if not self.enabled or status != 200 or len(body) > self.max_entry:
+            return None
+        max_age = freshness(headers)
+        if max_age is None:
+            return None
+        vary = _header(headers, "Vary")
+        entry = Entry(status, headers, body, max_age, vary or "")
+        key = self.key(url, headers, request_headers)
+        with self._lock:
+            if vary:
+                self._vary[url] = vary
+            else:
+                self._vary.pop(url, None)
+            self.counters["stored"] += 1
+        self._put_memory(key, entry)
+        self._disk_put(key, entry)
+        return entry
+
+    def replace(self, key: str, entry: Entry) -> None:
+        self._put_memory(key, entry)
+        self._disk_put(key, entry)
+
+    # ---- request flow (shared by proxy.py and proxy_async.py) ----
+    def consult(self, url: str, request_headers: Dict[str, str]) -> Tuple[str, Optional[Entry], bool, Dict[str, str]]:
+        """(key, entry, fresh, upstream headers) for a GET. Serve `entry` with answer() if
+        `fresh`; otherwise send the upstream headers, which carry the entry's validators
+        when there is an entry to revalidate (entry is None when there is not)."""
+        key, entry = self.lookup(url, request_headers)
+        directives = " ".join(v for k, v in request_headers.items() if k.lower() in ("cache-control", "pragma"))
+        if entry is not None and entry.fresh() and "no-cache" not in directives:  # no-cache: a hard reload
+            return key, entry, True, request_headers
+        if entry is not None and entry.validators():
+            upstream = {k: v for k, v in request_headers.items() if k.lower() not in CONDITIONAL}
+            upstream.update(entry.validators())
+            return key, entry, False, upstream
+        return key, None, False, request_headers
+
+    def revalidated(self, key: str, entry: Entry, headers: Headers) -> Entry:
+        """Upstream answered 304 to our validators: keep the body, take the new headers."""
+        entry = entry.refreshed(headers)
+        self.replace(key, entry)
+        return entry
+
+    def answer(self, entry: Entry, request_headers: Dict[str, str], kind: str = "hit") -> Tuple[int, Headers, bytes]:
+        """(status, headers, body) serving `entry`: a 304 if the browser already has it."""
+        self.count("bytes_saved", len(entry.body))
+        if entry.matches(request_headers):
+            self.count("not_modified")
+            return 304, entry.not_modified_headers(), b""
+        self.count("hits" if kind == "hit" else "revalidated")
+        return entry.status, entry.response_headers(), entry.body
+
+    def collector(self, url: str, status: int, headers: Headers, request_headers: Dict[str, str],
+                  cacheable: bool = True) -> "Collector":
+        """Collector for a response fetched from upstream (a miss, when `cacheable`)."""
+        if cacheable:
+            self.count("misses")
+        return Collector(self, url, status, headers, request_headers, cacheable)
+
+    def _put_memory(self, key: str, entry: Entry) -> None:
+        size = entry.size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size()
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped.size()
+                self.counters["evicted"] += 1
+
+    # ---- disk tier ----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _disk_put(self, key: str, entry: Entry) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        meta = {"key": key, "status": entry.status, "headers": entry.headers, "max_age": entry.max_age,
+                "vary": entry.vary, "stored_at": entry.stored_at}
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                head = json.dumps(meta).encode("utf-8")
+                f.write(len(head).to_bytes(4, "big") + head + entry.body)
+            os.replace(tmp, path)
+            self._disk_prune()
+        except OSError as e:
+            print(f"[proxy_cache] Could not write {path}: {e}")
+
+    def _disk_get(self, key: str) -> Optional[Entry]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            n = int.from_bytes(raw[:4], "big")
+            meta = json.loads(raw[4:4 + n])
+            if meta.get("key") != key:
+                return None
+            os.utime(path)  # LRU order on disk is by mtime
+        except (OSError, ValueError):
+            return None
+        return Entry(meta["status"], [tuple(h) for h in meta["headers"]], raw[4 + n:], meta["max_age"],
+                     meta.get("vary", ""), meta["stored_at"])
+
+    def _disk_prune(self) -> None:
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+    # ---- counters ----
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._bytes
+        served = out["hits"] + out["revalidated"] + out["not_modified"]
+        total = served + out["misses"]
+        out["hit_ratio"] = round(served / total, 4) if total else 0.0
+        moved = out["bytes_saved"] + out["bytes_from_upstream"]
+        out["byte_savings_ratio"] = round(out["bytes_saved"] / moved, 4) if moved else 0.0
+        return out
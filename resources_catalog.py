@@ -0,0 +1,104 @@
+# resources_catalog.py — Resources Hub catalogue, loaded once per process from resources.json
+#
+# get_catalog() parses the file on first use and hands every session the same
+# Catalog. Lookups are precomputed: id -> resource, tag -> ids, sorted tags.
+# The file's stamp is re-checked at most every RELOAD_CHECK_SECONDS, so editors
+# can change resources.json without restarting the app. Catalog.search() runs
+# through a resource_search.SearchIndex built on the first query.
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional
+
+from resource_search import SearchIndex
+
+RESOURCES_FILE = os.environ.get("RESOURCES_FILE", os.path.join(os.path.dirname(__file__), "resources.json"))
+RELOAD_CHECK_SECONDS = float(os.environ.get("RESOURCES_RELOAD_SECONDS", "5"))
+
+
+class Catalog:
+    """Read-only view of the catalogue; share it, never mutate it."""
+
+    def __init__(self, resources: List[Dict[str, Any]], stamp: Any = None):
+        self.resources = resources
+        self.stamp = stamp
+        self.by_id: Dict[str, Dict[str, Any]] = {r["id"]: r for r in resources}
+        by_tag: Dict[str, set] = {}
+        for r in resources:
+            for t in r.get("tags", []):
+                by_tag.setdefault(t, set()).add(r["id"])
+        self.by_tag: Dict[str, FrozenSet[str]] = {t: frozenset(ids) for t, ids in by_tag.items()}
+        self.tags: List[str] = sorted(by_tag)
+        self._index: Optional[SearchIndex] = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.resources)
+
+    def get(self, rid: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(rid)
+
+    @property
+    def index(self) -> SearchIndex:
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = SearchIndex(self.resources)
+        return self._index
+
+    def search(self, query: str = "", tags: Iterable[str] = (), ids: Optional[Iterable[str]] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ranked matches for `query` carrying all `tags`, optionally restricted to `ids`."""
+        return self.index.search(query, tags, ids, limit)
+
+
+_lock = threading.Lock()
+_catalog: Optional[Catalog] = None
+_checked_at = 0.0
+
+
+def _file_stamp(path: str) -> Any:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _read(path: str, stamp: Any) -> Catalog:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    resources = raw.get("resources", []) if isinstance(raw, dict) else raw
+    print(f"[resources_catalog] Loaded {len(resources)} resources from {path}")
+    return Catalog(resources, stamp)
+
+
+def get_catalog(path: Optional[str] = None) -> Catalog:
+    """The process-wide catalogue, reloaded when the file changed since it was read."""
+    global _catalog, _checked_at
+    path = path or RESOURCES_FILE
+    now = time.monotonic()
+    if _catalog is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _catalog
+    with _lock:
+        if _catalog is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+            return _catalog
+        _checked_at = now
+        stamp = _file_stamp(path)
+        if _catalog is None or stamp != _catalog.stamp:
+            try:
+                _catalog = _read(path, stamp)
+            except (OSError, ValueError, KeyError) as e:
+                # keep serving the last good catalogue while an edit is half-written
+                print(f"[resources_catalog] Could not load {path}: {e}")
+                if _catalog is None:
+                    _catalog = Catalog([], None)
+        return _catalog
+
+
+def reload() -> Catalog:
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+    return get_catalog()
@@ -0,0 +1,71 @@
+# run_timing.py — server-side time per script run / fragment run of the Streamlit apps
+#
+# RUN_TIMING=1 prints one line per measured run, e.g.
+#   [run_timing] mental.py full run: 41.8 ms
+#   [run_timing] booking fragment: 3.2 ms
+# which is how full reruns (before fragments) compare with fragment reruns
+# (after). summary() returns count / mean / max per label for the process.
+#
+# bench_reruns.py measures both sides under AppTest (median ms per interaction,
+# 25 reruns, JSON store, Streamlit 1.66), before the split (full reruns) and
+# right after it (fragment reruns):
+#   mental.py resource paging       92.1 -> 36.3  (a click reran the whole script twice, now the fragment twice)
+#   mental.py token lookup          19.8 -> 18.6  (the booking page is little more than its fragment)
+#   Admin.py Bookings token lookup  46.7 -> 15.4  (the other five tabs no longer rerun)
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any
+
+ENABLED = os.environ.get("RUN_TIMING", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def record(label: str, seconds: float) -> None:
+    with _lock:
+        s = _stats.setdefault(label, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        s["count"] += 1
+        s["total_ms"] += seconds * 1000
+        s["max_ms"] = max(s["max_ms"], seconds * 1000)
+    if ENABLED:
+        print(f"[run_timing] {label}: {seconds * 1000:.1f} ms")
+
+
+@contextmanager
+def timed_block(label: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        # st.rerun()/st.stop() leave by exception; the time until then still counts
+        record(label, time.perf_counter() - t0)
+
+
+def timed(label: str) -> Callable:
+    """Decorator form, for fragment functions: put it under @st.fragment."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with timed_block(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def run_started() -> float:
+    return time.perf_counter()
+
+
+def run_finished(label: str, started: float) -> None:
+    """Close a whole-script measurement; call it before each st.stop() and at the end."""
+    record(label, time.perf_counter() - started)
+
+
+def summary() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {k: {"count": int(v["count"]), "mean_ms": round(v["total_ms"] / v["count"], 2),
+                    "max_ms": round(v["max_ms"], 2)} for k, v in _stats.items()}
@@ -0,0 +1,469 @@
+# sqlite_store.py — SQLite backend for data_store_utils (USE_SQLITE=1)
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+import booking_stats
+from availability_grid import AvailabilityGrid
+
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(os.path.dirname(__file__), "data_store.sqlite3"))
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS availability (
+    day       INTEGER NOT NULL,
+    slot      INTEGER NOT NULL,
+    available INTEGER NOT NULL,
+    PRIMARY KEY (day, slot)
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    day   INTEGER NOT NULL,
+    slot  INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    time  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_day_slot ON bookings (day, slot);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_token ON bookings (token);
+CREATE TABLE IF NOT EXISTS booking_archive (
+    week  TEXT NOT NULL,
+    day   INTEGER NOT NULL,
+    slot  INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    time  TEXT,
+    PRIMARY KEY (week, token)
+);
+CREATE TABLE IF NOT EXISTS counsellors (
+    id        INTEGER PRIMARY KEY,
+    name      TEXT NOT NULL,
+    specialty TEXT
+);
+CREATE TABLE IF NOT EXISTS chat_logs (
+    id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT,
+    time TEXT,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS booking_cells (
+    day    INTEGER NOT NULL,
+    slot   INTEGER NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    made   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, slot)
+);
+CREATE TABLE IF NOT EXISTS booking_weeks (
+    week       TEXT NOT NULL,
+    day        INTEGER NOT NULL,
+    booked     INTEGER NOT NULL DEFAULT 0,
+    cancelled  INTEGER NOT NULL DEFAULT 0,
+    lead_hours REAL NOT NULL DEFAULT 0,
+    lead_n     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week, day)
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialised = set()
+
+
+# ---------- Connection helpers ----------
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    """One connection per thread (Streamlit runs each session in its own thread)."""
+    path = path or SQLITE_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    with _init_lock:
+        if path not in _initialised:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+            _initialised.add(path)
+    return conn
+
+
+def _bump_version(conn: sqlite3.Connection) -> None:
+    conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+
+
+def _current_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def store_version(path: Optional[str] = None) -> int:
+    """Monotonic counter bumped by every write; used as the read-cache stamp."""
+    return _current_version(_connect(path))
+
+
+# ---------- Booking aggregates (booking_stats, as two tables) ----------
+def _stats_book(conn: sqlite3.Connection, day: int, slot: int, time_iso: Optional[str]) -> None:
+    conn.execute("INSERT INTO booking_cells (day, slot, booked, made) VALUES (?, ?, 1, 1) "
+                 "ON CONFLICT(day, slot) DO UPDATE SET booked = booked + 1, made = made + 1", (day, slot))
+    lead = booking_stats.lead_hours(day, slot, time_iso)
+    conn.execute("INSERT INTO booking_weeks (week, day, booked, lead_hours, lead_n) VALUES (?, ?, 1, ?, ?) "
+                 "ON CONFLICT(week, day) DO UPDATE SET booked = booked + 1, "
+                 "lead_hours = lead_hours + excluded.lead_hours, lead_n = lead_n + excluded.lead_n",
+                 (booking_stats.booking_week(time_iso), day, lead or 0.0, int(lead is not None)))
+
+
+def _stats_cancel(conn: sqlite3.Connection, booking: Dict[str, Any]) -> None:
+    conn.execute("UPDATE booking_cells SET booked = MAX(booked - 1, 0) WHERE day = ? AND slot = ?",
+                 (booking["day"], booking["slot"]))
+    conn.execute("INSERT INTO booking_weeks (week, day, cancelled) VALUES (?, ?, 1) "
+                 "ON CONFLICT(week, day) DO UPDATE SET cancelled = cancelled + 1",
+                 (booking_stats.booking_week(booking.get("time")), booking["day"]))
+
+
+def _load_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {}
+    for d, s, booked, made in conn.execute("SELECT day, slot, booked, made FROM booking_cells"):
+        entry = stats.setdefault(str(d), booking_stats.empty_day())
+        for key, n in (("booked", booked), ("made", made)):
+            entry[key] += [0] * (s + 1 - len(entry[key]))
+            entry[key][s] = n
+    for week, d, b, c, lh, ln in conn.execute(
+            "SELECT week, day, booked, cancelled, lead_hours, lead_n FROM booking_weeks"):
+        stats.setdefault(str(d), booking_stats.empty_day())["weeks"][week] = [b, c, lh, ln]
+    return stats
+
+
+def _save_stats(conn: sqlite3.Connection, stats: Dict[str, Any]) -> None:
+    conn.execute("DELETE FROM booking_cells")
+    conn.execute("DELETE FROM booking_weeks")
+    for key, entry in (stats or {}).items():
+        booked, made = entry.get("booked") or [], entry.get("made") or []
+        conn.executemany("INSERT INTO booking_cells (day, slot, booked, made) VALUES (?, ?, ?, ?)",
+                         [(int(key), s, booked[s] if s < len(booked) else 0, made[s] if s < len(made) else 0)
+                          for s in range(max(len(booked), len(made)))])
+        conn.executemany("INSERT INTO booking_weeks (week, day, booked, cancelled, lead_hours, lead_n) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [(week, int(key), *row) for week, row in (entry.get("weeks") or {}).items()])
+
+
+# ---------- Whole-store load/save (data_store_utils compatibility) ----------
+def load(path: Optional[str] = None) -> Dict[str, Any]:
+    conn = _connect(path)
+    data: Dict[str, Any] = {"availability": {}, "bookings": [], "counsellors": [], "chat_logs": [], "meta": {},
+                            "stats": {}, "templates": {}, "archive": {}}
+    conn.execute("BEGIN")  # one read transaction, so "_version" matches the rows
+    try:
+        (version,) = conn.execute("SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'version'").fetchone()
+        for d, s, a in conn.execute("SELECT day, slot, available FROM availability"):
+            data["availability"][f"{d}_{s}"] = bool(a)
+        for d, s, t, tm in conn.execute("SELECT day, slot, token, time FROM bookings ORDER BY id"):
+            data["bookings"].append({"day": d, "slot": s, "token": t, "time": tm})
+        for w, d, s, t, tm in conn.execute("SELECT week, day, slot, token, time FROM booking_archive ORDER BY rowid"):
+            data["archive"].setdefault(w, []).append({"day": d, "slot": s, "token": t, "time": tm})
+        for i, n, sp in conn.execute("SELECT id, name, specialty FROM counsellors ORDER BY id"):
+            data["counsellors"].append({"id": i, "name": n, "specialty": sp})
+        for u, tm, tx in conn.execute("SELECT user, time, text FROM chat_logs ORDER BY id"):
+            data["chat_logs"].append({"user": u, "time": tm, "text": tx})
+        for key, part in (("store_meta", "meta"), ("store_templates", "templates")):
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if row:
+                data[part] = json.loads(row[0])
+        data["stats"] = _load_stats(conn)
+    finally:
+        conn.execute("COMMIT")
+    data["_version"] = version
+    return data
+
+
+def save(data: Dict[str, Any], path: Optional[str] = None,
+         expected_version: Optional[int] = None, parts: Optional[Iterable[str]] = None) -> Optional[int]:
+    """Sync tables to `data`, touching only rows that differ (and only the tables
+    named in `parts`, if given). Returns the new version, or None (nothing written)
+    if the store is no longer at expected_version."""
+    parts = set(parts) if parts is not None else {"availability", "bookings", "counsellors", "chat_logs", "meta",
+                                                  "stats", "templates", "archive"}
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if expected_version is not None and _current_version(conn) != expected_version:
+            conn.execute("ROLLBACK")
+            return None
+        if "availability" in parts:
+            # the compact {"slots","free","defined"} form of data_store.json, or legacy "d_s" keys
+            rows = [(d, s, int(free)) for d, s, free in AvailabilityGrid.from_json(data.get("availability")).iter_cells()]
+            conn.executemany(
+                "INSERT INTO availability (day, slot, available) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, slot) DO UPDATE SET available = excluded.available "
+                "WHERE available != excluded.available",
+                rows,
+            )
+
+        if "bookings" in parts:
+            wanted = {b.get("token"): b for b in data.get("bookings", [])}
+            existing = {t for (t,) in conn.execute("SELECT token FROM bookings")}
+            gone = [(t,) for t in existing if t not in wanted]
+            if gone:
+                conn.executemany("DELETE FROM bookings WHERE token = ?", gone)
+            conn.executemany(
+                "INSERT INTO bookings (day, slot, token, time) VALUES (?, ?, ?, ?)",
+                [(b.get("day"), b.get("slot"), t, b.get("time")) for t, b in wanted.items() if t not in existing],
+            )
+
+        if "archive" in parts:
+            wanted = {(w, b.get("token")): b for w, rows in data.get("archive", {}).items() for b in rows}
+            existing = set(conn.execute("SELECT week, token FROM booking_archive"))
+            conn.executemany("DELETE FROM booking_archive WHERE week = ? AND token = ?",
+                             [key for key in existing if key not in wanted])
+            conn.executemany(
+                "INSERT INTO booking_archive (week, day, slot, token, time) VALUES (?, ?, ?, ?, ?)",
+                [(w, b.get("day"), b.get("slot"), t, b.get("time"))
+                 for (w, t), b in wanted.items() if (w, t) not in existing],
+            )
+
+        if "counsellors" in parts:
+            counsellors = [(c["id"], c.get("name", ""), c.get("specialty")) for c in data.get("counsellors", [])]
+            conn.execute("DELETE FROM counsellors WHERE id NOT IN (%s)" % ",".join("?" * len(counsellors)),
+                         [c[0] for c in counsellors])
+            conn.executemany("INSERT OR REPLACE INTO counsellors (id, name, specialty) VALUES (?, ?, ?)", counsellors)
+
+        if "chat_logs" in parts:
+            logs = data.get("chat_logs", [])
+            (count,) = conn.execute("SELECT COUNT(*) FROM chat_logs").fetchone()
+            if len(logs) < count:
+                conn.execute("DELETE FROM chat_logs")
+                count = 0
+            conn.executemany(
+                "INSERT INTO chat_logs (user, time, text) VALUES (?, ?, ?)",
+                [(l.get("user"), l.get("time"), l.get("text")) for l in logs[count:]],
+            )
+
+        if "meta" in parts:
+            # the store's own markers (schema, rollover week); not the table schema_version above
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('store_meta', ?)",
+                         (json.dumps(data.get("meta", {})),))
+        if "templates" in parts:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('store_templates', ?)",
+                         (json.dumps(data.get("templates", {})),))
+
+        if "stats" in parts:
+            _save_stats(conn, data.get("stats", {}))
+
+        _bump_version(conn)
+        version = _current_version(conn)
+        conn.execute("COMMIT")
+        return version
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# ---------- Indexed booking operations ----------
+def reserve_slot(day: int, slot: int, token: str, time_iso: Optional[str] = None,
+                 path: Optional[str] = None) -> bool:
+    """Book (day, slot) only if it is still available. Returns False if someone got there first."""
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # a missing cell counts as available, matching the JSON store's .get(key, True)
+        conn.execute("INSERT OR IGNORE INTO availability (day, slot, available) VALUES (?, ?, 1)", (day, slot))
+        cur = conn.execute(
+            "UPDATE availability SET available = 0 WHERE day = ? AND slot = ? AND available = 1", (day, slot)
+        )
+        if cur.rowcount != 1:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute("INSERT INTO bookings (day, slot, token, time) VALUES (?, ?, ?, ?)", (day, slot, token, time_iso))
+        _stats_book(conn, day, slot, time_iso)
+        _bump_version(conn)
+        conn.execute("COMMIT")
+        return True
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def cancel_slot(day: int, slot: int, path: Optional[str] = None) -> bool:
+    """Drop the (first) booking on (day, slot) and make the slot available again.
+    Returns whether a booking was dropped."""
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT id, day, slot, token, time FROM bookings WHERE day = ? AND slot = ? "
+                           "ORDER BY id LIMIT 1", (day, slot)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM bookings WHERE id = ?", (row[0],))
+            _stats_cancel(conn, _booking_row(row[1:]))
+        conn.execute(
+            "INSERT INTO availability (day, slot, available) VALUES (?, ?, 1) "
+            "ON CONFLICT(day, slot) DO UPDATE SET available = 1",
+            (day, slot),
+        )
+        _bump_version(conn)
+        conn.execute("COMMIT")
+        return row is not None
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _booking_row(row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    return {"day": row[0], "slot": row[1], "token": row[2], "time": row[3]}
+
+
+def find_booking(token: str, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Lookup through the unique token index."""
+    return _booking_row(_connect(path).execute(
+        "SELECT day, slot, token, time FROM bookings WHERE token = ?", (token,)).fetchone())
+
+
+def booking_at(day: int, slot: int, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Lookup through the (day, slot) index."""
+    return _booking_row(_connect(path).execute(
+        "SELECT day, slot, token, time FROM bookings WHERE day = ? AND slot = ? ORDER BY id LIMIT 1",
+        (day, slot)).fetchone())
+
+
+def cancel_booking(token: str, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Delete the booking with `token` and reopen its slot. Returns the removed booking."""
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        booking = _booking_row(conn.execute(
+            "SELECT day, slot, token, time FROM bookings WHERE token = ?", (token,)).fetchone())
+        if booking is None:
+            conn.execute("ROLLBACK")
+            return None
+        conn.execute("DELETE FROM bookings WHERE token = ?", (token,))
+        _stats_cancel(conn, booking)
+        conn.execute(
+            "INSERT INTO availability (day, slot, available) VALUES (?, ?, 1) "
+            "ON CONFLICT(day, slot) DO UPDATE SET available = 1",
+            (booking["day"], booking["slot"]),
+        )
+        _bump_version(conn)
+        conn.execute("COMMIT")
+        return booking
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+_PAGE_ORDER = {
+    "time": ("COALESCE(time, '')", "token"),
+    "day": ("day", "slot", "COALESCE(time, '')", "token"),
+    "slot": ("slot", "day", "COALESCE(time, '')", "token"),
+}
+
+
+def bookings_page(day: Optional[int] = None, token_prefix: str = "", sort: str = "time", descending: bool = False,
+                  offset: int = 0, limit: int = 50, path: Optional[str] = None):
+    """(rows, total) for the admin table; the token prefix is a range on the unique token index."""
+    where, args = [], []
+    if day is not None:
+        where.append("day = ?")
+        args.append(day)
+    if token_prefix:
+        where.append("token >= ? AND token < ?")
+        args += [token_prefix, token_prefix + "\uffff"]
+    clause = (" WHERE " + " AND ".join(where)) if where else ""
+    order = ", ".join(f"{col} DESC" if descending else col for col in _PAGE_ORDER[sort])
+    conn = _connect(path)
+    (total,) = conn.execute(f"SELECT COUNT(*) FROM bookings{clause}", args).fetchone()
+    rows = conn.execute(f"SELECT day, slot, token, time FROM bookings{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                        args + [limit, offset]).fetchall()
+    return [_booking_row(r) for r in rows], total
+
+
+def iter_bookings(day_from: int = 0, day_to: int = 6, path: Optional[str] = None,
+                  batch: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Bookings on days day_from..day_to off a cursor, `batch` rows in memory at a time."""
+    cur = _connect(path).execute(
+        "SELECT day, slot, token, time FROM bookings WHERE day BETWEEN ? AND ? "
+        "ORDER BY day, slot, COALESCE(time, ''), token", (day_from, day_to))
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return
+        for r in rows:
+            yield _booking_row(r)
+
+
+def cancel_bookings(tokens: Iterable[str], path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Delete all bookings in `tokens` and reopen their slots in one transaction."""
+    tokens = list(tokens)
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        removed: List[Dict[str, Any]] = []
+        for i in range(0, len(tokens), 500):  # stay under SQLite's bound-parameter limit
+            chunk = tokens[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            removed += [_booking_row(r) for r in conn.execute(
+                f"SELECT day, slot, token, time FROM bookings WHERE token IN ({marks})", chunk)]
+            conn.execute(f"DELETE FROM bookings WHERE token IN ({marks})", chunk)
+        if not removed:
+            conn.execute("ROLLBACK")
+            return []
+        conn.executemany(
+            "INSERT INTO availability (day, slot, available) VALUES (?, ?, 1) "
+            "ON CONFLICT(day, slot) DO UPDATE SET available = 1",
+            {(b["day"], b["slot"]) for b in removed},
+        )
+        for b in removed:
+            _stats_cancel(conn, b)
+        _bump_version(conn)
+        conn.execute("COMMIT")
+        return removed
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# ---------- Migration ----------
+def is_empty(path: Optional[str] = None) -> bool:
+    conn = _connect(path)
+    for table in ("availability", "bookings", "counsellors", "chat_logs"):
+        if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+            return False
+    return True
+
+
+def migrate_from_json(json_path: str, path: Optional[str] = None) -> int:
+    """Import a data_store.json into an empty database. Returns the number of bookings imported."""
+    if not os.path.exists(json_path):
+        return 0
+    if not is_empty(path):
+        print(f"[sqlite_store] {path or SQLITE_PATH} already has data, skipping migration")
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.pop("_meta", None)
+    # duplicate tokens would violate the unique index; keep the first occurrence
+    seen: set = set()
+    bookings: List[Dict[str, Any]] = []
+    for b in data.get("bookings", []):
+        if b.get("token") not in seen:
+            seen.add(b.get("token"))
+            bookings.append(b)
+    data["bookings"] = bookings
+    save(data, path)
+    print(f"[sqlite_store] Migrated {json_path} -> {path or SQLITE_PATH} ({len(bookings)} bookings)")
+    return len(bookings)
+
+
+if __name__ == "__main__":
+    import sys
+
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "data_store.json")
+    migrate_from_json(src)
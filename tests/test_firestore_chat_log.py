@@ -0,0 +1,45 @@
+# FirestoreChatLog against fake_firestore, which refuses integers a real
+# Firestore document cannot hold (signed 64-bit).
+import pytest
+
+import chat_log_store
+import fake_firestore
+
+
+def _log():
+    client = fake_firestore.Client()
+    return chat_log_store.FirestoreChatLog(client, client.collection("store").document("main").collection("chat_logs"))
+
+
+def test_fake_rejects_integers_beyond_int64():
+    client = fake_firestore.Client()
+    ref = client.collection("c").document("d")
+    ref.create({"v": 2 ** 63 - 1})
+    with pytest.raises(fake_firestore.InvalidArgument):
+        ref.set({"v": 2 ** 63})
+    with pytest.raises(fake_firestore.InvalidArgument):
+        ref.update({"nested.v": -2 ** 63 - 1})
+
+
+def test_entries_fit_and_page_newest_first():
+    log = _log()
+    for i in range(23):
+        log.log("u", f"m{i}")
+    texts, cursor = [], None
+    while True:
+        page, cursor = log.read_page(cursor, limit=5)
+        texts += [e["text"] for e in page]
+        if cursor is None:
+            break
+    assert texts == [f"m{i}" for i in reversed(range(23))]
+    assert [e["text"] for e in log.iter_entries()] == [f"m{i}" for i in range(23)]
+    assert all(set(e) == {"user", "time", "text"} for e in log.iter_entries())
+
+
+def test_entries_of_one_nanosecond_keep_their_order(monkeypatch):
+    monkeypatch.setattr(chat_log_store.time, "time_ns", lambda: 1_700_000_000_000_000_000)
+    log = _log()
+    log.extend([{"user": "u", "time": "t", "text": str(i)} for i in range(7)])
+    page, cursor = log.read_page(limit=4)
+    rest, end = log.read_page(cursor, limit=4)
+    assert [e["text"] for e in page + rest] == [str(i) for i in reversed(range(7))] and end is None
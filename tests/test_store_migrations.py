@@ -0,0 +1,81 @@
+# Stores written by the current save_data() must migrate to SQLite and to the
+# sharded Firestore layout. Backends are chosen when data_store_utils is
+# imported, so each case runs in a child process over a throwaway copy of the app.
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# archives a booking of 2026-W01 at rollover, closes Mon 9-10 and Wed 14-15, books Tue 10-11
+WRITE = """
+from datetime import date
+import data_store_utils as d
+d.ensure_store_ready()
+roll = lambda day: d.update_data(lambda data: d.rollover(data, day), parts=d.ROLLOVER_PARTS, sync=True)
+roll(date(2026, 1, 1))
+d.update_data(lambda data: data["availability"].reset(free=True), sync=True)
+assert d.reserve_slot(4, 2, "tok-closed", "2026-01-01T09:00:00")
+roll(date(2026, 1, 8))
+d.update_data(lambda data: data["availability"].reset(free=True), sync=True)
+d.update_data(lambda data: (data["availability"].set_free(0, 0, False),
+                            data["availability"].set_free(2, 5, False)), sync=True)
+assert d.reserve_slot(1, 1, "tok-migrate", "2026-01-06T10:00:00")
+"""
+
+
+def _run(tmp_path, code: str, **env) -> dict:
+    for src in glob.glob(os.path.join(ROOT, "*.py")) + [os.path.join(ROOT, "resources.json")]:
+        shutil.copy(src, tmp_path)
+    full_env = dict(os.environ, SQLITE_PATH=str(tmp_path / "store.sqlite3"), **env)
+    for name in ("USE_SQLITE", "USE_JOURNAL", "USE_FIRESTORE", "FIRESTORE_FAKE", "FIRESTORE_LAYOUT"):
+        if name not in env:
+            full_env.pop(name, None)
+    out = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=tmp_path, env=full_env,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stdout + out.stderr
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _check(result: dict) -> None:
+    cells = {tuple(c[:2]): c[2] for c in result["cells"]}
+    assert cells[(0, 0)] is False and cells[(2, 5)] is False and cells[(3, 3)] is True
+    assert result["tokens"] == ["tok-migrate"]
+    assert result["archive"] == {"2026-W01": [{"day": 4, "slot": 2, "token": "tok-closed",
+                                              "time": "2026-01-01T09:00:00"}]}
+
+
+def test_json_store_migrates_to_sqlite(tmp_path):
+    _run(tmp_path, WRITE + "print('{}')")
+    saved = json.loads((tmp_path / "data_store.json").read_text())
+    assert set(saved["availability"]) >= {"slots", "free"}  # the compact form
+    result = _run(tmp_path, """
+        import json
+        import data_store_utils as d
+        assert d._sqlite is not None, "SQLite init failed"
+        grid = d.load_data(parts=("availability",))["availability"]
+        print(json.dumps({"cells": list(grid.iter_cells()),
+                          "tokens": [b["token"] for b in d.load_data(parts=("bookings",))["bookings"]],
+                          "archive": d.load_data(parts=("archive",))["archive"]}))
+    """, USE_SQLITE="1")
+    _check(result)
+
+
+def test_single_document_firestore_migrates_to_shards(tmp_path):
+    result = _run(tmp_path, WRITE + textwrap.dedent("""
+        import json
+        import firestore_shards
+        payload = d._firestore_client.collection(d.FIRESTORE_COLLECTION).document(d.FIRESTORE_DOC_ID).get()
+        assert "free" in payload.to_dict()["payload"]["availability"]  # the compact form
+        shards = firestore_shards.ShardedStore(d._firestore_client, d.FIRESTORE_COLLECTION, d.FIRESTORE_DOC_ID)
+        assert shards.migrate_from_single()
+        data = shards.load(["archive", "availability", "bookings"])
+        grid = d.AvailabilityGrid.from_json(data["availability"])
+        print(json.dumps({"cells": list(grid.iter_cells()), "tokens": [b["token"] for b in data["bookings"]],
+                          "archive": data["archive"]}))
+    """), USE_FIRESTORE="1", FIRESTORE_FAKE="1")
+    _check(result)